@@ -0,0 +1,23 @@
+"""
+System checks for caches that several worker processes must share.
+
+DATABASE_MODE=production is meant for several worker processes. A cache
+whose entries are invalidated by writes is then only correct if every
+worker sees the same entries, which LocMemCache, private to one process,
+cannot give.
+"""
+from django.conf import settings
+from django.core.checks import Error
+
+PROCESS_LOCAL_BACKEND = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def shared_cache_errors(alias, hint, id):
+    """An Error for the cache `alias` if production mode runs it in LocMemCache, else nothing."""
+    if not settings.PRODUCTION_DATABASE or settings.CACHES[alias]['BACKEND'] != PROCESS_LOCAL_BACKEND:
+        return []
+    return [Error(
+        f"The '{alias}' cache must be shared between worker processes when DATABASE_MODE is production.",
+        hint=hint,
+        id=id,
+    )]
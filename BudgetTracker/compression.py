@@ -0,0 +1,126 @@
+"""
+Negotiated response compression.
+
+CompressionMiddleware compresses response bodies of at least
+RESPONSE_COMPRESSION['MIN_SIZE'] bytes with the best encoding the client
+accepts: brotli when the brotli package is installed, else gzip. Smaller
+bodies gain little and are sent as they are, and so is a body that would
+not get smaller. Streaming responses (exports) are compressed chunk by chunk
+whatever their size.
+
+Like Django's GZipMiddleware it adds Accept-Encoding to
+Vary, weakens strong ETags and leaves responses that already have a
+Content-Encoding alone. gzip output gets Django's BREACH mitigation, random
+bytes in the gzip header. brotli has no header to pad, so deployments that
+reflect user input next to secrets in one response should leave brotli
+uninstalled.
+
+It sits right after the instrumentation middleware, so the time spent
+compressing counts towards the request's Server-Timing total and metrics.
+"""
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.utils.cache import patch_vary_headers
+from django.utils.text import compress_sequence, compress_string
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# As GZipMiddleware: at most this many random bytes in each gzip header.
+MAX_RANDOM_BYTES = 100
+
+
+def available_encodings():
+    """Encodings this process can produce, best first."""
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def accepted_encodings(header):
+    """{content coding: q value} from an Accept-Encoding header."""
+    accepted = {}
+    for item in header.split(','):
+        name, *params = (part.strip() for part in item.split(';'))
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition('=')
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        if name:
+            accepted[name.lower()] = quality
+    return accepted
+
+
+def negotiate(header):
+    """The encoding to use for a request's Accept-Encoding header, or None."""
+    accepted = accepted_encodings(header)
+    qualities = {encoding: accepted.get(encoding, accepted.get('*', 0.0)) for encoding in available_encodings()}
+    # The client's preference first, then ours.
+    encoding = max(qualities, key=qualities.get)
+    return encoding if qualities[encoding] > 0 else None
+
+
+def compress(content, encoding):
+    options = settings.RESPONSE_COMPRESSION
+    if encoding == 'br':
+        return brotli.compress(content, quality=options['BROTLI_QUALITY'])
+    return compress_string(content, max_random_bytes=MAX_RANDOM_BYTES)
+
+
+def _brotli_sequence(sequence, quality):
+    compressor = brotli.Compressor(quality=quality)
+    for chunk in sequence:
+        data = compressor.process(chunk) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def compress_stream(sequence, encoding):
+    if encoding == 'br':
+        return _brotli_sequence(sequence, settings.RESPONSE_COMPRESSION['BROTLI_QUALITY'])
+    return compress_sequence(sequence, max_random_bytes=MAX_RANDOM_BYTES)
+
+
+class CompressionMiddleware:
+    """Compresses large responses with brotli or gzip. Unused with RESPONSE_COMPRESSION['ENABLED'] off."""
+
+    def __init__(self, get_response):
+        if not settings.RESPONSE_COMPRESSION['ENABLED']:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        if response.has_header('Content-Encoding'):
+            return response
+        if response.streaming:
+            if response.is_async:
+                return response
+        elif len(response.content) < settings.RESPONSE_COMPRESSION['MIN_SIZE']:
+            return response
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = negotiate(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(response.streaming_content, encoding)
+            del response.headers['Content-Length']
+        else:
+            compressed = compress(response.content, encoding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response.headers['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response.headers['ETag'] = 'W/' + etag
+        response.headers['Content-Encoding'] = encoding
+        return response
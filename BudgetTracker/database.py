@@ -0,0 +1,106 @@
+"""
+SQLite tuning for production and retries for writes that find the database locked.
+
+Every new SQLite connection runs the PRAGMAs in settings.SQLITE_PRAGMAS,
+which DATABASE_MODE=production fills in (see settings.py): WAL journaling
+lets readers work while a write is in progress, synchronous=NORMAL stays
+durable across application crashes in WAL mode, and busy_timeout makes a
+connection wait for a competing writer instead of failing at once.
+Production mode also keeps connections for CONN_MAX_AGE seconds, so the
+PRAGMAs run once per worker thread rather than once per request.
+
+busy_timeout cannot help a transaction that reads before it writes. When two
+of them want to write at the same time, SQLite fails one immediately to
+avoid a deadlock, and only rolling it back and running it again gets it
+through. write_attempts() does that:
+
+    for attempt in database.write_attempts():
+        with attempt:
+            ...
+
+Each attempt runs the block in its own atomic(). An attempt that fails with
+"database is locked" is rolled back and the block runs again after an
+exponential backoff with jitter, up to DATABASE_WRITE_RETRY['ATTEMPTS']
+times. The block must therefore be safe to run again; bulk_create_new()
+inserts new instances in a way that is. Inside an enclosing
+atomic block the error propagates, since only the outermost transaction can
+be run again.
+"""
+import random
+import time
+
+from django.conf import settings
+from django.db import OperationalError, transaction
+from django.db.backends.signals import connection_created
+
+from . import metrics
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked', 'database is busy')
+
+
+def configure_connection(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    for name, value in settings.SQLITE_PRAGMAS.items():
+        # The raw connection keeps these out of the query log and the request's query counts.
+        connection.connection.execute(f'PRAGMA {name} = {value}')
+
+
+def connect():
+    connection_created.connect(configure_connection, dispatch_uid='BudgetTracker.database.configure_connection')
+
+
+def is_locked(exc):
+    return isinstance(exc, OperationalError) and any(message in str(exc).lower() for message in LOCKED_MESSAGES)
+
+
+class _Attempt:
+
+    def __init__(self, using, retry):
+        self.atomic = transaction.atomic(using=using)
+        self.retry = retry
+        self.failed = None
+
+    def __enter__(self):
+        self.atomic.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        try:
+            self.atomic.__exit__(exc_type, exc, traceback)
+        except OperationalError as commit_error:
+            # The block succeeded but COMMIT found the database locked.
+            if exc is None and self.retry and is_locked(commit_error):
+                self.failed = commit_error
+                return True
+            raise
+        if exc is not None and self.retry and is_locked(exc):
+            self.failed = exc
+            return True
+        return False
+
+
+def write_attempts(using=None, attempts=None):
+    """Yield atomic blocks until one is not rolled back for a locked database; see the module docstring."""
+    options = settings.DATABASE_WRITE_RETRY
+    attempts = attempts or options['ATTEMPTS']
+    retry = not transaction.get_connection(using).in_atomic_block
+    for number in range(1, attempts + 1):
+        attempt = _Attempt(using, retry and number < attempts)
+        yield attempt
+        if attempt.failed is None:
+            return
+        metrics.inc('budget_db_lock_retries_total')
+        delay = min(options['MAX_DELAY'], options['BASE_DELAY'] * 2 ** (number - 1))
+        time.sleep(random.uniform(0, delay))
+
+
+def bulk_create_new(model, instances, **kwargs):
+    """
+    model.objects.bulk_create() for a write_attempts() block. A rolled back
+    attempt leaves its primary keys on the instances, so they are cleared
+    before each insert.
+    """
+    for instance in instances:
+        instance.pk = None
+    return model.objects.bulk_create(instances, **kwargs)
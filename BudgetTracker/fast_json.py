@@ -0,0 +1,74 @@
+"""
+JSON rendering and parsing through orjson, when it is installed.
+
+JSONRenderer and JSONParser are drop-in replacements for DRF's, set as the
+defaults in REST_FRAMEWORK. orjson encodes datetimes, dates, times and UUIDs
+itself, and hands everything else it does not know (Decimal, lazy strings,
+querysets...) to DRF's encoder. The output is byte for byte what DRF's
+renderer writes with this project's settings: compact separators, UTF-8
+rather than \\u escapes, and U+2028/U+2029 escaped. The one exception is
+floats: orjson writes 1e16 rather than 1e+16, and null rather than raising
+for NaN.
+
+Anything orjson refuses, such as an integer beyond 64 bits, is rendered or
+parsed again by DRF's stdlib implementation, which also produces its error
+messages. So are indented responses (the browsable API), request bodies in
+charsets other than UTF-8, and bodies with a run of 19 or more digits, since
+orjson would parse a huge integer as a float. Without orjson both classes
+behave exactly like DRF's.
+"""
+import io
+import re
+
+from rest_framework import parsers, renderers
+from rest_framework.utils import encoders
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_default = encoders.JSONEncoder().default
+
+_LONG_NUMBER = re.compile(rb'\d{19}')
+
+
+def _orjson_dumps(data):
+    """DRF's compact rendering of `data` through orjson, or None where orjson cannot encode it."""
+    try:
+        content = orjson.dumps(data, default=_default, option=orjson.OPT_UTC_Z)
+    except orjson.JSONEncodeError:
+        return None
+    if b'\xe2\x80\xa8' in content or b'\xe2\x80\xa9' in content:
+        # Kept valid JavaScript, as DRF does.
+        content = content.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+    return content
+
+
+class JSONRenderer(renderers.JSONRenderer):
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None or self.ensure_ascii or not self.compact:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        content = _orjson_dumps(data)
+        if content is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return content
+
+
+class JSONParser(parsers.JSONParser):
+    renderer_class = JSONRenderer
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        encoding = (parser_context or {}).get('encoding', 'utf-8')
+        if orjson is None or encoding.lower().replace('_', '-') not in ('utf-8', 'utf8'):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if _LONG_NUMBER.search(body):
+            return super().parse(io.BytesIO(body), media_type, parser_context)
+        try:
+            return orjson.loads(body)
+        except orjson.JSONDecodeError:
+            return super().parse(io.BytesIO(body), media_type, parser_context)
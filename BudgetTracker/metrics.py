@@ -0,0 +1,212 @@
+"""
+Process-aggregated metrics in the Prometheus text format.
+
+Every process keeps its counters and histograms in memory and writes them
+to its own JSON file in settings.METRICS_DIR at most once per
+METRICS_FLUSH_INTERVAL seconds and on exit. The /metrics view adds up the
+files of all processes, so gunicorn workers report one cumulative set of
+series. Files are replaced atomically and never shared between writers, so
+no locking across processes is needed. Files left by exited workers keep
+contributing their counts, as Prometheus expects of counters; clear
+METRICS_DIR when the server starts.
+
+    metrics.inc('budget_cache_requests_total', cache='dashboard', result='hit')
+    metrics.observe('budget_http_request_duration_seconds', 0.012, view='login')
+"""
+import atexit
+import json
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BATCH_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+HELP = {
+    'budget_http_requests_total': ('counter', 'HTTP requests by URL name, method and status code.'),
+    'budget_http_request_errors_total': ('counter', 'HTTP requests answered with a 5xx status.'),
+    'budget_http_request_duration_seconds': ('histogram', 'Request latency by URL name.'),
+    'budget_db_queries_per_request': ('histogram', 'Database queries run per request, by URL name.'),
+    'budget_cache_requests_total': ('counter', 'Cache lookups by cache and result (hit or miss).'),
+    'budget_cache_hit_ratio': ('gauge', 'Share of cache lookups that were hits, across all processes.'),
+    'budget_db_lock_retries_total': ('counter', 'Write transactions run again because the database was locked.'),
+    'budget_group_commit_batch_size': ('histogram', 'Transaction creates committed together by the group commit writer.'),
+}
+
+BUCKETS = {
+    'budget_http_request_duration_seconds': LATENCY_BUCKETS,
+    'budget_db_queries_per_request': QUERY_BUCKETS,
+    'budget_group_commit_batch_size': BATCH_BUCKETS,
+}
+
+
+class Registry:
+    """Counters and histograms of the current process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.pid = os.getpid()
+        self.path = None
+        self.counters = defaultdict(float)
+        self.histograms = {}
+        self.last_flush = time.monotonic()
+
+    def _check_fork(self):
+        # A forked worker must not keep writing to its parent's file.
+        if os.getpid() != self.pid:
+            self.reset()
+
+    def inc(self, name, amount=1, **labels):
+        with self.lock:
+            self._check_fork()
+            self.counters[name, _label_key(labels)] += amount
+        self.maybe_flush()
+
+    def observe(self, name, value, **labels):
+        buckets = BUCKETS[name]
+        with self.lock:
+            self._check_fork()
+            key = (name, _label_key(labels))
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = {'buckets': [0] * len(buckets), 'sum': 0.0, 'count': 0}
+            for index, bound in enumerate(buckets):
+                if value <= bound:
+                    histogram['buckets'][index] += 1
+            histogram['sum'] += value
+            histogram['count'] += 1
+        self.maybe_flush()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, labels, value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, labels, dict(data, buckets=list(data['buckets']))]
+                               for (name, labels), data in self.histograms.items()],
+            }
+
+    def maybe_flush(self):
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            self.flush()
+
+    def flush(self):
+        directory = settings.METRICS_DIR
+        if not directory:
+            return
+        self.last_flush = time.monotonic()
+        data = self.snapshot()
+        if not data['counters'] and not data['histograms']:
+            return
+        os.makedirs(directory, exist_ok=True)
+        if self.path is None:
+            self.path = os.path.join(directory, f'metrics-{self.pid}-{uuid.uuid4().hex[:8]}.json')
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w') as handle:
+            json.dump(data, handle)
+        os.replace(temporary, self.path)
+
+
+def _label_key(labels):
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+registry = Registry()
+inc = registry.inc
+observe = registry.observe
+atexit.register(registry.flush)
+
+
+def collect():
+    """Merge the files of every process (this one flushed first) into one snapshot."""
+    counters = defaultdict(float)
+    histograms = {}
+    sources = []
+    directory = settings.METRICS_DIR
+    if directory:
+        registry.flush()
+        if os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if not name.endswith('.json'):
+                    continue
+                try:
+                    with open(os.path.join(directory, name)) as handle:
+                        sources.append(json.load(handle))
+                except (OSError, ValueError):
+                    continue  # Replaced or removed while we were reading it.
+    else:
+        sources.append(registry.snapshot())
+
+    for source in sources:
+        for name, labels, value in source['counters']:
+            counters[name, tuple(map(tuple, labels))] += value
+        for name, labels, data in source['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, {'buckets': [0] * len(data['buckets']), 'sum': 0.0, 'count': 0})
+            merged['buckets'] = [a + b for a, b in zip(merged['buckets'], data['buckets'])]
+            merged['sum'] += data['sum']
+            merged['count'] += data['count']
+    return counters, histograms
+
+
+def _format_labels(labels, **extra):
+    pairs = list(labels) + list(extra.items())
+    if not pairs:
+        return ''
+    escaped = (
+        (key, value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')) for key, value in pairs
+    )
+    return '{' + ','.join(f'{key}="{value}"' for key, value in escaped) + '}'
+
+
+def _format_value(value):
+    return repr(int(value)) if float(value).is_integer() else repr(value)
+
+
+def render():
+    counters, histograms = collect()
+    series = defaultdict(list)
+
+    for (name, labels), value in sorted(counters.items()):
+        series[name].append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+
+    for (name, labels), data in sorted(histograms.items()):
+        for bound, count in zip(BUCKETS[name], data['buckets']):
+            series[name].append(f'{name}_bucket{_format_labels(labels, le=repr(float(bound)))} {count}')
+        series[name].append(f'{name}_bucket{_format_labels(labels, le="+Inf")} {data["count"]}')
+        series[name].append(f'{name}_sum{_format_labels(labels)} {_format_value(data["sum"])}')
+        series[name].append(f'{name}_count{_format_labels(labels)} {data["count"]}')
+
+    lookups = defaultdict(lambda: {'hit': 0.0, 'miss': 0.0})
+    for (name, labels), value in counters.items():
+        if name == 'budget_cache_requests_total':
+            labels = dict(labels)
+            lookups[labels['cache']][labels['result']] += value
+    for cache, results in sorted(lookups.items()):
+        total = results['hit'] + results['miss']
+        if total:
+            series['budget_cache_hit_ratio'].append(
+                f'budget_cache_hit_ratio{_format_labels([("cache", cache)])} {_format_value(results["hit"] / total)}'
+            )
+
+    lines = []
+    for name, (kind, text) in HELP.items():
+        if series.get(name):
+            lines += [f'# HELP {name} {text}', f'# TYPE {name} {kind}', *series[name]]
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    token = settings.METRICS_TOKEN
+    if token and request.headers.get('Authorization') != f'Bearer {token}':
+        return HttpResponseForbidden()
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
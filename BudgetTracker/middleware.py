@@ -0,0 +1,193 @@
+"""
+Per-request instrumentation: Server-Timing headers and a slow request log,
+and the counters behind the /metrics endpoint.
+
+QueryTimingMiddleware counts the queries each request runs and how long
+they take, using connection.execute_wrapper() on every configured database,
+and reports them with the view time in a Server-Timing header:
+
+    Server-Timing: sql;dur=3.41;desc="7 queries", view;dur=11.02, total;dur=12.30
+
+Requests slower than REQUEST_TIMING['SLOW_REQUEST_MS'], or running more
+than REQUEST_TIMING['SLOW_REQUEST_QUERIES'] queries, are written to the
+'BudgetTracker.slow_requests' logger. The entry lists the slowest
+statements with their query plans and the statements repeated within the
+request, which is how N+1 loops show up.
+
+Streaming responses are timed up to the point their body starts streaming.
+
+With REQUEST_TIMING['ENABLED'] off the middleware removes itself at startup,
+so it costs nothing.
+
+Execute wrappers only see the connections of the thread that installed
+them. Code that hands queries to other threads runs them inside
+inherited_query_wrappers(), so that they are counted with the request.
+"""
+import contextvars
+import logging
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DatabaseError, connections
+
+from . import metrics
+
+logger = logging.getLogger('BudgetTracker.slow_requests')
+
+# wrapper_for(alias) callables of the request being handled.
+request_query_wrappers = contextvars.ContextVar('request_query_wrappers', default=())
+
+
+@contextmanager
+def _installed(wrapper_factories):
+    with ExitStack() as stack:
+        for alias in connections:
+            for wrapper_for in wrapper_factories:
+                stack.enter_context(connections[alias].execute_wrapper(wrapper_for(alias)))
+        yield
+
+
+@contextmanager
+def query_wrapper(wrapper_for):
+    """Wrap the queries of this request, on this thread and in inherited_query_wrappers() blocks."""
+    token = request_query_wrappers.set(request_query_wrappers.get() + (wrapper_for,))
+    try:
+        with _installed((wrapper_for,)):
+            yield
+    finally:
+        request_query_wrappers.reset(token)
+
+
+@contextmanager
+def inherited_query_wrappers():
+    """Install the wrappers of the request whose context is current on this thread's connections."""
+    with _installed(request_query_wrappers.get()):
+        yield
+
+
+class QueryRecorder:
+    """execute_wrapper callable that records (alias, sql, params, duration) per statement."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.queries = []
+        self.sql_time = 0.0
+
+    def wrapper_for(self, alias):
+        def record(execute, sql, params, many, context):
+            started = time.perf_counter()
+            try:
+                return execute(sql, params, many, context)
+            finally:
+                duration = time.perf_counter() - started
+                with self.lock:
+                    self.sql_time += duration
+                    self.queries.append((alias, sql, params, many, duration))
+        return record
+
+
+def shorten(text, limit=500):
+    text = str(text)
+    return text if len(text) <= limit else text[:limit] + f'... ({len(text)} chars)'
+
+
+def explain(alias, sql, params):
+    connection = connections[alias]
+    prefix = 'EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite' else 'EXPLAIN '
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql, params)
+            return [' '.join(str(column) for column in row) for row in cursor.fetchall()]
+    except DatabaseError as exc:
+        return [f'(no plan: {exc})']
+
+
+class QueryTimingMiddleware:
+
+    def __init__(self, get_response):
+        options = settings.REQUEST_TIMING
+        if not options.get('ENABLED'):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow_ms = options.get('SLOW_REQUEST_MS', 500)
+        self.slow_queries = options.get('SLOW_REQUEST_QUERIES', 100)
+        self.explain_limit = options.get('EXPLAIN_LIMIT', 5)
+
+    def __call__(self, request):
+        recorder = QueryRecorder()
+        started = time.perf_counter()
+        request._timing_view_started = None
+        with query_wrapper(recorder.wrapper_for):
+            response = self.get_response(request)
+        finished = time.perf_counter()
+
+        total_ms = (finished - started) * 1000
+        view_started = request._timing_view_started or started
+        view_ms = (finished - view_started) * 1000
+        sql_ms = recorder.sql_time * 1000
+        count = len(recorder.queries)
+        response['Server-Timing'] = (
+            f'sql;dur={sql_ms:.2f};desc="{count} queries", view;dur={view_ms:.2f}, total;dur={total_ms:.2f}'
+        )
+
+        if total_ms >= self.slow_ms or count > self.slow_queries:
+            self.log_slow_request(request, response, recorder, total_ms, sql_ms)
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        request._timing_view_started = time.perf_counter()
+
+    def log_slow_request(self, request, response, recorder, total_ms, sql_ms):
+        lines = [
+            f'{request.method} {request.get_full_path()} -> {response.status_code}: '
+            f'{total_ms:.1f} ms total, {len(recorder.queries)} queries in {sql_ms:.1f} ms'
+        ]
+
+        slowest = sorted(recorder.queries, key=lambda query: query[-1], reverse=True)[:self.explain_limit]
+        for alias, sql, params, many, duration in slowest:
+            lines.append(f'  {duration * 1000:.2f} ms [{alias}] {shorten(sql)} {shorten(repr(params), 200)}')
+            if not many and sql.lstrip().upper().startswith('SELECT'):
+                lines.extend(f'      {step}' for step in explain(alias, sql, params))
+
+        repeated = Counter(sql for _, sql, _, _, _ in recorder.queries)
+        for sql, times in repeated.most_common():
+            if times < 2:
+                break
+            lines.append(f'  repeated {times}x: {shorten(sql)}')
+
+        logger.warning('\n'.join(lines))
+
+
+class MetricsMiddleware:
+    """Counts each request and records its latency and query count, labeled by URL name."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        lock = threading.Lock()
+        queries = 0
+
+        def count(execute, sql, params, many, context):
+            nonlocal queries
+            with lock:
+                queries += 1
+            return execute(sql, params, many, context)
+
+        started = time.perf_counter()
+        with query_wrapper(lambda alias: count):
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.url_name or match.view_name) if match else 'unmatched'
+        metrics.inc('budget_http_requests_total', view=view, method=request.method, status=response.status_code)
+        if response.status_code >= 500:
+            metrics.inc('budget_http_request_errors_total', view=view)
+        metrics.observe('budget_http_request_duration_seconds', duration, view=view)
+        metrics.observe('budget_db_queries_per_request', queries, view=view)
+        return response
@@ -0,0 +1,154 @@
+"""
+Read replicas: routing the budget app's reads to copies of the primary database.
+
+settings.DATABASE_REPLICAS names database aliases that hold copies of the
+primary ('default'). SQLITE_REPLICA_PATHS fills it in (see settings.py) and
+`manage.py refresh_replicas` copies the primary into each SQLite replica.
+With no replica configured every query goes to the primary, as before.
+
+ReplicaRouter only moves the reads of the budget app's models made while a
+request is handled: lists, the dashboard, categories. Everything else stays
+on the primary. Users and tokens stay there so that a new login works at
+once, and so does work outside requests (management commands, the group
+commit writer), which may read what it is about to write. A read made inside
+a transaction on the primary stays on the primary, and writes always go to
+the primary.
+
+A replica lags the primary by up to its refresh interval. So that users see
+their own changes, a request that writes pins its user to the primary for
+settings.READ_YOUR_WRITES_SECONDS. Pins live in the cache named by
+settings.REPLICA_PIN_CACHE_ALIAS, which all worker processes must share for
+a pin to hold across them.
+
+ReplicaRoutingMiddleware gives each request its routing state, and the
+user_authenticated signal of CachedTokenAuthentication records the
+authenticated user in it. A request
+picks one replica at its first read and keeps it, so all of its queries see
+the same copy.
+"""
+import contextvars
+import random
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from authentication.authentication import user_authenticated
+
+ROUTED_APPS = {'budget'}
+
+
+class RoutingState:
+    """What the router knows about the request being handled."""
+
+    def __init__(self):
+        self.user_id = None
+        self.pinned = None  # Looked up at the first read that needs it.
+        self.replica = None
+
+
+request_routing = contextvars.ContextVar('request_routing', default=None)
+
+
+def get_cache():
+    return caches[settings.REPLICA_PIN_CACHE_ALIAS]
+
+
+def pin_key(user_id):
+    return f'replicas:pin:{user_id}'
+
+
+def pin(user_id):
+    """Send the reads of `user_id` to the primary for the next READ_YOUR_WRITES_SECONDS."""
+    get_cache().set(pin_key(user_id), True, settings.READ_YOUR_WRITES_SECONDS)
+
+
+def is_pinned(user_id):
+    return get_cache().get(pin_key(user_id), False)
+
+
+def set_user(user_id):
+    """Record the authenticated user of the current request, if its reads are routed."""
+    state = request_routing.get()
+    if state is not None and state.user_id != user_id:
+        state.user_id = user_id
+        state.pinned = None
+
+
+def _user_authenticated(sender, user, **kwargs):
+    set_user(user.pk)
+
+
+def connect():
+    user_authenticated.connect(_user_authenticated, dispatch_uid='BudgetTracker.replicas.user_authenticated')
+
+
+def refresh(alias):
+    """
+    Copy the primary into the SQLite replica `alias`.
+
+    The copy is made in place with SQLite's backup API, so connections
+    already open on the replica see the new data at their next read.
+    """
+    source, target = connections[DEFAULT_DB_ALIAS], connections[alias]
+    source.ensure_connection()
+    target.ensure_connection()
+    source.connection.backup(target.connection)
+
+
+class ReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        state = request_routing.get()
+        replicas = settings.DATABASE_REPLICAS
+        if state is None or not replicas or model._meta.app_label not in ROUTED_APPS:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        if state.user_id is not None:
+            if state.pinned is None:
+                state.pinned = is_pinned(state.user_id)
+            if state.pinned:
+                return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = random.choice(replicas)
+        return state.replica
+
+    def db_for_write(self, model, **hints):
+        state = request_routing.get()
+        if state is not None and state.user_id is not None and not state.pinned:
+            pin(state.user_id)
+            state.pinned = True
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db in settings.DATABASE_REPLICAS:
+            # Saving an object that was read from a replica.
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        copies = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in copies and obj2._state.db in copies:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False  # Replicas get the primary's schema with its data.
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """Gives each request its own routing state. Unused without replicas."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        token = request_routing.set(RoutingState())
+        try:
+            return self.get_response(request)
+        finally:
+            request_routing.reset(token)
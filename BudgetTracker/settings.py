@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/4.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 
@@ -49,8 +50,18 @@ CORS_ALLOW_ALL_ORIGINS = True
 AUTH_USER_MODEL = 'authentication.User'
 
 REST_FRAMEWORK = {
+    # orjson when installed, DRF's stdlib JSON otherwise; see BudgetTracker/fast_json.py.
+    'DEFAULT_RENDERER_CLASSES': [
+        'BudgetTracker.fast_json.JSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'BudgetTracker.fast_json.JSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'authentication.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticated',
@@ -58,6 +69,11 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'BudgetTracker.middleware.MetricsMiddleware',
+    'BudgetTracker.middleware.QueryTimingMiddleware',
+    'BudgetTracker.compression.CompressionMiddleware',
+    'BudgetTracker.replicas.ReplicaRoutingMiddleware',
+    'budget.shards.ShardRoutingMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -68,6 +84,48 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# brotli (if installed) or gzip for response bodies of MIN_SIZE bytes and
+# more, as the client accepts; see BudgetTracker/compression.py.
+RESPONSE_COMPRESSION = {
+    'ENABLED': os.environ.get('RESPONSE_COMPRESSION_ENABLED', '1') == '1',
+    'MIN_SIZE': int(os.environ.get('RESPONSE_COMPRESSION_MIN_SIZE', 1024)),
+    'BROTLI_QUALITY': int(os.environ.get('RESPONSE_COMPRESSION_BROTLI_QUALITY', 5)),
+}
+
+# Server-Timing headers and the slow request log; see BudgetTracker/middleware.py.
+REQUEST_TIMING = {
+    'ENABLED': os.environ.get('REQUEST_TIMING_ENABLED', '1') == '1',
+    'SLOW_REQUEST_MS': float(os.environ.get('SLOW_REQUEST_MS', 500)),
+    'SLOW_REQUEST_QUERIES': int(os.environ.get('SLOW_REQUEST_QUERIES', 100)),
+    'EXPLAIN_LIMIT': 5,
+}
+
+# /metrics; see BudgetTracker/metrics.py. Each worker process writes its own
+# file to METRICS_DIR; without a directory only the serving process is reported.
+METRICS_DIR = os.environ.get('METRICS_DIR', '')
+METRICS_FLUSH_INTERVAL = float(os.environ.get('METRICS_FLUSH_INTERVAL', 5))
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')
+
+SLOW_REQUEST_LOG = os.environ.get('SLOW_REQUEST_LOG')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'slow_requests': (
+            {'class': 'logging.FileHandler', 'filename': SLOW_REQUEST_LOG} if SLOW_REQUEST_LOG
+            else {'class': 'logging.StreamHandler'}
+        ),
+    },
+    'loggers': {
+        'BudgetTracker.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
 ROOT_URLCONF = 'BudgetTracker.urls'
 
 TEMPLATES = [
@@ -121,13 +179,143 @@ WSGI_APPLICATION = 'BudgetTracker.wsgi.application'
 #     }
 # }
 
+# DATABASE_MODE=production tunes SQLite for several worker processes: WAL,
+# the PRAGMAs below on every new connection and persistent connections. See
+# BudgetTracker/database.py.
+DATABASE_MODE = os.environ.get('DATABASE_MODE', 'development')
+PRODUCTION_DATABASE = DATABASE_MODE == 'production'
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        'NAME': os.environ.get('SQLITE_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': int(os.environ.get('DB_CONN_MAX_AGE', 600 if PRODUCTION_DATABASE else 0)),
+        'CONN_HEALTH_CHECKS': PRODUCTION_DATABASE,
     }
 }
 
+SQLITE_PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': -64000,  # KiB, i.e. 64 MB per connection.
+    'mmap_size': 256 * 1024 * 1024,
+    'temp_store': 'MEMORY',
+    'busy_timeout': int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000)),
+}
+SQLITE_PRAGMAS = SQLITE_PRODUCTION_PRAGMAS if PRODUCTION_DATABASE else {}
+
+# Writes that find the database locked are rolled back and run again.
+DATABASE_WRITE_RETRY = {
+    'ATTEMPTS': int(os.environ.get('DATABASE_WRITE_ATTEMPTS', 6)),
+    'BASE_DELAY': 0.005,  # Seconds; doubles per attempt, with full jitter.
+    'MAX_DELAY': 0.25,
+}
+
+# Transaction creates from concurrent requests share commits; see
+# budget/group_commit.py. A batch closes at MAX_BATCH rows or MAX_DELAY_MS
+# after its first row, whichever comes first.
+GROUP_COMMIT = {
+    'ENABLED': os.environ.get('GROUP_COMMIT_ENABLED', '0') == '1',
+    'MAX_BATCH': int(os.environ.get('GROUP_COMMIT_MAX_BATCH', 64)),
+    'MAX_DELAY_MS': float(os.environ.get('GROUP_COMMIT_MAX_DELAY_MS', 2)),
+}
+
+# Delta sync (GET /api/sync/, see budget/sync.py). OVERLAP_SECONDS is how
+# far back a cursor reaches to catch writes that were still waiting for the
+# database lock; it must exceed the longest write. Deletes are remembered for
+# TOMBSTONE_DAYS (`manage.py prune_tombstones`); older cursors get a full sync.
+SYNC = {
+    'OVERLAP_SECONDS': float(os.environ.get('SYNC_OVERLAP_SECONDS', 10)),
+    'TOMBSTONE_DAYS': int(os.environ.get('SYNC_TOMBSTONE_DAYS', 90)),
+}
+
+# Read replicas: copies of the primary ('default') that serve the budget
+# app's reads during requests; see BudgetTracker/replicas.py.
+# SQLITE_REPLICA_PATHS is a comma-separated list of SQLite files, registered
+# as replica1, replica2, ... and kept up to date by `manage.py
+# refresh_replicas`. A user who writes reads from the primary for the next
+# READ_YOUR_WRITES_SECONDS, which must exceed the replicas' lag.
+DATABASE_REPLICAS = []
+for _number, _path in enumerate(filter(None, os.environ.get('SQLITE_REPLICA_PATHS', '').split(',')), 1):
+    DATABASES[f'replica{_number}'] = {**DATABASES['default'], 'NAME': _path.strip(), 'TEST': {'MIRROR': 'default'}}
+    DATABASE_REPLICAS.append(f'replica{_number}')
+
+READ_YOUR_WRITES_SECONDS = float(os.environ.get('READ_YOUR_WRITES_SECONDS', 5))
+
+# Per-user shards: SQLITE_SHARD_PATHS is a comma-separated list of SQLite
+# files, registered as shard0, shard1, ... Each user's budget data lives in
+# the shard picked by a hash of their id; users stay in 'default' and are
+# copied to their shard. See budget/shards.py, and run `manage.py
+# migrate_shards` instead of migrate. Replicas copy the default database
+# only, so they serve no budget reads in this mode.
+DATABASE_SHARDS = []
+for _number, _path in enumerate(filter(None, os.environ.get('SQLITE_SHARD_PATHS', '').split(','))):
+    DATABASES[f'shard{_number}'] = {**DATABASES['default'], 'NAME': _path.strip()}
+    DATABASE_SHARDS.append(f'shard{_number}')
+
+DATABASE_ROUTERS = ['budget.shards.ShardRouter', 'BudgetTracker.replicas.ReplicaRouter']
+
+
+
+# Caches
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+#
+# The 'dashboard' cache holds rendered financial-data payloads. LocMemCache
+# evicts in least-recently-used order once MAX_ENTRIES is reached, but only
+# suits a single process: writes invalidate entries in the cache of the
+# worker that handled them. With several workers point DASHBOARD_CACHE_BACKEND
+# at FileBasedCache (with a shared LOCATION), at the cost of random culling;
+# in production mode a system check (budget.E001) refuses LocMemCache.
+
+DASHBOARD_CACHE_ALIAS = 'dashboard'
+
+# Token -> user lookups made by CachedTokenAuthentication. TIMEOUT is how long
+# a cached identity is trusted without going back to the database. Logout and
+# deactivation evict entries, so with several worker processes the backend
+# must be shared between them, e.g. FileBasedCache; in production mode a
+# system check (authentication.E001) refuses LocMemCache.
+
+AUTH_TOKEN_CACHE_ALIAS = 'auth_tokens'
+
+# Users pinned to the primary database after a write. With several worker
+# processes the backend must be shared between them, e.g. FileBasedCache.
+
+REPLICA_PIN_CACHE_ALIAS = 'replica_pins'
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    DASHBOARD_CACHE_ALIAS: {
+        'BACKEND': os.environ.get('DASHBOARD_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('DASHBOARD_CACHE_LOCATION', 'budget-dashboard'),
+        'TIMEOUT': int(os.environ.get('DASHBOARD_CACHE_TIMEOUT', 60 * 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('DASHBOARD_CACHE_MAX_ENTRIES', 5000)),
+            'CULL_FREQUENCY': 10,
+        },
+    },
+    AUTH_TOKEN_CACHE_ALIAS: {
+        'BACKEND': os.environ.get('AUTH_TOKEN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('AUTH_TOKEN_CACHE_LOCATION', 'auth-tokens'),
+        'TIMEOUT': int(os.environ.get('AUTH_TOKEN_CACHE_TTL', 5 * 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('AUTH_TOKEN_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+    REPLICA_PIN_CACHE_ALIAS: {
+        'BACKEND': os.environ.get('REPLICA_PIN_CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('REPLICA_PIN_CACHE_LOCATION', 'replica-pins'),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('REPLICA_PIN_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+# Threads shared by all requests of a process for the concurrent reads of the
+# async financial-data view; see budget/async_views.py. Each thread holds its
+# own database connection.
+DASHBOARD_QUERY_WORKERS = int(os.environ.get('DASHBOARD_QUERY_WORKERS', 4))
 
 
 # Internationalization
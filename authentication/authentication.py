@@ -0,0 +1,74 @@
+"""
+Token authentication with a cache in front of the token lookup.
+
+DRF's TokenAuthentication loads the token and its user with a join on every
+request. CachedTokenAuthentication keeps the (user, token) pair in the cache
+named by settings.AUTH_TOKEN_CACHE_ALIAS, so that an authenticated request
+is identified without a query. The cache's TIMEOUT bounds how long an entry
+is trusted and MAX_ENTRIES bounds its size.
+
+Entries are dropped as soon as the token is deleted (logout) or the user is
+saved or deleted (deactivation, password changes); see signals.py. Writes
+that bypass model signals, such as QuerySet.update(), are only picked up
+once the entry expires.
+
+Every successful authentication sends user_authenticated. The database
+routers listen to it to send the request's queries to the user's shard and,
+after a write, to the primary; see budget/shards.py and
+BudgetTracker/replicas.py.
+"""
+import hashlib
+
+from django.conf import settings
+from django.core.cache import caches
+from django.dispatch import Signal
+from django.utils.translation import gettext_lazy as _
+from rest_framework import exceptions
+from rest_framework.authentication import TokenAuthentication
+
+from BudgetTracker import metrics
+
+# Sent with `user` once a request's token is accepted, before the view runs.
+user_authenticated = Signal()
+
+
+def get_cache():
+    return caches[settings.AUTH_TOKEN_CACHE_ALIAS]
+
+
+def token_cache_key(key):
+    # Raw token keys are credentials, so they are never used as cache keys.
+    return 'auth:token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def user_cache_key(user_id):
+    return f'auth:user:{user_id}'
+
+
+def forget_token(key):
+    get_cache().delete(token_cache_key(key))
+
+
+def forget_user(user_id):
+    """Drop the cached token of `user_id`, if any."""
+    cache = get_cache()
+    key = cache.get(user_cache_key(user_id))
+    cache.delete_many([user_cache_key(user_id)] + ([token_cache_key(key)] if key else []))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication that serves repeat lookups of a token from the cache."""
+
+    def authenticate_credentials(self, key):
+        cache = get_cache()
+        cached = cache.get(token_cache_key(key))
+        metrics.inc('budget_cache_requests_total', cache='auth_tokens', result='miss' if cached is None else 'hit')
+        if cached is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set_many({token_cache_key(key): (user, token), user_cache_key(user.pk): key})
+        else:
+            user, token = cached
+            if not user.is_active:
+                raise exceptions.AuthenticationFailed(_('User inactive or deleted.'))
+        user_authenticated.send(sender=self.__class__, user=user)
+        return user, token
@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.checks import Tags, register
+
+from BudgetTracker.checks import shared_cache_errors
+
+
+@register(Tags.caches)
+def token_cache_is_shared(app_configs, **kwargs):
+    return shared_cache_errors(
+        settings.AUTH_TOKEN_CACHE_ALIAS,
+        hint="A logout or deactivation only evicts the token in the worker that handled it. Set "
+             "AUTH_TOKEN_CACHE_BACKEND and AUTH_TOKEN_CACHE_LOCATION to a shared backend such as FileBasedCache.",
+        id='authentication.E001',
+    )
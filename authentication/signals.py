@@ -0,0 +1,21 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from rest_framework.authtoken.models import Token
+
+from .authentication import forget_token, forget_user
+
+User = get_user_model()
+
+
+def token_deleted(sender, instance, **kwargs):
+    forget_token(instance.key)
+
+
+def user_changed(sender, instance, **kwargs):
+    forget_user(instance.pk)
+
+
+def connect():
+    post_delete.connect(token_deleted, sender=Token, dispatch_uid='authentication.token_deleted')
+    post_save.connect(user_changed, sender=User, dispatch_uid='authentication.user_saved')
+    post_delete.connect(user_changed, sender=User, dispatch_uid='authentication.user_deleted')
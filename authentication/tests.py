@@ -1,3 +1,77 @@
-from django.test import TestCase
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import TestCase, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
 
-# Create your tests here.
+from .authentication import get_cache, user_authenticated
+from .checks import token_cache_is_shared
+
+User = get_user_model()
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        get_cache().clear()
+        self.user = User.objects.create_user(
+            email='owner@example.com', password='s3cret-pass', first_name='Owner', last_name='User'
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def test_profile_is_answered_from_the_cached_user(self):
+        with self.assertNumQueries(1):
+            first = self.client.get('/api/auth/profile/')
+        self.assertEqual(first.status_code, 200)
+
+        with self.assertNumQueries(0):
+            second = self.client.get('/api/auth/profile/')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second.data['email'], 'owner@example.com')
+
+    def test_logout_invalidates_the_token(self):
+        self.client.get('/api/auth/profile/')
+        self.assertEqual(self.client.post('/api/auth/logout/').status_code, 200)
+
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_deactivation_and_profile_changes_invalidate_the_user(self):
+        self.client.get('/api/auth/profile/')
+        self.user.first_name = 'Renamed'
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').data['first_name'], 'Renamed')
+
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_unknown_tokens_are_rejected_and_not_cached(self):
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-real-token')
+        for _ in range(2):
+            with self.assertNumQueries(1):
+                self.assertEqual(self.client.get('/api/auth/profile/').status_code, 401)
+
+    def test_authentication_is_signalled_for_cached_and_fresh_tokens(self):
+        received = []
+
+        def receiver(sender, user, **kwargs):
+            received.append(user.pk)
+
+        user_authenticated.connect(receiver)
+        self.addCleanup(user_authenticated.disconnect, receiver)
+        for _ in range(2):
+            self.client.get('/api/auth/profile/')
+        self.client.credentials(HTTP_AUTHORIZATION='Token not-a-real-token')
+        self.client.get('/api/auth/profile/')
+
+        self.assertEqual(received, [self.user.pk, self.user.pk])
+
+    def test_production_mode_requires_a_shared_token_cache(self):
+        self.assertEqual(token_cache_is_shared(None), [])
+        with override_settings(PRODUCTION_DATABASE=True):
+            self.assertEqual([error.id for error in token_cache_is_shared(None)], ['authentication.E001'])
+            shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/tokens'}
+            with override_settings(CACHES={**settings.CACHES, settings.AUTH_TOKEN_CACHE_ALIAS: shared}):
+                self.assertEqual(token_cache_is_shared(None), [])
@@ -4,3 +4,11 @@ from django.apps import AppConfig
 class BudgetConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'budget'
+
+    def ready(self):
+        from BudgetTracker import database, replicas
+
+        from . import checks, shards  # Importing checks registers them.
+        database.connect()
+        replicas.connect()
+        shards.connect()
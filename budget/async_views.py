@@ -0,0 +1,141 @@
+"""
+Async variant of the financial-data endpoint, for deployments served under ASGI.
+
+get_financial_data runs its four reads (budgets, the month's transactions,
+categories and the monthly summary) one after another. The async view hands
+them to a pool of settings.DASHBOARD_QUERY_WORKERS threads and awaits them
+together, so a cache miss takes about as long as the slowest read instead of
+their sum. Django's async ORM methods would not help: in Django 4.2 they all
+run on the request's single sync thread, one at a time.
+
+The pool is shared by every request of the process, which bounds the number
+of extra database connections. Authentication, permissions and rendering go
+through DRF as for the sync view, and validation, the dashboard cache and
+ETag revalidation are the sync view's own functions. They run on the
+request's sync thread before and after the reads.
+
+Other connections cannot see rows that the request's connection has not
+committed yet, so inside an atomic block (ATOMIC_REQUESTS, tests) the reads
+stay on the request's thread and run one after another.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, connection
+from rest_framework import exceptions, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from BudgetTracker.middleware import inherited_query_wrappers
+
+from . import views
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.DASHBOARD_QUERY_WORKERS, thread_name_prefix='dashboard-query'
+            )
+    return _executor
+
+
+def _run_in_worker(func, args):
+    # Pool threads live outside the request cycle, so they retire their
+    # connections the way request_started/request_finished would.
+    close_old_connections()
+    try:
+        with inherited_query_wrappers():
+            return func(*args)
+    finally:
+        close_old_connections()
+
+
+async def run_concurrently(calls):
+    """Run (func, args) pairs on the query pool at once; returns their results in order."""
+    loop = asyncio.get_running_loop()
+    executor = get_executor()
+    return await asyncio.gather(*(
+        loop.run_in_executor(executor, contextvars.copy_context().run, _run_in_worker, func, args)
+        for func, args in calls
+    ))
+
+
+async def build_financial_data_concurrently(user_id, month, summary_range):
+    """Same result as views.build_financial_data(), with the reads running concurrently."""
+    parts = views.dashboard_parts(user_id, month, summary_range)
+    results = await run_concurrently([(func, args) for _, func, args in parts])
+    return {key: result for (key, _, _), result in zip(parts, results)}
+
+
+class FinancialDataAPIView(APIView):
+    """
+    DRF's request handling for the async view. DRF cannot dispatch to a
+    coroutine, so the view drives authentication, permission and throttle
+    checks, content negotiation and rendering itself through these methods.
+    """
+
+    @property
+    def allowed_methods(self):
+        return ['GET']
+
+    def start(self, django_request):
+        """Wrap and check the request; returns (DRF request, None) or (DRF request, error response)."""
+        self.args, self.kwargs = (), {}
+        request = self.initialize_request(django_request)
+        self.request = request
+        self.headers = self.default_response_headers
+        try:
+            if request.method != 'GET':
+                raise exceptions.MethodNotAllowed(request.method)
+            self.initial(request)
+        except Exception as exc:
+            return request, self.finish(self.handle_exception(exc))
+        return request, None
+
+    def finish(self, response):
+        return self.finalize_response(self.request, response).render()
+
+
+def _prepare(view, django_request):
+    """Everything before the reads. Returns (plan, None), or (None, response) when already answered."""
+    request, error = view.start(django_request)
+    if error is not None:
+        return None, error
+
+    query, message = views.parse_financial_data_query(request.query_params, request.user.id)
+    if message:
+        return None, view.finish(Response({"error": message}, status=status.HTTP_400_BAD_REQUEST))
+
+    answer, state = views.financial_data_preflight(request, *query)
+    if answer:
+        answer_status, data, headers = answer
+        return None, view.finish(Response(data, status=answer_status, headers=headers))
+    return (query, state, connection.in_atomic_block), None
+
+
+def _respond(view, query, state, data):
+    user_id, month, _ = query
+    return view.finish(Response(data, headers=views.store_financial_data(user_id, month, state, data)))
+
+
+async def get_financial_data_async(request):
+    view = FinancialDataAPIView()
+    plan, response = await sync_to_async(_prepare)(view, request)
+    if response is not None:
+        return response
+
+    query, state, in_transaction = plan
+    if in_transaction:
+        data = await sync_to_async(views.build_financial_data)(*query)
+    else:
+        data = await build_financial_data_concurrently(*query)
+    return await sync_to_async(_respond)(view, query, state, data)
@@ -0,0 +1,163 @@
+"""
+Batched create/update/delete of transactions.
+
+Clients replaying queued offline edits send them as one list of operations:
+
+    {"operations": [
+        {"op": "create", "ref": "tmp-1", "data": {...}},
+        {"op": "update", "id": 42, "data": {...}},
+        {"op": "delete", "id": 43}
+    ]}
+
+Each operation is validated with TransactionSerializer rules, in order,
+against the state left by the operations before it. The owner is always
+the caller, and referenced categories are loaded in one query up front.
+Valid operations are then written together with one bulk_create, one
+bulk_update and one DELETE inside a single atomic block. Every operation
+gets a result entry with an HTTP-style status, and `ref` is echoed back so
+clients can map their temporary ids to created rows.
+"""
+from django.utils import timezone
+from rest_framework import serializers
+
+from BudgetTracker import database
+
+from . import dashboard_cache, rollups, shards, sync, versioning
+from .models import Category, Tombstone, Transaction
+from .serializers import TransactionBatchSerializer, TransactionSerializer
+
+MAX_OPERATIONS = 500
+
+UPDATABLE_FIELDS = ['type', 'amount', 'category', 'date', 'description', 'updated_at']
+
+# Ids of updates and deletes: integers, or strings of them, that fit the primary key column.
+ID_FIELD = serializers.IntegerField(min_value=1, max_value=2 ** 63 - 1)
+
+
+class BatchError(ValueError):
+    """The request body is not a list of operations."""
+
+
+def _result(index, operation, status, **extra):
+    result = {'index': index, 'op': operation.get('op'), 'status': status}
+    if 'ref' in operation:
+        result['ref'] = operation['ref']
+    result.update(extra)
+    return result
+
+
+def parse_operations(payload):
+    operations = payload.get('operations') if isinstance(payload, dict) else payload
+    if not isinstance(operations, list):
+        raise BatchError("Body must be a list of operations or an object with an 'operations' list")
+    if len(operations) > MAX_OPERATIONS:
+        raise BatchError(f"A batch may contain at most {MAX_OPERATIONS} operations")
+    return operations
+
+
+def _category_ids(operations):
+    ids = set()
+    for operation in operations:
+        data = operation.get('data') if isinstance(operation, dict) else None
+        if isinstance(data, dict):
+            try:
+                ids.add(int(data.get('category')))
+            except (TypeError, ValueError):
+                pass
+    return ids
+
+
+def _operation_ids(operations):
+    """({index: id}, {index: errors}) for the update and delete operations."""
+    ids, errors = {}, {}
+    for index, operation in enumerate(operations):
+        if isinstance(operation, dict) and operation.get('op') in ('update', 'delete'):
+            try:
+                ids[index] = ID_FIELD.run_validation(operation.get('id'))
+            except serializers.ValidationError as exc:
+                errors[index] = exc.detail
+    return ids, errors
+
+
+def apply_batch(operations, request):
+    """Validate and apply `operations` for request.user; returns per-operation results."""
+    user = request.user
+    ids, id_errors = _operation_ids(operations)
+    existing = Transaction.objects.filter(
+        user=user, id__in=set(ids.values())
+    ).select_related('category').in_bulk()
+    originals = {pk: rollups.snapshot(txn) for pk, txn in existing.items()}
+    categories = Category.objects.in_bulk(_category_ids(operations))
+
+    results = []
+    creates = []
+    updated = {}
+    deleted = set()
+
+    for index, operation in enumerate(operations):
+        if not isinstance(operation, dict) or operation.get('op') not in ('create', 'update', 'delete'):
+            results.append(_result(index, operation if isinstance(operation, dict) else {}, 400,
+                                   errors={'op': ["Must be one of 'create', 'update' or 'delete'"]}))
+            continue
+
+        op = operation['op']
+        data = operation.get('data') or {}
+        if op == 'create':
+            serializer = TransactionBatchSerializer(data=data, context={'request': request}, categories=categories)
+            if not serializer.is_valid():
+                results.append(_result(index, operation, 400, errors=serializer.errors))
+                continue
+            instance = Transaction(**dict(serializer.validated_data, user=user))
+            creates.append(instance)
+            results.append(_result(index, operation, 201, instance=instance))
+            continue
+
+        if index in id_errors:
+            results.append(_result(index, operation, 400, errors={'id': id_errors[index]}))
+            continue
+        instance = existing.get(ids[index])
+        if instance is None or instance.pk in deleted:
+            results.append(_result(index, operation, 404, errors={'id': ['Transaction not found']}))
+            continue
+
+        if op == 'delete':
+            deleted.add(instance.pk)
+            updated.pop(instance.pk, None)
+            results.append(_result(index, operation, 204, id=instance.pk))
+            continue
+
+        serializer = TransactionBatchSerializer(
+            instance, data=data, context={'request': request}, partial=True, categories=categories
+        )
+        if not serializer.is_valid():
+            results.append(_result(index, operation, 400, errors=serializer.errors))
+            continue
+        for field, value in serializer.validated_data.items():
+            setattr(instance, field, value)
+        instance.updated_at = timezone.now()
+        updated[instance.pk] = instance
+        results.append(_result(index, operation, 200, instance=instance))
+
+    for attempt in database.write_attempts(shards.current()):
+        with attempt:
+            created = database.bulk_create_new(Transaction, creates)
+            Transaction.objects.bulk_update(list(updated.values()), UPDATABLE_FIELDS)
+            if deleted:
+                Transaction.objects.filter(user=user, id__in=deleted).delete()
+                sync.record_deleted(Tombstone.TRANSACTION, user.id, deleted)
+
+            changes = [(rollups.snapshot(txn), 1) for txn in created]
+            for pk in set(updated) | deleted:
+                changes.append((originals[pk], -1))
+            changes.extend((rollups.snapshot(txn), 1) for txn in updated.values())
+            rollups.apply_changes(changes)
+            if changes:
+                versioning.bump(user.id)
+                dashboard_cache.transactions_changed(snapshot for snapshot, sign in changes)
+
+    for result in results:
+        instance = result.pop('instance', None)
+        if instance is not None:
+            result['id'] = instance.pk
+            result['data'] = TransactionSerializer(instance).data
+    return results
@@ -0,0 +1,740 @@
+"""
+Micro-benchmarks for hot code paths, run with `manage.py benchmark`.
+
+Each benchmark is a function registered with @benchmark(name). It receives
+a `report` callable for output lines plus the command's options, creates
+the rows it needs, and times the paths it compares. A benchmark may return
+a list of Regressions, which makes the command fail. The command runs
+every benchmark against a throwaway test database, so the configured
+database is never written to.
+"""
+import asyncio
+import json
+import logging
+import os
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from datetime import timedelta
+from decimal import Decimal
+from typing import Callable, NamedTuple, Optional
+
+from django.apps.registry import Apps
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connection, connections, models, transaction
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import URLPattern
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+import authentication.urls
+from BudgetTracker import compression, fast_json, metrics
+from BudgetTracker.middleware import query_wrapper
+
+from . import async_views, fast_serializers, group_commit, seeding, shards, sync, urls, versioning, views
+from .fields import cents
+from .models import Category, MonthlyBudget, Transaction
+from .serializers import CategorySerializer, TransactionSerializer
+
+BENCHMARKS = {}
+
+
+class Regression(NamedTuple):
+    case: str
+    detail: str
+
+
+def benchmark(name):
+    def register(func):
+        BENCHMARKS[name] = func
+        return func
+    return register
+
+
+def measure(func, repeat):
+    """(result of the last call, per-call timings in ms, queries of one call)."""
+    queries = []
+
+    def record(execute, sql, params, many, context):
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    # query_wrapper() also sees the queries that func hands to other threads.
+    with query_wrapper(lambda alias: record):
+        result = func()
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func()
+        timings.append((time.perf_counter() - started) * 1000)
+    return result, timings, len(queries)
+
+
+def compare(report, title, paths, repeat):
+    """Time each (label, func) in `paths`, check their outputs agree and report the speedups."""
+    report(title)
+    baseline = expected = None
+    for label, func in paths:
+        output, timings, queries = measure(func, repeat)
+        median = statistics.median(timings)
+        if baseline is None:
+            baseline, expected = median, output
+        elif output != expected:
+            raise AssertionError(f'{label} output differs from {paths[0][0]}')
+        report(f'  {label:<38} {median:8.3f} ms  p95 {percentile(timings, 95):8.3f} ms  '
+               f'{queries:3d} queries  {baseline / median:5.1f}x')
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(pct / 100 * (len(ordered) - 1)))]
+
+
+def make_user(email='bench@example.com'):
+    return get_user_model().objects.create_user(
+        email=email, password='benchmark', first_name='Bench', last_name='Mark'
+    )
+
+
+@benchmark('list-serialization')
+def list_serialization(report, repeat=50, rows=2000, page_size=100, **options):
+    """One page of the transaction and category lists: ModelSerializer vs values() rows."""
+    user = make_user()
+    categories = Category.objects.bulk_create(
+        Category(user=user, name=f'Category {n}', type=Category.EXPENSE, color='#336699')
+        for n in range(page_size)
+    )
+    start = timezone.now()
+    Transaction.objects.bulk_create(
+        Transaction(
+            user=user, type=Transaction.EXPENSE, amount=Decimal(n % 997) + Decimal('0.25'),
+            category=categories[n % len(categories)] if n % 5 else None,
+            date=start - timedelta(hours=n), description=f'Purchase {n}' if n % 3 else None,
+        )
+        for n in range(rows)
+    )
+    renderer = JSONRenderer()
+    transactions = Transaction.objects.filter(user=user).order_by('-date')
+
+    compare(report, f'transaction list, page_size={page_size}', [
+        ('TransactionSerializer', lambda: renderer.render(
+            TransactionSerializer(list(transactions[:page_size]), many=True).data)),
+        ('TransactionSerializer+select_related', lambda: renderer.render(
+            TransactionSerializer(list(transactions.select_related('category')[:page_size]), many=True).data)),
+        ('values() rows', lambda: renderer.render(
+            fast_serializers.transaction_data(fast_serializers.transaction_values(transactions)[:page_size]))),
+    ], repeat)
+
+    owned = Category.objects.filter(user=user)
+    compare(report, f'category list, page_size={page_size}', [
+        ('CategorySerializer', lambda: renderer.render(
+            CategorySerializer(list(owned[:page_size]), many=True).data)),
+        ('values() rows', lambda: renderer.render(
+            fast_serializers.category_data(fast_serializers.category_values(owned)[:page_size]))),
+    ], repeat)
+
+
+@benchmark('json-rendering')
+def json_rendering(report, repeat=50, sizes=(1000, 10000), **options):
+    """DRF's stdlib JSON renderer vs fast_json's, and the compressed sizes, for a month of N transactions."""
+    month = '2024-06'
+    drf_renderer, fast_renderer = JSONRenderer(), fast_json.JSONRenderer()
+    for size in sizes:
+        first_user = seeding.next_user_number()
+        seeding.seed(users=1, transactions_per_user=size, months=1, end_month=month, seed=size, first_user=first_user)
+        user = seeding.seeded_users().get(email=seeding.EMAIL_PATTERN.format(first_user))
+        payloads = [
+            ('financial data', views.build_financial_data(user.pk, month, None)),
+            ('transaction list', fast_serializers.transaction_data(
+                fast_serializers.transaction_values(Transaction.objects.filter(user=user)))),
+        ]
+        for label, data in payloads:
+            compare(report, f'{label} render, {size} transactions', [
+                ('DRF JSONRenderer', lambda: drf_renderer.render(data)),
+                ('fast_json.JSONRenderer', lambda: fast_renderer.render(data)),
+            ], repeat)
+            content = fast_renderer.render(data)
+            report(f"  {'identity':<38} {len(content):>10,} bytes")
+            for encoding in ('gzip', 'br'):
+                if encoding not in compression.available_encodings():
+                    report(f'  {encoding:<38} not installed')
+                    continue
+                compressed, timings, _ = measure(lambda: compression.compress(content, encoding), repeat)
+                report(f'  {encoding:<38} {len(compressed):>10,} bytes  {statistics.median(timings):8.3f} ms  '
+                       f'{len(content) / len(compressed):5.1f}x smaller')
+
+
+def decimal_amounts_model():
+    """A scratch model holding amounts in a DecimalField, as Transaction did before MoneyField."""
+    class Meta:
+        app_label = 'budget'
+        db_table = 'benchmark_decimal_amount'
+        apps = Apps()
+
+    return type('DecimalAmount', (models.Model,), {
+        '__module__': __name__,
+        'Meta': Meta,
+        'type': models.CharField(max_length=7),
+        'date': models.DateTimeField(),
+        'amount': models.DecimalField(max_digits=12, decimal_places=2),
+    })
+
+
+@benchmark('money-storage')
+def money_storage(report, repeat=5, sizes=(1000, 10000), **options):
+    """
+    Amounts as decimals vs integer cents: monthly sums, dashboard floats and list strings.
+
+    Each size is a table of that many transactions; try --sizes 1000000,3000000.
+    """
+    DecimalAmount = decimal_amounts_model()
+    with connection.schema_editor() as editor:
+        editor.create_model(DecimalAmount)
+    format_decimal = serializers.DecimalField(max_digits=12, decimal_places=2).to_representation
+    try:
+        for size in sizes:
+            first_user = seeding.next_user_number()
+            seeding.seed(users=1, transactions_per_user=size, months=24, end_month='2024-12', seed=size,
+                         first_user=first_user)
+            user = seeding.seeded_users().get(email=seeding.EMAIL_PATTERN.format(first_user))
+            try:
+                money_storage_paths(report, repeat, size, user, DecimalAmount, format_decimal)
+            finally:
+                user.delete()
+                DecimalAmount.objects.all().delete()
+    finally:
+        with connection.schema_editor() as editor:
+            editor.delete_model(DecimalAmount)
+
+
+def money_storage_paths(report, repeat, size, user, DecimalAmount, format_decimal):
+    """Time money_storage's paths over `user`'s transactions and a decimal copy of them."""
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {DecimalAmount._meta.db_table} (type, date, amount) "
+            f"SELECT type, date, amount / 100.0 FROM {Transaction._meta.db_table} WHERE user_id = %s",
+            [user.pk]
+        )
+    transactions = Transaction.objects.filter(user=user)
+    paths = [
+        ('totals by type', [
+            ('decimal column', lambda: list(DecimalAmount.objects.values('type')
+                                            .annotate(total=Sum('amount')).order_by())),
+            ('integer cents', lambda: list(transactions.values('type')
+                                           .annotate(total=Sum('amount')).order_by())),
+        ]),
+        ('monthly sums', [
+            ('decimal column', lambda: list(DecimalAmount.objects.annotate(period=TruncMonth('date'))
+                                            .values('period', 'type').annotate(total=Sum('amount'))
+                                            .order_by())),
+            ('integer cents', lambda: list(transactions.annotate(period=TruncMonth('date'))
+                                           .values('period', 'type').annotate(total=Sum('amount'))
+                                           .order_by())),
+        ]),
+        ('amounts as floats (dashboard)', [
+            ('decimal column', lambda: [float(amount) for amount in
+                                        DecimalAmount.objects.values_list('amount', flat=True)]),
+            ('integer cents', lambda: [amount / 100 for amount in
+                                       transactions.values_list(cents('amount'), flat=True)]),
+        ]),
+        ('amounts as strings (lists)', [
+            ('decimal column', lambda: [format_decimal(amount) for amount in
+                                        DecimalAmount.objects.values_list('amount', flat=True)]),
+            ('integer cents', lambda: [fast_serializers.format_amount(amount) for amount in
+                                       transactions.values_list(cents('amount'), flat=True)]),
+        ]),
+    ]
+    for title, cases in paths:
+        report(f'{title}, {size:,} transactions')
+        baseline = None
+        for label, func in cases:
+            _, timings, _ = measure(func, repeat)
+            median = statistics.median(timings)
+            baseline = baseline or median
+            report(f'  {label:<38} {median:9.2f} ms  p95 {percentile(timings, 95):9.2f} ms  '
+                   f'{baseline / median:5.1f}x')
+
+
+class Endpoint(NamedTuple):
+    """One request of the endpoint suite; `path`, `data` and `before` take the fixture."""
+    url_name: str
+    label: str
+    method: str
+    path: Callable
+    data: Optional[Callable] = None
+    client: str = 'user'
+    before: Optional[Callable] = None
+    max_repeat: Optional[int] = None
+    format: Optional[str] = None
+
+
+class Fixture:
+    """Seeded data of one suite size plus authenticated clients for it."""
+
+    end_month = '2024-12'
+
+    def __init__(self, size):
+        # Numbered after any seeded users another benchmark of the same run left.
+        first_user = seeding.next_user_number()
+        seeding.seed(users=5, transactions_per_user=size, months=24, end_month=self.end_month, seed=size,
+                     first_user=first_user)
+        self.user, self.logout_user = (
+            seeding.seeded_users().get(email=seeding.EMAIL_PATTERN.format(number))
+            for number in (first_user, first_user + 1)
+        )
+        self.category = Category.objects.filter(user=self.user).first()
+        self.budget = MonthlyBudget.objects.filter(user=self.user).first()
+        self.transaction = Transaction.objects.filter(user=self.user).first()
+        self.admin = get_user_model().objects.create_superuser(
+            email='bench-admin@example.com', password='benchmark', first_name='Bench', last_name='Admin'
+        )
+        self.calls = 0
+
+        self.clients = {'anonymous': APIClient(), 'user': APIClient(), 'admin': APIClient(), 'logout': APIClient()}
+        token = Token.objects.create(user=self.user)
+        self.clients['user'].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.clients['admin'].force_authenticate(self.admin)
+
+    def next(self):
+        self.calls += 1
+        return self.calls
+
+    def fresh_logout_token(self):
+        token, _ = Token.objects.get_or_create(user=self.logout_user)
+        self.clients['logout'].credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def take_sync_cursor(self):
+        self.sync_cursor = sync.changes(self.user.pk)['cursor']
+
+    def edit_after_sync_cursor(self):
+        self.take_sync_cursor()
+        self.transaction.description = f'Synced {self.next()}'
+        self.transaction.save()
+        versioning.bump(self.user.pk)
+
+    def csv_upload(self):
+        rows = ''.join(f'2024-11-{day % 28 + 1:02d},Expense,{day}.50,Groceries,Import {day}\n' for day in range(50))
+        return {'file': SimpleUploadedFile(
+            'bench.csv', ('date,type,amount,category,description\n' + rows).encode(), content_type='text/csv'
+        )}
+
+
+def _clear_dashboard_cache(fixture):
+    caches['dashboard'].clear()
+
+
+ENDPOINTS = [
+    Endpoint('category-list-create', 'categories GET', 'get', lambda f: '/api/categories/'),
+    Endpoint('category-list-create', 'categories POST', 'post', lambda f: '/api/categories/',
+             lambda f: {'name': f'Bench {f.next()}', 'type': 'Expense', 'user': f.user.pk}),
+    Endpoint('category-detail', 'category PUT', 'put', lambda f: f'/api/categories/{f.category.pk}/',
+             lambda f: {'name': f'Renamed {f.next()}', 'type': 'Expense', 'user': f.user.pk}),
+    Endpoint('category-list-by_user', 'categories by user GET', 'get',
+             lambda f: f'/api/categoriesList/{f.user.pk}/'),
+    Endpoint('monthly-budget-list-create', 'budgets GET', 'get', lambda f: f'/api/monthly-budgets/?user={f.user.pk}'),
+    Endpoint('monthly-budget-list-create', 'budgets POST', 'post', lambda f: '/api/monthly-budgets/',
+             lambda f: {'user': f.user.pk, 'month': f'{2100 + f.next()}-01', 'total_budget_amount': '2500.00'}),
+    Endpoint('monthly-budget-detail', 'budget GET', 'get', lambda f: f'/api/monthly-budgets/{f.budget.pk}/'),
+    Endpoint('monthly-budget-detail', 'budget PUT', 'put', lambda f: f'/api/monthly-budgets/{f.budget.pk}/',
+             lambda f: {'total_budget_amount': f'{2000 + f.next()}.00'}),
+    Endpoint('transaction-list-create', 'transactions GET page', 'get',
+             lambda f: f'/api/transactions/?user={f.user.pk}&page_size=100'),
+    Endpoint('transaction-list-create', 'transactions GET cursor', 'get',
+             lambda f: f'/api/transactions/?user={f.user.pk}&page_size=100&pagination=cursor'),
+    Endpoint('transaction-list-create', 'transactions GET filtered', 'get',
+             lambda f: f'/api/transactions/?user={f.user.pk}&type=Expense&category_id={f.category.pk}'
+                       f'&start_date=2024-06-01&end_date=2024-09-30'),
+    Endpoint('transaction-list-create', 'transactions POST', 'post', lambda f: '/api/transactions/',
+             lambda f: {'user': f.user.pk, 'type': 'Expense', 'amount': '12.34', 'category': f.category.pk,
+                        'date': '2024-12-05T10:00:00Z', 'description': f'Bench {f.next()}'}),
+    Endpoint('transaction-batch', 'transaction batch POST', 'post', lambda f: '/api/transactions/batch/',
+             lambda f: {'operations': [
+                 {'op': 'create', 'ref': str(n), 'data': {
+                     'type': 'Expense', 'amount': '3.50', 'date': '2024-12-06T08:00:00Z', 'description': 'Batch'}}
+                 for n in range(10)
+             ]}, format='json'),
+    Endpoint('transaction-export', 'transaction export GET', 'get',
+             lambda f: '/api/transactions/export/?output=csv&start_date=2024-10-01&end_date=2024-12-31'),
+    Endpoint('transaction-import', 'transaction import POST', 'post', lambda f: '/api/transactions/import/',
+             lambda f: f.csv_upload(), format='multipart', max_repeat=10),
+    Endpoint('transaction-search', 'transaction search GET', 'get', lambda f: '/api/transactions/search/?q=super'),
+    Endpoint('transaction-detail', 'transaction GET', 'get', lambda f: f'/api/transactions/{f.transaction.pk}/'),
+    Endpoint('transaction-detail', 'transaction PUT', 'put', lambda f: f'/api/transactions/{f.transaction.pk}/',
+             lambda f: {'amount': f'{f.next()}.00'}),
+    Endpoint('get_financial_data', 'financial data GET cached', 'get',
+             lambda f: f'/api/financial-data/?month={f.end_month}'),
+    Endpoint('get_financial_data', 'financial data GET cold', 'get',
+             lambda f: f'/api/financial-data/?month={f.end_month}', before=_clear_dashboard_cache),
+    Endpoint('get_financial_data', 'financial data GET 24-month range', 'get',
+             lambda f: f'/api/financial-data/?month={f.end_month}&start=2023-01&end={f.end_month}'),
+    Endpoint('get_financial_data_batch', 'financial data batch GET 12 months cold', 'get',
+             lambda f: f'/api/financial-data/batch/?start=2024-01&end={f.end_month}', before=_clear_dashboard_cache),
+    Endpoint('get_financial_data_async', 'financial data async GET cold', 'get',
+             lambda f: f'/api/financial-data/async/?month={f.end_month}', before=_clear_dashboard_cache),
+    Endpoint('sync', 'sync GET full', 'get', lambda f: '/api/sync/'),
+    Endpoint('sync', 'sync GET unchanged', 'get', lambda f: f'/api/sync/?since={f.sync_cursor}',
+             before=Fixture.take_sync_cursor),
+    Endpoint('sync', 'sync GET after one edit', 'get', lambda f: f'/api/sync/?since={f.sync_cursor}',
+             before=Fixture.edit_after_sync_cursor),
+    Endpoint('financial-data-cache-stats', 'cache stats GET', 'get', lambda f: '/api/financial-data/cache-stats/',
+             client='admin'),
+    Endpoint('register', 'register POST', 'post', lambda f: '/api/auth/register/',
+             lambda f: {'email': f'bench-register-{f.next()}@example.com', 'first_name': 'Bench',
+                        'last_name': 'Register', 'password': 'benchmark-pass',
+                        'password_confirmation': 'benchmark-pass'},
+             client='anonymous', max_repeat=5),
+    Endpoint('login', 'login POST', 'post', lambda f: '/api/auth/login/',
+             lambda f: {'email': f.user.email, 'password': seeding.PASSWORD}, client='anonymous', max_repeat=5),
+    Endpoint('logout', 'logout POST', 'post', lambda f: '/api/auth/logout/', client='logout',
+             before=Fixture.fresh_logout_token),
+    Endpoint('user-profile', 'profile GET', 'get', lambda f: '/api/auth/profile/'),
+]
+
+
+def url_names():
+    return {
+        pattern.name for pattern in urls.urlpatterns + authentication.urls.urlpatterns
+        if isinstance(pattern, URLPattern)
+    }
+
+
+def run_endpoint(fixture, endpoint, repeat):
+    """Call `endpoint` `repeat` times; returns (timings in ms, queries per call)."""
+    client = fixture.clients[endpoint.client]
+    timings, queries = [], []
+    for _ in range(1 + min(repeat, endpoint.max_repeat or repeat)):
+        if endpoint.before:
+            endpoint.before(fixture)
+        kwargs = {'data': endpoint.data(fixture)} if endpoint.data else {}
+        if endpoint.format:
+            kwargs['format'] = endpoint.format
+        with CaptureQueriesContext(connection) as ctx:
+            started = time.perf_counter()
+            response = getattr(client, endpoint.method)(endpoint.path(fixture), **kwargs)
+            if response.streaming:
+                b''.join(response.streaming_content)
+            elapsed = (time.perf_counter() - started) * 1000
+        if response.status_code >= 400:
+            raise AssertionError(f'{endpoint.label}: HTTP {response.status_code} {getattr(response, "data", "")}')
+        timings.append(elapsed)
+        queries.append(len(ctx.captured_queries))
+    # The first call warms caches and is not counted.
+    return timings[1:], queries[1:]
+
+
+def compare_to_baseline(results, baseline, tolerance):
+    """Regressions of `results` against `baseline`: slower p95 beyond `tolerance` or more queries."""
+    regressions = []
+    for size, cases in results.items():
+        for label, current in cases.items():
+            before = baseline.get(size, {}).get(label)
+            if before is None:
+                continue
+            case = f'{label} @ {size}'
+            # A 1 ms floor keeps timer noise on fast endpoints from being reported.
+            if current['p95'] > before['p95'] * (1 + tolerance) and current['p95'] - before['p95'] > 1:
+                regressions.append(Regression(case, f"p95 {before['p95']:.2f} -> {current['p95']:.2f} ms"))
+            if current['queries'] > before['queries']:
+                regressions.append(Regression(case, f"queries {before['queries']} -> {current['queries']}"))
+    return regressions
+
+
+@benchmark('endpoints')
+def endpoints(report, repeat=50, sizes=(1000, 10000), baseline=None, save_baseline=None, tolerance=0.2,
+              **options):
+    """Every URL of budget and authentication through the test client, at several data sizes."""
+    missing = url_names() - {endpoint.url_name for endpoint in ENDPOINTS}
+    if missing:
+        raise AssertionError(f"No benchmark case for URL(s): {', '.join(sorted(missing))}")
+
+    results = {}
+    for size in sizes:
+        report(f'endpoints, {size} transactions per user')
+        report(f"  {'case':<36} {'p50':>9} {'p95':>9} {'p99':>9}  queries")
+        results[str(size)] = cases = {}
+        with transaction.atomic():
+            for alias in ('dashboard', 'auth_tokens'):
+                caches[alias].clear()
+            fixture = Fixture(size)
+            for endpoint in ENDPOINTS:
+                timings, queries = run_endpoint(fixture, endpoint, repeat)
+                cases[endpoint.label] = result = {
+                    'p50': round(percentile(timings, 50), 3),
+                    'p95': round(percentile(timings, 95), 3),
+                    'p99': round(percentile(timings, 99), 3),
+                    'queries': max(queries),
+                }
+                report(f"  {endpoint.label:<36} {result['p50']:7.2f}ms {result['p95']:7.2f}ms "
+                       f"{result['p99']:7.2f}ms  {result['queries']:5d}")
+            transaction.set_rollback(True)
+
+    if save_baseline:
+        with open(save_baseline, 'w') as handle:
+            json.dump(results, handle, indent=2, sort_keys=True)
+        report(f'Baseline saved to {save_baseline}')
+
+    regressions = []
+    if baseline:
+        with open(baseline) as handle:
+            regressions = compare_to_baseline(results, json.load(handle), tolerance)
+        for regression in regressions:
+            report(f'  REGRESSION {regression.case}: {regression.detail}')
+        if not regressions:
+            report(f'No regressions against {baseline}')
+    return regressions
+
+
+@benchmark('dashboard-concurrency')
+def dashboard_concurrency(report, repeat=50, sizes=(1000, 10000), **options):
+    """A cold financial-data build: the sync view's sequential reads vs the async view's query pool."""
+    # The pool's connections only see committed rows, so the data is
+    # committed here and deleted again at the end.
+    end_month = '2024-12'
+    client = APIClient()
+    loop = asyncio.new_event_loop()
+    try:
+        for size in sizes:
+            first_user = seeding.next_user_number()
+            seeding.seed(users=1, transactions_per_user=size, months=12, end_month=end_month, seed=size,
+                         first_user=first_user)
+            user = seeding.seeded_users().get(email=seeding.EMAIL_PATTERN.format(first_user))
+            client.force_authenticate(user)
+            query = (user.pk, end_month, None)
+
+            report(f'financial data reads, {size} transactions per user')
+            slowest = total = 0.0
+            for key, func, args in views.dashboard_parts(*query):
+                _, timings, queries = measure(lambda: func(*args), repeat)
+                median = statistics.median(timings)
+                slowest, total = max(slowest, median), total + median
+                report(f'  {key:<38} {median:8.3f} ms  p95 {percentile(timings, 95):8.3f} ms  {queries:3d} queries')
+            report(f'  {"sum of reads":<38} {total:8.3f} ms')
+            report(f'  {"slowest read":<38} {slowest:8.3f} ms')
+
+            compare(report, f'financial data build, {size} transactions per user', [
+                ('sequential', lambda: views.build_financial_data(*query)),
+                (f'query pool ({settings.DASHBOARD_QUERY_WORKERS} threads)', lambda: loop.run_until_complete(
+                    async_views.build_financial_data_concurrently(*query))),
+            ], repeat)
+
+            def cold(path):
+                caches['dashboard'].clear()
+                return client.get(path).content
+
+            compare(report, f'financial data GET cold, {size} transactions per user', [
+                ('sync view', lambda: cold(f'/api/financial-data/?month={end_month}')),
+                ('async view', lambda: cold(f'/api/financial-data/async/?month={end_month}')),
+            ], repeat)
+            user.delete()
+    finally:
+        loop.close()
+
+
+@benchmark('dashboard-batch')
+def dashboard_batch(report, repeat=50, sizes=(1000, 10000), **options):
+    """Twelve months of dashboards: one financial-data request per month vs a single batch request."""
+    end_month = '2024-12'
+    months = [f'2024-{month_num:02d}' for month_num in range(1, 13)]
+    client = APIClient()
+    for size in sizes:
+        first_user = seeding.next_user_number()
+        seeding.seed(users=1, transactions_per_user=size, months=24, end_month=end_month, seed=size,
+                     first_user=first_user)
+        user = seeding.seeded_users().get(email=seeding.EMAIL_PATTERN.format(first_user))
+        client.force_authenticate(user)
+
+        compare(report, f'12 dashboards built, {size} transactions per user', [
+            ('per month', lambda: {month: views.build_financial_data(user.pk, month, None) for month in months}),
+            ('batch', lambda: views.build_financial_data_batch(user.pk, months)),
+        ], repeat)
+
+        def cold(paths):
+            caches['dashboard'].clear()
+            return [client.get(path).json() for path in paths]
+
+        compare(report, f'12 dashboards GET cold, {size} transactions per user', [
+            ('per month', lambda: [dict(zip(months, cold(
+                f'/api/financial-data/?month={month}' for month in months
+            )))]),
+            ('batch', lambda: cold([f'/api/financial-data/batch/?start={months[0]}&end={months[-1]}'])),
+        ], repeat)
+        user.delete()
+
+
+@contextmanager
+def sqlite_file_database(path, alias='contention'):
+    """A migrated SQLite database file at `path`, registered as `alias` while the block runs."""
+    connections.settings[alias] = connections.configure_settings({
+        DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+        alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': path},
+    })[alias]
+    try:
+        call_command('migrate', database=alias, verbosity=0)
+        yield alias
+    finally:
+        group_commit.stop(alias)
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+@contextmanager
+def _default_connection_to(alias):
+    connections[DEFAULT_DB_ALIAS] = connections.create_connection(alias)
+    try:
+        yield
+    finally:
+        connections[DEFAULT_DB_ALIAS].close()
+
+
+def concurrent_creates(users, writes, route):
+    """
+    Each of `users` creates `writes` transactions through the API from its own thread.
+
+    The threads run their requests inside `route(user)`, which picks the
+    database they write to.
+    """
+    # Lock failures are counted below rather than logged with a traceback each.
+    request_logger = logging.getLogger('django.request')
+    previous_level = request_logger.level
+    request_logger.setLevel(logging.CRITICAL)
+    start = threading.Barrier(len(users) + 1)
+    latencies, failures = [], []
+    retries_before = metrics.registry.counters.get(('budget_db_lock_retries_total', ()), 0)
+
+    def writer(user):
+        with route(user):
+            client = APIClient()
+            client.force_authenticate(user)
+            start.wait()
+            for n in range(writes):
+                started = time.perf_counter()
+                try:
+                    response = client.post('/api/transactions/', {
+                        'user': user.pk, 'type': 'Expense', 'amount': f'{n % 90 + 10}.25',
+                        'date': f'2024-12-{n % 28 + 1:02d}T12:00:00Z', 'description': f'Writer {n}',
+                    })
+                    failed = response.status_code != 201
+                except DatabaseError as exc:
+                    failed = str(exc)
+                latencies.append((time.perf_counter() - started) * 1000)
+                if failed:
+                    failures.append(failed)
+
+    workers = [threading.Thread(target=writer, args=(user,)) for user in users]
+    for worker in workers:
+        worker.start()
+    start.wait()
+    started = time.perf_counter()
+    for worker in workers:
+        worker.join()
+    seconds = time.perf_counter() - started
+    request_logger.setLevel(previous_level)
+
+    return {
+        'writes': len(latencies),
+        'failures': len(failures),
+        'errors': sorted({str(failure) for failure in failures}),
+        'seconds': seconds,
+        'latencies': latencies,
+        'retries': metrics.registry.counters.get(('budget_db_lock_retries_total', ()), 0) - retries_before,
+    }
+
+
+def write_contention(alias, threads, writes):
+    """
+    `threads` threads each create `writes` transactions through the API, in the `alias` database.
+
+    Every thread points its own default connection at `alias`, so the whole
+    write path (validation, rollups, data versions) runs against that file.
+    """
+    User = get_user_model()
+    users = [
+        User.objects.db_manager(alias).create_user(
+            email=f'writer-{threads}-{n}@example.com', first_name='Bench', last_name='Writer'
+        )
+        for n in range(threads)
+    ]
+    result = concurrent_creates(users, writes, lambda user: _default_connection_to(alias))
+    result['rows'] = Transaction.objects.using(alias).filter(user__in=users).count()
+    return result
+
+
+def sharded_write_contention(threads, writes):
+    """Like write_contention(), with each thread's user writing to their own shard of settings.DATABASE_SHARDS."""
+    User = get_user_model()
+    users = [
+        User.objects.create_user(
+            email=f'shard-writer-{len(settings.DATABASE_SHARDS)}-{threads}-{n}@example.com',
+            first_name='Bench', last_name='Writer'
+        )
+        for n in range(threads)
+    ]
+    result = concurrent_creates(users, writes, lambda user: shards.for_user(user.pk))
+    result['rows'] = sum(
+        Transaction.objects.using(alias).filter(user__in=[user.pk for user in users]).count()
+        for alias in settings.DATABASE_SHARDS
+    )
+    return result
+
+
+def report_contention(report, count, result):
+    report(f"  {count:>7} {result['writes'] / result['seconds']:>9.1f} "
+           f"{percentile(result['latencies'], 50):7.2f}ms {percentile(result['latencies'], 95):7.2f}ms "
+           f"{result['failures']:>8} {result['retries']:>7.0f}")
+    for error in result['errors']:
+        report(f'      {error}')
+
+
+@benchmark('write-contention')
+def write_contention_benchmark(report, repeat=50, threads=(1, 4, 16), **options):
+    """Concurrent transaction creates against a SQLite file: default settings vs production mode."""
+    production, retries = settings.SQLITE_PRODUCTION_PRAGMAS, settings.DATABASE_WRITE_RETRY['ATTEMPTS']
+    modes = [
+        ('default settings, no retries', {}, 1, False),
+        ('production PRAGMAs, no retries', production, 1, False),
+        ('production PRAGMAs and retries', production, retries, False),
+        ('production PRAGMAs, retries and group commit', production, retries, True),
+    ]
+    for label, pragmas, attempts, grouped in modes:
+        report(f'transaction creates, {repeat} per thread, {label}')
+        report(f"  {'threads':>7} {'writes/s':>9} {'p50':>9} {'p95':>9} {'failures':>8} {'retries':>7}")
+        with tempfile.TemporaryDirectory() as directory, override_settings(
+            SQLITE_PRAGMAS=pragmas,
+            DATABASE_WRITE_RETRY=dict(settings.DATABASE_WRITE_RETRY, ATTEMPTS=attempts),
+            GROUP_COMMIT=dict(settings.GROUP_COMMIT, ENABLED=grouped),
+            REQUEST_TIMING={'ENABLED': False},
+        ):
+            with sqlite_file_database(os.path.join(directory, 'contention.sqlite3')) as alias:
+                for count in threads:
+                    report_contention(report, count, write_contention(alias, count, repeat))
+
+
+@benchmark('write-shards')
+def write_shards_benchmark(report, repeat=50, threads=(1, 4, 16), shard_counts=(1, 2, 4), **options):
+    """Concurrent transaction creates by different users, spread over 1, 2 and 4 SQLite shards."""
+    for count in shard_counts:
+        report(f'transaction creates, {repeat} per thread, production PRAGMAs and retries, {count} shard(s)')
+        report(f"  {'threads':>7} {'writes/s':>9} {'p50':>9} {'p95':>9} {'failures':>8} {'retries':>7}")
+        aliases = [f'shard{n}' for n in range(count)]
+        with tempfile.TemporaryDirectory() as directory, ExitStack() as stack:
+            for alias in aliases:
+                stack.enter_context(sqlite_file_database(os.path.join(directory, f'{alias}.sqlite3'), alias))
+            stack.enter_context(override_settings(
+                SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS, DATABASE_SHARDS=aliases,
+                REQUEST_TIMING={'ENABLED': False},
+            ))
+            shards.prepare()
+            for threads_count in threads:
+                report_contention(report, threads_count, sharded_write_contention(threads_count, repeat))
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.checks import Tags, register
+
+from BudgetTracker.checks import shared_cache_errors
+
+
+@register(Tags.caches)
+def dashboard_cache_is_shared(app_configs, **kwargs):
+    return shared_cache_errors(
+        settings.DASHBOARD_CACHE_ALIAS,
+        hint="Writes replace the generation tokens in the worker that handled them only, and the other workers "
+             "keep serving their stale dashboards. Set DASHBOARD_CACHE_BACKEND and DASHBOARD_CACHE_LOCATION to "
+             "a shared backend such as FileBasedCache.",
+        id='budget.E001',
+    )
@@ -0,0 +1,157 @@
+"""
+Response cache for the financial-data dashboard.
+
+Entries hold the finished response body for one (user, month) and live in
+the cache named by settings.DASHBOARD_CACHE_ALIAS. LocMemCache evicts the
+least recently used entry once it is full.
+
+An entry is only served while the generation tokens it was stored with are
+still current. Each user has one token per month and one for the whole
+account, and there is a single global token for shared categories. Writes
+replace the tokens of exactly the months they can affect:
+
+* a transaction in month M changes that month's transaction list and the
+  monthly summary of every later month of the same year;
+* a budget for month M is shown on the dashboards of M, M+1 and M+2;
+* categories appear on every month, so they replace the account token (or
+  the global token for shared categories).
+
+Invalidation runs when the write happens and again after its database
+transaction commits. The second pass drops entries that a concurrent
+request filled from data read before the commit.
+
+Tokens only invalidate entries for the workers that read the same cache.
+Several worker processes therefore need a shared backend; in production
+mode the budget.E001 system check refuses LocMemCache.
+"""
+import threading
+import uuid
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+
+from BudgetTracker import metrics
+
+GLOBAL = 'global'
+
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+
+def get_cache():
+    return caches[settings.DASHBOARD_CACHE_ALIAS]
+
+
+def entry_key(user_id, month):
+    return f'fd:{user_id}:{month}'
+
+
+def _token_keys(user_id, month):
+    return (f'fd:gen:{user_id}:{month}', f'fd:gen:{user_id}', f'fd:gen:{GLOBAL}')
+
+
+def _count(name, amount=1):
+    with _lock:
+        _stats[name] += amount
+
+
+def lookup(user_id, month):
+    """
+    (cached entry or None, generations) for one dashboard.
+
+    The generations must be read before the dashboard's queries run and be
+    passed back to store(), so that an entry computed while a write was in
+    flight is never served.
+    """
+    cache = get_cache()
+    token_keys = _token_keys(user_id, month)
+    key = entry_key(user_id, month)
+    found = cache.get_many([key, *token_keys])
+
+    generations = []
+    for token_key in token_keys:
+        token = found.get(token_key)
+        if token is None:
+            cache.add(token_key, uuid.uuid4().hex, timeout=None)
+            token = cache.get(token_key)
+        generations.append(token)
+    generations = tuple(generations)
+
+    entry = found.get(key)
+    if entry is not None and entry['generations'] == generations:
+        _count('hits')
+        metrics.inc('budget_cache_requests_total', cache='dashboard', result='hit')
+        return entry, generations
+    _count('misses')
+    metrics.inc('budget_cache_requests_total', cache='dashboard', result='miss')
+    return None, generations
+
+
+def store(user_id, month, generations, **entry):
+    get_cache().set(entry_key(user_id, month), dict(entry, generations=generations))
+
+
+def _invalidate(token_keys, entry_keys):
+    cache = get_cache()
+    cache.set_many({token_key: uuid.uuid4().hex for token_key in token_keys}, timeout=None)
+    if entry_keys:
+        cache.delete_many(list(entry_keys))
+    _count('invalidations', len(token_keys))
+
+
+def _schedule(token_keys, entry_keys=()):
+    if not token_keys:
+        return
+    token_keys, entry_keys = sorted(set(token_keys)), sorted(set(entry_keys))
+    _invalidate(token_keys, entry_keys)
+    transaction.on_commit(lambda: _invalidate(token_keys, entry_keys))
+
+
+def _months(year, month_num, count):
+    for _ in range(count):
+        yield f'{year}-{month_num:02d}'
+        year, month_num = (year + 1, 1) if month_num == 12 else (year, month_num + 1)
+
+
+def transactions_changed(snapshots):
+    """Invalidate after writes to transactions, given their rollups.snapshot() values."""
+    months = set()
+    for (user_id, month, _type, _category_id), _amount in snapshots:
+        year, month_num = int(month[:4]), int(month[5:7])
+        months.update((user_id, key) for key in _months(year, month_num, 13 - month_num))
+    _schedule(
+        [f'fd:gen:{user_id}:{month}' for user_id, month in months],
+        [entry_key(user_id, month) for user_id, month in months],
+    )
+
+
+def budgets_changed(user_id, *months):
+    """Invalidate after writes to the given users' budgets for the given months."""
+    affected = set()
+    for month in months:
+        year, month_num = int(month[:4]), int(month[5:7])
+        affected.update(_months(year, month_num, 3))
+    _schedule(
+        [f'fd:gen:{user_id}:{month}' for month in affected],
+        [entry_key(user_id, month) for month in affected],
+    )
+
+
+def categories_changed(*user_ids):
+    """Invalidate every month of the given users (None for shared categories)."""
+    _schedule([f'fd:gen:{GLOBAL if user_id is None else user_id}' for user_id in user_ids])
+
+
+def stats():
+    with _lock:
+        counters = dict(_stats)
+    lookups = counters['hits'] + counters['misses']
+    counters['hit_ratio'] = round(counters['hits'] / lookups, 4) if lookups else None
+    return counters
+
+
+def reset_stats():
+    with _lock:
+        for name in _stats:
+            _stats[name] = 0
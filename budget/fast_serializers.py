@@ -0,0 +1,90 @@
+"""
+Read-only fast path for the transaction and category list endpoints.
+
+List pages are fetched with values(), with the category name joined in SQL,
+and each row is turned into the response dict by plain functions instead of
+per-field serializer dispatch. The output matches TransactionSerializer and
+CategorySerializer field for field, so the rendered JSON is byte-identical:
+amounts are read as integer cents and written as strings with two decimal
+places like DRF's DecimalField, and datetimes are ISO 8601 in the current
+time zone with UTC written as 'Z'.
+
+Writes and detail views keep using the ModelSerializers.
+"""
+from django.utils import timezone
+
+from .fields import cents
+from .models import Transaction
+
+TRANSACTION_VALUES = (
+    'id', 'user_id', 'type', 'category_id', 'category__name',
+    'date', 'description', 'created_at', 'updated_at',
+)
+
+CATEGORY_VALUES = ('id', 'name', 'type', 'icon', 'color', 'updated_at', 'user_id')
+
+
+def minor_units_formatter(model_field):
+    """A function formatting the integer stored by MoneyField `model_field` like DRF's DecimalField."""
+    places = model_field.decimal_places
+    scale = 10 ** places
+
+    def format_minor_units(value):
+        units, fraction = divmod(abs(value), scale)
+        return f"{'-' if value < 0 else ''}{units}.{fraction:0{places}d}"
+    return format_minor_units
+
+
+def format_datetime(value):
+    if not value:
+        return None
+    value = value.astimezone(timezone.get_current_timezone()).isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+format_amount = minor_units_formatter(Transaction._meta.get_field('amount'))
+
+
+def transaction_values(queryset):
+    return queryset.values(*TRANSACTION_VALUES, amount_cents=cents('amount'))
+
+
+def transaction_data(rows):
+    """TransactionSerializer(many=True).data for rows from transaction_values()."""
+    return [
+        {
+            'id': row['id'],
+            'user': row['user_id'],
+            'type': row['type'],
+            'amount': format_amount(row['amount_cents']),
+            'category': row['category_id'],
+            'category_name': row['category__name'],
+            'date': format_datetime(row['date']),
+            'description': row['description'],
+            'created_at': format_datetime(row['created_at']),
+            'updated_at': format_datetime(row['updated_at']),
+        }
+        for row in rows
+    ]
+
+
+def category_values(queryset):
+    return queryset.values(*CATEGORY_VALUES)
+
+
+def category_data(rows):
+    """CategorySerializer(many=True).data for rows from category_values(); '__all__' lists FKs last."""
+    return [
+        {
+            'id': row['id'],
+            'name': row['name'],
+            'type': row['type'],
+            'icon': row['icon'],
+            'color': row['color'],
+            'updated_at': format_datetime(row['updated_at']),
+            'user': row['user_id'],
+        }
+        for row in rows
+    ]
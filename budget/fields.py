@@ -0,0 +1,53 @@
+"""
+Money amounts stored as integers of minor units (cents).
+
+MoneyField replaces DecimalField for amounts. Python code sees the same
+thing as before: instances, lookups, forms and DRF serializers get Decimals
+with the field's max_digits and decimal_places, so the API does not change.
+The column, however, is a bigint holding value * 10**decimal_places. SUM()
+is then integer arithmetic in the database. Reading a value costs one
+int-to-Decimal conversion instead of SQLite's parsing of decimal text.
+
+Hot read paths skip even that: cents('amount') selects the raw integer, and
+they convert it to a float or a string once, when building the response
+(see views.dashboard_transactions and fast_serializers).
+
+An expression combining a MoneyField with a Decimal needs the Decimal as
+Value(amount, output_field=<the MoneyField>), which converts it to cents.
+"""
+import decimal
+
+from django.db import models
+from django.db.models import ExpressionWrapper, F
+
+
+class MoneyField(models.DecimalField):
+
+    def get_internal_type(self):
+        return 'BigIntegerField'
+
+    def to_minor_units(self, value):
+        """The integer stored for Decimal `value`, rounded to decimal_places like DecimalField does."""
+        exponent = decimal.Decimal(1).scaleb(-self.decimal_places)
+        return int(value.quantize(exponent, context=self.context).scaleb(self.decimal_places))
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if hasattr(value, 'as_sql'):
+            return value
+        value = self.to_python(value)
+        if value is None:
+            return None
+        return self.to_minor_units(value)
+
+    def get_db_prep_save(self, value, connection):
+        return self.get_db_prep_value(value, connection)
+
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return None
+        return decimal.Decimal(value).scaleb(-self.decimal_places)
+
+
+def cents(name):
+    """The raw integer column of the MoneyField `name`, for values(), values_list() and aggregates."""
+    return ExpressionWrapper(F(name), output_field=models.BigIntegerField())
@@ -0,0 +1,150 @@
+"""
+Group commit for transaction creates.
+
+Each POST /api/transactions/ normally commits on its own, so SQLite's insert
+rate is bounded by how many commits per second it can make durable. With
+settings.GROUP_COMMIT['ENABLED'], requests hand their new Transaction to a
+writer thread of their process instead and wait for it. The writer takes
+what is queued, waiting at most MAX_DELAY_MS for more, up to MAX_BATCH rows.
+It writes them with their rollup, data version and dashboard cache updates
+in one transaction, and wakes each request once that transaction has
+committed. A request therefore answers only after its row is as durable as
+with a commit of its own, and under load many requests share one commit.
+
+If a batch fails for any reason other than a locked database, which
+write_attempts() retries, its rows are written again one per transaction.
+Then only the row at fault fails, and its request raises the error as the
+inline path would.
+
+A create made inside an atomic block is written inline, because the request
+may still roll its transaction back and other connections cannot see its
+uncommitted rows.
+"""
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, router
+
+from BudgetTracker import database, metrics
+
+from . import dashboard_cache, rollups, shards, versioning
+from .models import Transaction
+
+_writers = {}
+_writers_lock = threading.Lock()
+_writers_pid = os.getpid()
+
+
+def enabled():
+    return settings.GROUP_COMMIT['ENABLED']
+
+
+def write(instances):
+    """Insert new Transactions with their rollups, data versions and cache invalidation, in one transaction."""
+    for attempt in database.write_attempts(shards.current()):
+        with attempt:
+            created = database.bulk_create_new(Transaction, instances)
+            rollups.record_created(created)
+            versioning.bump(*{txn.user_id for txn in created})
+            dashboard_cache.transactions_changed(rollups.snapshot(txn) for txn in created)
+    return created
+
+
+class Writer:
+    """The thread that commits the queued creates of one database alias in this process."""
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.queue = queue.SimpleQueue()
+        self.thread = threading.Thread(target=self.run, name=f'group-commit-{alias}', daemon=True)
+        self.thread.start()
+
+    def submit(self, instance):
+        future = Future()
+        self.queue.put((instance, future))
+        return future
+
+    def next_batch(self):
+        """Queued creates, up to MAX_BATCH and MAX_DELAY_MS after the first. None in the queue means stop."""
+        options = settings.GROUP_COMMIT
+        first = self.queue.get()
+        if first is None:
+            return None
+        batch = [first]
+        deadline = time.monotonic() + options['MAX_DELAY_MS'] / 1000
+        while len(batch) < options['MAX_BATCH']:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+            if item is None:
+                self.queue.put(None)  # Stop once this batch is committed.
+                break
+            batch.append(item)
+        return batch
+
+    def run(self):
+        if self.alias != DEFAULT_DB_ALIAS:
+            # Write through the same database as the requests, including the
+            # models' default connection that rollups and versioning use.
+            connections[DEFAULT_DB_ALIAS] = connections.create_connection(self.alias)
+        try:
+            while (batch := self.next_batch()) is not None:
+                close_old_connections()
+                self.commit(batch)
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+
+    def commit(self, batch):
+        try:
+            created = write([instance for instance, _ in batch])
+        except Exception:
+            for instance, future in batch:
+                try:
+                    future.set_result(write([instance])[0])
+                except Exception as exc:
+                    future.set_exception(exc)
+            return
+        metrics.observe('budget_group_commit_batch_size', len(batch))
+        for (_, future), instance in zip(batch, created):
+            future.set_result(instance)
+
+
+def get_writer(alias):
+    global _writers_pid
+    with _writers_lock:
+        if os.getpid() != _writers_pid:
+            # A forked worker has no writer threads; its parent's are not ours.
+            _writers.clear()
+            _writers_pid = os.getpid()
+        writer = _writers.get(alias)
+        if writer is None:
+            writer = _writers[alias] = Writer(alias)
+    return writer
+
+
+def stop(alias=DEFAULT_DB_ALIAS):
+    """Stop the writer of `alias` once it has committed what is queued, e.g. before its database goes away."""
+    with _writers_lock:
+        writer = _writers.pop(alias, None)
+    if writer is not None:
+        writer.queue.put(None)
+        writer.thread.join()
+
+
+def create(instance):
+    """Save a new Transaction through the writer of this process; returns it once committed."""
+    connection = connections[router.db_for_write(Transaction)]
+    if connection.in_atomic_block:
+        return write([instance])[0]
+    return get_writer(connection.alias).submit(instance).result()
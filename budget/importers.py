@@ -0,0 +1,271 @@
+"""
+Bulk import of transactions from uploaded CSV and OFX files.
+
+Files are read as a stream and validated row by row with the field rules
+of TransactionSerializer. Valid rows are written with bulk_create in
+batches, each batch in its own database transaction together with its
+rollup deltas. Rows that fail validation are skipped and listed in the
+returned report with their line (CSV) or statement entry (OFX) number.
+
+The text encoding is settled before anything is written: UTF-8 if the
+whole file decodes as such, else Windows-1252, which spreadsheet and
+banking exports commonly use.
+"""
+import codecs
+import csv
+import io
+import re
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+
+from django.db.models import F, Q
+from django.utils import timezone
+from rest_framework import serializers
+
+from BudgetTracker import database
+
+from . import dashboard_cache, rollups, shards, versioning
+from .models import Category, Transaction
+from .serializers import TransactionSerializer
+
+CSV_COLUMNS = ('date', 'type', 'amount', 'category', 'description')
+MAX_REPORTED_ERRORS = 1000
+TEXT_ENCODINGS = ('utf-8-sig', 'cp1252')
+
+_DATE_ONLY = re.compile(r'^\d{4}-\d{2}-\d{2}$')
+_OFX_DATE = re.compile(r'^(\d{8})(\d{6})?(?:\.\d+)?(?:\[([+-]?\d+(?:\.\d+)?)(?::\w+)?\])?')
+
+
+class ImportFormatError(ValueError):
+    """The uploaded file cannot be read as the requested format."""
+
+
+def detect_encoding(upload):
+    """The first of TEXT_ENCODINGS that decodes the whole upload, read in chunks."""
+    for encoding in TEXT_ENCODINGS:
+        decoder = codecs.getincrementaldecoder(encoding)()
+        try:
+            for chunk in upload.chunks():
+                decoder.decode(chunk)
+            decoder.decode(b'', final=True)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    raise ImportFormatError("File must be text encoded as UTF-8 or Windows-1252")
+
+
+def open_text(upload):
+    encoding = detect_encoding(upload)
+    upload.seek(0)
+    return io.TextIOWrapper(upload.file, encoding=encoding, newline='')
+
+
+def read_csv(stream):
+    """
+    Yield (line number, record) pairs from a CSV file with a header row.
+
+    Recognised columns are date, amount, type, category and description;
+    only date and amount are required. Header names are case-insensitive.
+    """
+    reader = csv.reader(stream)
+    try:
+        header = [name.strip().lower() for name in next(reader)]
+    except StopIteration:
+        return
+    except csv.Error as exc:
+        raise ImportFormatError(f"Unreadable CSV header: {exc}")
+
+    missing = {'date', 'amount'} - set(header)
+    if missing:
+        raise ImportFormatError(f"CSV is missing required column(s): {', '.join(sorted(missing))}")
+    positions = {name: header.index(name) for name in CSV_COLUMNS if name in header}
+
+    while True:
+        try:
+            row = next(reader)
+        except StopIteration:
+            return
+        except csv.Error as exc:
+            raise ImportFormatError(f"Unreadable CSV at line {reader.line_num}: {exc}")
+        if not any(cell.strip() for cell in row):
+            continue
+        yield reader.line_num, {
+            name: row[index].strip() if index < len(row) else ''
+            for name, index in positions.items()
+        }
+
+
+def _ofx_tokens(stream, chunk_size=64 * 1024):
+    """Yield (TAG, text) pairs from an OFX document, reading it in chunks."""
+    pending = ''
+    while True:
+        chunk = stream.read(chunk_size)
+        parts = (pending + chunk).split('<')
+        pending = parts.pop() if chunk else ''
+        for part in parts:
+            tag, found, text = part.partition('>')
+            if found:
+                yield tag.strip().upper(), text.strip()
+        if not chunk:
+            return
+
+
+def read_ofx(stream):
+    """
+    Yield (entry number, record) pairs for each STMTTRN in an OFX file.
+
+    Handles both SGML (OFX 1.x, unclosed leaf tags) and XML (OFX 2.x)
+    documents. The sign of TRNAMT decides between Income and Expense.
+    """
+    number = 0
+    current = None
+    for tag, text in _ofx_tokens(stream):
+        if tag == 'STMTTRN':
+            current = {}
+        elif tag == '/STMTTRN' and current is not None:
+            number += 1
+            description = ' - '.join(part for part in (current.get('NAME'), current.get('MEMO')) if part)
+            yield number, {
+                'date': current.get('DTPOSTED', ''),
+                'amount': current.get('TRNAMT', ''),
+                'description': description,
+            }
+            current = None
+        elif current is not None and not tag.startswith('/') and text:
+            current[tag] = text
+
+
+def parse_ofx_date(value):
+    match = _OFX_DATE.match(value)
+    if not match:
+        return value
+    day, clock, offset = match.groups()
+    try:
+        parsed = datetime.strptime(day + (clock or '000000'), '%Y%m%d%H%M%S')
+        if offset is not None:
+            return parsed.replace(tzinfo=dt_timezone(timedelta(hours=float(offset))))
+    except (ValueError, OverflowError):
+        # Impossible dates and offsets are left to the date field, which reports them as the row's error.
+        return value
+    return timezone.make_aware(parsed)
+
+
+class TransactionImporter:
+    """Validate and insert records for one user, collecting per-row errors."""
+
+    def __init__(self, user, batch_size=1000):
+        self.user = user
+        self.batch_size = batch_size
+        self.validator = TransactionSerializer()
+        self.fields = self.validator.fields
+        self.categories = None
+        self.created = 0
+        self.failed = 0
+        self.errors = []
+
+    def category_id(self, name):
+        """Resolve a category name with a cache loaded once per import."""
+        if self.categories is None:
+            self.categories = {}
+            categories = Category.objects.filter(
+                Q(user=self.user) | Q(user__isnull=True)
+            ).order_by(F('user_id').asc(nulls_first=True)).values_list('id', 'name')
+            # The user's own categories are ordered last so they win over global ones.
+            for pk, category_name in categories:
+                self.categories[category_name.strip().lower()] = pk
+        try:
+            return self.categories[name.lower()]
+        except KeyError:
+            raise serializers.ValidationError(f"Unknown category '{name}'")
+
+    def build(self, record):
+        errors = {}
+        values = {}
+
+        raw_amount = record.get('amount', '').replace(',', '')
+        raw_type = record.get('type', '')
+        if not raw_type:
+            try:
+                raw_type = Transaction.EXPENSE if Decimal(raw_amount) < 0 else Transaction.INCOME
+                raw_amount = raw_amount.lstrip('-')
+            except InvalidOperation:
+                pass
+
+        raw_date = record.get('date', '')
+        if isinstance(raw_date, str) and _DATE_ONLY.match(raw_date):
+            raw_date += 'T00:00'
+
+        checks = [
+            ('type', raw_type, self.validator.validate_type),
+            ('amount', raw_amount, self.validator.validate_amount),
+            ('date', raw_date, None),
+            ('description', record.get('description') or None, None),
+        ]
+        for name, raw, rule in checks:
+            try:
+                value = self.fields[name].run_validation(raw)
+                values[name] = rule(value) if rule else value
+            except serializers.ValidationError as exc:
+                errors[name] = exc.detail
+
+        category = record.get('category')
+        if category:
+            try:
+                values['category_id'] = self.category_id(category)
+            except serializers.ValidationError as exc:
+                errors['category'] = exc.detail
+
+        if errors:
+            raise serializers.ValidationError(errors)
+        return Transaction(user=self.user, **values)
+
+    def run(self, records):
+        records = iter(records)
+        while True:
+            chunk = list(islice(records, self.batch_size))
+            if not chunk:
+                break
+            batch = []
+            for number, record in chunk:
+                try:
+                    batch.append(self.build(record))
+                except serializers.ValidationError as exc:
+                    self.failed += 1
+                    if len(self.errors) < MAX_REPORTED_ERRORS:
+                        self.errors.append({'row': number, 'errors': exc.detail})
+            self.save(batch)
+        return self.report()
+
+    def save(self, batch):
+        if not batch:
+            return
+        for attempt in database.write_attempts(shards.current()):
+            with attempt:
+                created = database.bulk_create_new(Transaction, batch, batch_size=self.batch_size)
+                rollups.record_created(created)
+                versioning.bump(self.user.id)
+                dashboard_cache.transactions_changed(rollups.snapshot(txn) for txn in created)
+        self.created += len(created)
+
+    def report(self):
+        return {
+            'created': self.created,
+            'failed': self.failed,
+            'errors': self.errors,
+        }
+
+
+def import_file(upload, user, file_format=None, batch_size=1000):
+    """Import an uploaded CSV or OFX file, returning the importer's report."""
+    file_format = (file_format or upload.name.rsplit('.', 1)[-1]).lower()
+    if file_format == 'csv':
+        records = read_csv(open_text(upload))
+    elif file_format in ('ofx', 'qfx'):
+        records = (
+            (number, dict(record, date=parse_ofx_date(record['date'])))
+            for number, record in read_ofx(open_text(upload))
+        )
+    else:
+        raise ImportFormatError("file_format must be csv or ofx")
+    return TransactionImporter(user, batch_size=batch_size).run(records)
@@ -0,0 +1,52 @@
+import argparse
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from budget.benchmarks import BENCHMARKS
+
+
+def size_list(value):
+    try:
+        return [int(size) for size in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError("must be a comma-separated list of integers")
+
+
+class Command(BaseCommand):
+    help = "Run budget benchmarks against a throwaway test database"
+
+    def add_arguments(self, parser):
+        parser.add_argument('names', nargs='*', help=f"Benchmarks to run (default: all of {', '.join(BENCHMARKS)})")
+        parser.add_argument('--repeat', type=int, default=50, help="Timed calls per measured path")
+        parser.add_argument('--sizes', type=size_list, default=[1000, 10000],
+                            help="Transactions per user for the endpoint suite, e.g. 1000,10000,100000")
+        parser.add_argument('--baseline', help="JSON file of earlier endpoint results to compare against")
+        parser.add_argument('--save-baseline', help="Write the endpoint results to this JSON file")
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help="Allowed p95 slowdown against the baseline, as a fraction")
+
+    def handle(self, *args, **options):
+        names = options['names'] or list(BENCHMARKS)
+        unknown = set(names) - set(BENCHMARKS)
+        if unknown:
+            raise CommandError(f"Unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+        regressions = []
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for name in names:
+                regressions += BENCHMARKS[name](
+                    self.stdout.write,
+                    repeat=options['repeat'],
+                    sizes=options['sizes'],
+                    baseline=options['baseline'],
+                    save_baseline=options['save_baseline'],
+                    tolerance=options['tolerance'],
+                ) or []
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if regressions:
+            raise CommandError(f"{len(regressions)} regression(s) against the baseline")
@@ -0,0 +1,24 @@
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from budget import shards
+
+
+class Command(BaseCommand):
+    help = "Migrate the default database and every shard, then copy users and global categories into the shards"
+
+    def add_arguments(self, parser):
+        parser.add_argument('app_label', nargs='?', help="App label of an application to synchronize the state")
+        parser.add_argument('migration_name', nargs='?', help="Database state will be brought to this migration")
+
+    def handle(self, *args, **options):
+        if not settings.DATABASE_SHARDS:
+            raise CommandError("No shards configured; set SQLITE_SHARD_PATHS")
+        targets = [name for name in (options['app_label'], options['migration_name']) if name]
+        for alias in [DEFAULT_DB_ALIAS, *settings.DATABASE_SHARDS]:
+            self.stdout.write(f"Migrating {alias}")
+            call_command('migrate', *targets, database=alias, verbosity=options['verbosity'], stdout=self.stdout)
+        shards.prepare()
+        self.stdout.write(self.style.SUCCESS(f"{len(settings.DATABASE_SHARDS)} shards ready"))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from budget import sync
+
+
+class Command(BaseCommand):
+    help = "Delete delta-sync tombstones older than SYNC['TOMBSTONE_DAYS']"
+
+    def handle(self, *args, **options):
+        removed = sync.prune()
+        self.stdout.write(self.style.SUCCESS(f"Tombstones pruned: {removed}"))
@@ -0,0 +1,27 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+
+from budget import rollups, shards
+
+
+class Command(BaseCommand):
+    help = "Recompute TransactionRollup rows from the Transaction table, repairing any drift"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, action='append', dest='users',
+                            help="Only rebuild the given user id (may be repeated)")
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if options['users']:
+            groups = shards.by_shard(options['users'])
+        else:
+            groups = dict.fromkeys(shards.aliases())
+        stats = Counter()
+        for alias, user_ids in groups.items():
+            with shards.using_shard(alias):
+                stats.update(rollups.rebuild(user_ids=user_ids, batch_size=options['batch_size']))
+        self.stdout.write(self.style.SUCCESS(
+            "Rollups rebuilt: {created} created, {updated} updated, {deleted} deleted".format(**stats)
+        ))
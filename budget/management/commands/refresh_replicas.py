@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from BudgetTracker import replicas
+
+
+class Command(BaseCommand):
+    help = "Copy the primary database into its SQLite read replicas"
+
+    def add_arguments(self, parser):
+        parser.add_argument('aliases', nargs='*',
+                            help="Replica aliases to refresh (default: all of settings.DATABASE_REPLICAS)")
+        parser.add_argument('--interval', type=float, default=0,
+                            help="Refresh again every INTERVAL seconds until interrupted")
+
+    def handle(self, *args, **options):
+        aliases = options['aliases'] or settings.DATABASE_REPLICAS
+        if not aliases:
+            raise CommandError("No replicas configured; set SQLITE_REPLICA_PATHS")
+        unknown = set(aliases) - set(settings.DATABASE_REPLICAS)
+        if unknown:
+            raise CommandError(f"Not a replica: {', '.join(sorted(unknown))}")
+        for alias in aliases:
+            if connections[alias].vendor != 'sqlite':
+                raise CommandError(f"{alias} is not an SQLite database")
+
+        while True:
+            for alias in aliases:
+                started = time.perf_counter()
+                replicas.refresh(alias)
+                self.stdout.write(f"{alias}: refreshed in {(time.perf_counter() - started) * 1000:.1f} ms")
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
@@ -0,0 +1,50 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from budget import seeding
+
+
+class Command(BaseCommand):
+    help = "Generate deterministic synthetic users, categories, budgets and transactions"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=10)
+        parser.add_argument('--transactions-per-user', type=int, default=1000)
+        parser.add_argument('--months', type=int, default=24, help="Months of history ending with --end-month")
+        parser.add_argument('--end-month', help="YYYY-MM of the newest month (default: the current month)")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed; the same seed gives the same data")
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--clear', action='store_true', help="Delete previously seeded users first")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['months'] < 1 or options['transactions_per_user'] < 0:
+            raise CommandError("--users and --months must be positive and --transactions-per-user not negative")
+
+        if options['clear']:
+            self.stdout.write(f"Deleted {seeding.clear()} previously seeded rows")
+
+        total = options['users'] * options['transactions_per_user']
+        started = time.perf_counter()
+
+        def progress(written):
+            if written % 100_000 < options['batch_size'] or written == total:
+                elapsed = time.perf_counter() - started
+                self.stdout.write(f"  {written:,}/{total:,} transactions ({written / elapsed:,.0f}/s)")
+
+        counts = seeding.seed(
+            users=options['users'],
+            transactions_per_user=options['transactions_per_user'],
+            months=options['months'],
+            end_month=options['end_month'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            first_user=seeding.next_user_number(),
+            progress=progress,
+        )
+        self.stdout.write(self.style.SUCCESS(
+            "Seeded {users} users, {categories} categories, {budgets} budgets and {transactions} transactions "
+            "in {elapsed:.1f}s (password: {password})".format(
+                elapsed=time.perf_counter() - started, password=seeding.PASSWORD, **counts
+            )
+        ))
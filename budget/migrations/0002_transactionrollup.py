@@ -0,0 +1,55 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:27
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+
+def populate_rollups(apps, schema_editor):
+    Transaction = apps.get_model('budget', 'Transaction')
+    TransactionRollup = apps.get_model('budget', 'TransactionRollup')
+
+    totals = {}
+    rows = Transaction.objects.annotate(period=TruncMonth('date')).values(
+        'user_id', 'period', 'type', 'category_id'
+    ).annotate(total=Sum('amount'), count=Count('id')).order_by()
+    for row in rows:
+        period = timezone.localtime(row['period'])
+        key = (row['user_id'], f"{period.year}-{period.month:02d}", row['type'], row['category_id'])
+        total, count = totals.get(key, (0, 0))
+        totals[key] = (total + row['total'], count + row['count'])
+
+    TransactionRollup.objects.bulk_create([
+        TransactionRollup(user_id=user_id, month=month, type=type, category_id=category_id, total=total, count=count)
+        for (user_id, month, type, category_id), (total, count) in totals.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('budget', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.CharField(help_text='Format: YYYY-MM', max_length=7)),
+                ('type', models.CharField(choices=[('Income', 'Income'), ('Expense', 'Expense')], max_length=7)),
+                ('total', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('count', models.IntegerField(default=0)),
+                ('category', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='rollups', to='budget.category')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='transaction_rollups', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'unique_together': {('user', 'month', 'type', 'category')},
+            },
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
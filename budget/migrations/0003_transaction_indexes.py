@@ -0,0 +1,29 @@
+# Generated by Django 4.2.20 on 2026-10-18 11:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0002_transactionrollup'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='monthlybudget',
+            index=models.Index(fields=['user', 'month', 'total_budget_amount'], name='budget_user_month_amount_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date', 'created_at'], name='transaction_user_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'type', 'date', 'created_at'], name='transaction_user_type_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'category', 'date', 'created_at'], name='transaction_user_cat_date_idx'),
+        ),
+    ]
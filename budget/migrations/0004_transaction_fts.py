@@ -0,0 +1,14 @@
+from django.db import migrations
+
+from . import _fts_v1
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0003_transaction_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(_fts_v1.install, _fts_v1.uninstall),
+    ]
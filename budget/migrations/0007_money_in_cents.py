@@ -0,0 +1,70 @@
+import django.core.validators
+from django.db import migrations, models
+
+import budget.fields
+from . import _fts_v1
+
+# (model, table, field, max_digits, options): the amounts that move to integer cents.
+AMOUNTS = [
+    ('monthlybudget', 'budget_monthlybudget', 'total_budget_amount', 12,
+     {'validators': [django.core.validators.MinValueValidator(0)]}),
+    ('transaction', 'budget_transaction', 'amount', 12, {}),
+    ('transactionrollup', 'budget_transactionrollup', 'total', 14, {'default': 0}),
+]
+
+
+def to_cents(table, field):
+    return migrations.RunSQL(
+        f"UPDATE {table} SET {field}_cents = CAST(ROUND({field} * 100) AS BIGINT)",
+        f"UPDATE {table} SET {field} = {field}_cents / 100.0",
+    )
+
+
+class Migration(migrations.Migration):
+    """
+    Store amounts as integer cents: copy each one into a new bigint column,
+    drop the decimal column and give the new one its name. The decimal
+    columns are made nullable before they are dropped, so that the migration
+    can be reversed.
+    """
+
+    dependencies = [
+        ('budget', '0006_sync'),
+    ]
+
+    operations = [
+        # Rebuilding budget_transaction on SQLite fails while the search
+        # triggers refer to it: drop them first and reinstall after.
+        migrations.RunPython(_fts_v1.uninstall, _fts_v1.install),
+        migrations.RemoveIndex(model_name='monthlybudget', name='budget_user_month_amount_idx'),
+        *[
+            migrations.AddField(model_name=model, name=f'{field}_cents', field=models.BigIntegerField(null=True))
+            for model, table, field, max_digits, options in AMOUNTS
+        ],
+        *[
+            migrations.AlterField(model_name=model, name=field, field=models.DecimalField(
+                max_digits=max_digits, decimal_places=2, null=True, **options
+            ))
+            for model, table, field, max_digits, options in AMOUNTS
+        ],
+        *[to_cents(table, field) for model, table, field, max_digits, options in AMOUNTS],
+        *[
+            migrations.RemoveField(model_name=model, name=field)
+            for model, table, field, max_digits, options in AMOUNTS
+        ],
+        *[
+            migrations.RenameField(model_name=model, old_name=f'{field}_cents', new_name=field)
+            for model, table, field, max_digits, options in AMOUNTS
+        ],
+        *[
+            migrations.AlterField(model_name=model, name=field, field=budget.fields.MoneyField(
+                max_digits=max_digits, decimal_places=2, **options
+            ))
+            for model, table, field, max_digits, options in AMOUNTS
+        ],
+        migrations.AddIndex(
+            model_name='monthlybudget',
+            index=models.Index(fields=['user', 'month', 'total_budget_amount'], name='budget_user_month_amount_idx'),
+        ),
+        migrations.RunPython(_fts_v1.install, _fts_v1.uninstall),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations, models
+from django.db.models import Count, Min, Sum
+
+
+def merge_uncategorised_duplicates(apps, schema_editor):
+    """Fold duplicate uncategorised rollup rows, which concurrent writers could create, into one."""
+    TransactionRollup = apps.get_model('budget', 'TransactionRollup')
+    rollups = TransactionRollup.objects.using(schema_editor.connection.alias).filter(category__isnull=True)
+    duplicates = (
+        rollups.values('user', 'month', 'type')
+        .annotate(rows=Count('id'), total_sum=Sum('total'), count_sum=Sum('count'), keep=Min('id'))
+        .filter(rows__gt=1)
+    )
+    for row in duplicates:
+        rollups.filter(pk=row['keep']).update(total=row['total_sum'], count=row['count_sum'])
+        rollups.filter(user=row['user'], month=row['month'], type=row['type']).exclude(pk=row['keep']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('budget', '0007_money_in_cents'),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_uncategorised_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='transactionrollup',
+            constraint=models.UniqueConstraint(
+                condition=models.Q(('category__isnull', True)), fields=('user', 'month', 'type'),
+                name='rollup_uncategorised_unique',
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+"""
+The SQLite full-text index of transactions as migration 0004 created it.
+
+Used only by migrations, and frozen: budget/search.py may change without
+changing what old migrations do. A migration that alters the index or its
+triggers gets a new copy (_fts_v2.py) instead of editing this one.
+"""
+from django.db import OperationalError
+
+FTS_TABLE = 'budget_transaction_fts'
+
+_CATEGORY_NAME = "coalesce((SELECT name FROM budget_category WHERE id = new.category_id), '')"
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        owner, description, category_name,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_insert",
+    f"""CREATE TRIGGER budget_transaction_fts_insert AFTER INSERT ON budget_transaction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, owner, description, category_name)
+        VALUES (new.id, 'u' || new.user_id, coalesce(new.description, ''), {_CATEGORY_NAME});
+    END""",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_delete",
+    f"""CREATE TRIGGER budget_transaction_fts_delete AFTER DELETE ON budget_transaction BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_update",
+    f"""CREATE TRIGGER budget_transaction_fts_update
+    AFTER UPDATE OF user_id, description, category_id ON budget_transaction BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, owner, description, category_name)
+        VALUES (new.id, 'u' || new.user_id, coalesce(new.description, ''), {_CATEGORY_NAME});
+    END""",
+    "DROP TRIGGER IF EXISTS budget_category_fts_update",
+    f"""CREATE TRIGGER budget_category_fts_update AFTER UPDATE OF name ON budget_category BEGIN
+        UPDATE {FTS_TABLE} SET category_name = coalesce(new.name, '')
+        WHERE rowid IN (SELECT id FROM budget_transaction WHERE category_id = new.id);
+    END""",
+    f"DELETE FROM {FTS_TABLE}",
+    f"""INSERT INTO {FTS_TABLE}(rowid, owner, description, category_name)
+        SELECT t.id, 'u' || t.user_id, coalesce(t.description, ''), coalesce(c.name, '')
+        FROM budget_transaction t LEFT JOIN budget_category c ON c.id = t.category_id""",
+]
+
+UNINSTALL_SQL = [
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_update",
+    "DROP TRIGGER IF EXISTS budget_category_fts_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+def install(apps, schema_editor):
+    """Create (or recreate) the FTS table and its triggers, then reindex. A no-op off SQLite."""
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        try:
+            cursor.execute(INSTALL_SQL[0])
+        except OperationalError:
+            # SQLite built without FTS5: searches use the icontains fallback.
+            return
+        for statement in INSTALL_SQL[1:]:
+            cursor.execute(statement)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for statement in UNINSTALL_SQL:
+            cursor.execute(statement)
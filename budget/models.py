@@ -3,6 +3,8 @@ from django.contrib.auth.models import User
 from django.conf import settings 
 from django.core.validators import MinValueValidator
 
+from .fields import MoneyField
+
 
 class Category(models.Model):
     INCOME = 'Income'
@@ -19,6 +21,7 @@ class Category(models.Model):
     type = models.CharField(max_length=7, choices=TYPE_CHOICES)
     icon = models.CharField(max_length=100, null=True, blank=True,default="https://cdn-icons-png.flaticon.com/512/8552/8552832.png") 
     color = models.CharField(max_length=20, null=True, blank=True) 
+    updated_at = models.DateTimeField(auto_now=True)
 
     def __str__(self):
         return f"{self.name} ({self.type})"
@@ -26,7 +29,7 @@ class Category(models.Model):
 class MonthlyBudget(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='monthly_budgets')
     month = models.CharField(max_length=7, help_text="Format: YYYY-MM")
-    total_budget_amount = models.DecimalField(
+    total_budget_amount = MoneyField(
         max_digits=12, 
         decimal_places=2,
         validators=[MinValueValidator(0)]
@@ -37,6 +40,10 @@ class MonthlyBudget(models.Model):
     class Meta:
         unique_together = ['user', 'month']
         ordering = ['-month']
+        indexes = [
+            # Covers the dashboard's (month, amount) lookup without touching the table.
+            models.Index(fields=['user', 'month', 'total_budget_amount'], name='budget_user_month_amount_idx'),
+        ]
 
     def __str__(self):
         return f"{self.user.username}'s budget for {self.month}" 
@@ -53,7 +60,7 @@ class Transaction(models.Model):
     id = models.AutoField(primary_key=True)
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     type = models.CharField(max_length=7, choices=TYPE_CHOICES)
-    amount = models.DecimalField(max_digits=12, decimal_places=2)
+    amount = MoneyField(max_digits=12, decimal_places=2)
     category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, related_name='transactions')
     date = models.DateTimeField()
     description = models.TextField(null=True, blank=True)
@@ -62,6 +69,72 @@ class Transaction(models.Model):
 
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [
+            models.Index(fields=['user', 'date', 'created_at'], name='transaction_user_date_idx'),
+            models.Index(fields=['user', 'type', 'date', 'created_at'], name='transaction_user_type_date_idx'),
+            models.Index(fields=['user', 'category', 'date', 'created_at'], name='transaction_user_cat_date_idx'),
+            # Delta sync: a user's rows changed since a point in time.
+            models.Index(fields=['user', 'updated_at'], name='transaction_user_updated_idx'),
+        ]
 
     def __str__(self):
         return f"{self.type}: {self.amount} - {self.category.name if self.category else 'No Category'} ({self.date})"
+
+
+class TransactionRollup(models.Model):
+    """Per-user monthly totals of Transaction amounts, kept in step by budget.rollups."""
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='transaction_rollups')
+    month = models.CharField(max_length=7, help_text="Format: YYYY-MM")
+    type = models.CharField(max_length=7, choices=Transaction.TYPE_CHOICES)
+    category = models.ForeignKey(Category, on_delete=models.SET_NULL, null=True, blank=True, related_name='rollups')
+    total = MoneyField(max_digits=14, decimal_places=2, default=0)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ['user', 'month', 'type', 'category']
+        constraints = [
+            # NULLs are distinct in the unique index above, so the uncategorised bucket needs its own.
+            models.UniqueConstraint(
+                fields=['user', 'month', 'type'], condition=models.Q(category__isnull=True),
+                name='rollup_uncategorised_unique',
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {self.month} {self.type}: {self.total} ({self.count})"
+
+
+class DataVersion(models.Model):
+    """Counter bumped on every write to a user's budget data; the row without a user tracks global categories."""
+    user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='data_version')
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.user_id or 'global'}: v{self.version}"
+
+
+class Tombstone(models.Model):
+    """A deleted Transaction, MonthlyBudget or Category, kept for delta sync; see budget.sync."""
+    TRANSACTION = 'transaction'
+    MONTHLY_BUDGET = 'monthly_budget'
+    CATEGORY = 'category'
+
+    KIND_CHOICES = [
+        (TRANSACTION, 'Transaction'),
+        (MONTHLY_BUDGET, 'Monthly budget'),
+        (CATEGORY, 'Category'),
+    ]
+
+    # None for global categories.
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, null=True, blank=True, related_name='tombstones')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'deleted_at'], name='tombstone_user_deleted_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id} deleted at {self.deleted_at}"
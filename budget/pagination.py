@@ -0,0 +1,130 @@
+import base64
+import json
+from collections import OrderedDict
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor pagination over transactions, newest first.
+
+    Rows are ordered on (date, created_at, id) and each page is selected with a
+    range predicate on that key instead of an OFFSET, so page N costs the same
+    as page 1. Cursors are opaque to clients. The total count is only computed
+    when the client passes include_count=true.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    cursor_query_param = 'cursor'
+    count_query_param = 'include_count'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.count = None
+        if request.query_params.get(self.count_query_param, '').lower() in ('1', 'true', 'yes'):
+            self.count = queryset.count()
+
+        direction, position = self.decode_cursor(request)
+        self.reverse = direction == 'p'
+
+        if self.reverse:
+            queryset = queryset.order_by('date', 'created_at', 'id')
+        else:
+            queryset = queryset.order_by('-date', '-created_at', '-id')
+        if position:
+            queryset = queryset.filter(self.beyond(position, self.reverse))
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.reverse:
+            rows.reverse()
+
+        if self.reverse:
+            self.has_next, self.has_previous = position is not None, has_more
+        else:
+            self.has_next, self.has_previous = has_more, position is not None
+
+        self.first = self.position_of(rows[0]) if rows else position
+        self.last = self.position_of(rows[-1]) if rows else position
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    @staticmethod
+    def position_of(row):
+        if isinstance(row, dict):
+            return (row['date'], row['created_at'], row['id'])
+        return (row.date, row.created_at, row.id)
+
+    @staticmethod
+    def beyond(position, ascending):
+        """Rows strictly after `position` in the requested direction."""
+        date, created_at, pk = position
+        op = 'gt' if ascending else 'lt'
+        # The plain range bound on date lets the database seek the (user, date, created_at) index.
+        return Q(**{f'date__{op}e': date}) & (
+            Q(**{f'date__{op}': date}) |
+            Q(date=date, **{f'created_at__{op}': created_at}) |
+            Q(date=date, created_at=created_at, **{f'id__{op}': pk})
+        )
+
+    def encode_cursor(self, direction, position):
+        date, created_at, pk = position
+        payload = json.dumps([direction, date.isoformat(), created_at.isoformat(), pk], separators=(',', ':'))
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return 'n', None
+        try:
+            padded = encoded + '=' * (-len(encoded) % 4)
+            direction, date, created_at, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            if direction not in ('n', 'p'):
+                raise ValueError(direction)
+            return direction, (datetime.fromisoformat(date), datetime.fromisoformat(created_at), int(pk))
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def get_link(self, direction, position):
+        url = self.request.build_absolute_uri()
+        if position is None:
+            return remove_query_param(url, self.cursor_query_param)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(direction, position))
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        return self.get_link('n', self.last)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        return self.get_link('p', self.first)
+
+    def get_paginated_response(self, data):
+        fields = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]
+        if self.count is not None:
+            fields.insert(0, ('count', self.count))
+        return Response(OrderedDict(fields))
@@ -0,0 +1,151 @@
+"""
+Incremental maintenance of TransactionRollup rows.
+
+Every write to a Transaction made through the budget views is mirrored here
+as a delta on the matching (user, month, type, category) rollup row, inside
+the same database transaction. `rebuild` recomputes the rows from scratch
+and is what the `rebuild_rollups` management command runs to repair drift.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import Count, F, Sum, Value
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Transaction, TransactionRollup
+
+
+def month_key(value):
+    """YYYY-MM of a transaction date in the current time zone."""
+    if timezone.is_aware(value):
+        value = timezone.localtime(value)
+    return f"{value.year}-{value.month:02d}"
+
+
+def snapshot(txn):
+    """The rollup key and amount of a transaction, taken before it is changed."""
+    return (txn.user_id, month_key(txn.date), txn.type, txn.category_id), txn.amount
+
+
+def record_created(transactions):
+    apply_changes((snapshot(txn), 1) for txn in transactions)
+
+
+def record_deleted(transactions):
+    apply_changes((snapshot(txn), -1) for txn in transactions)
+
+
+def record_updated(before, txn):
+    """Move a transaction's contribution from its `before` snapshot to its current state."""
+    apply_changes([(before, -1), (snapshot(txn), 1)])
+
+
+def apply_changes(changes):
+    """
+    Apply (snapshot, sign) pairs to the rollup table.
+
+    Changes are merged per rollup key first, so a batch touching the same
+    month and category many times costs one UPDATE for that key.
+    """
+    deltas = defaultdict(lambda: [Decimal('0'), 0])
+    for (key, amount), sign in changes:
+        deltas[key][0] += amount * sign
+        deltas[key][1] += sign
+
+    with transaction.atomic(using=router.db_for_write(TransactionRollup)):
+        for (user_id, month, type, category_id), (amount, count) in deltas.items():
+            if not amount and not count:
+                continue
+            _add(user_id, month, type, category_id, amount, count)
+
+
+def _add(user_id, month, type, category_id, amount, count):
+    rows = TransactionRollup.objects.filter(user_id=user_id, month=month, type=type, category_id=category_id)
+    # The delta is converted to the cents that the MoneyField column holds.
+    delta = Value(amount, output_field=TransactionRollup._meta.get_field('total'))
+    if rows.update(total=F('total') + delta, count=F('count') + count):
+        return
+    try:
+        with transaction.atomic(using=router.db_for_write(TransactionRollup)):
+            TransactionRollup.objects.create(
+                user_id=user_id, month=month, type=type, category_id=category_id, total=amount, count=count
+            )
+    except IntegrityError:
+        # A concurrent writer created the row first.
+        rows.update(total=F('total') + delta, count=F('count') + count)
+
+
+def release_category(category):
+    """
+    Fold a category's rollups into the uncategorised buckets before it is deleted.
+
+    Deleting a Category sets its transactions' category to NULL, so their
+    totals have to move to the (user, month, type, NULL) rows.
+    """
+    with transaction.atomic(using=router.db_for_write(TransactionRollup)):
+        rows = list(TransactionRollup.objects.filter(category=category))
+        apply_changes(
+            (((row.user_id, row.month, row.type, None), row.total), 1) for row in rows
+        )
+        TransactionRollup.objects.filter(pk__in=[row.pk for row in rows]).delete()
+
+
+def compute(user_id):
+    """Rollup totals for one user recomputed from the Transaction table."""
+    rows = Transaction.objects.filter(user_id=user_id).annotate(
+        period=TruncMonth('date')
+    ).values('period', 'type', 'category_id').annotate(
+        total=Sum('amount'), count=Count('id')
+    ).order_by()
+
+    # Amounts are summed as integer cents, so the totals are exact.
+    totals = defaultdict(lambda: [Decimal('0'), 0])
+    for row in rows:
+        key = (month_key(row['period']), row['type'], row['category_id'])
+        totals[key][0] += row['total']
+        totals[key][1] += row['count']
+    return totals
+
+
+def rebuild(user_ids=None, batch_size=1000):
+    """
+    Make the rollup table match the Transaction table.
+
+    Only rows that differ are touched. Returns a dict with the number of
+    rollup rows created, updated and deleted.
+    """
+    if user_ids is None:
+        user_ids = set(Transaction.objects.values_list('user_id', flat=True).distinct())
+        user_ids |= set(TransactionRollup.objects.values_list('user_id', flat=True).distinct())
+
+    stats = {'created': 0, 'updated': 0, 'deleted': 0}
+    for user_id in sorted(user_ids):
+        with transaction.atomic(using=router.db_for_write(TransactionRollup)):
+            expected = compute(user_id)
+            to_create, to_update, to_delete = [], [], []
+
+            for row in TransactionRollup.objects.filter(user_id=user_id).select_for_update():
+                key = (row.month, row.type, row.category_id)
+                if key not in expected:
+                    to_delete.append(row.pk)
+                    continue
+                total, count = expected.pop(key)
+                if row.total != total or row.count != count:
+                    row.total, row.count = total, count
+                    to_update.append(row)
+
+            for (month, type, category_id), (total, count) in expected.items():
+                to_create.append(TransactionRollup(
+                    user_id=user_id, month=month, type=type, category_id=category_id, total=total, count=count
+                ))
+
+            TransactionRollup.objects.filter(pk__in=to_delete).delete()
+            TransactionRollup.objects.bulk_update(to_update, ['total', 'count'], batch_size=batch_size)
+            TransactionRollup.objects.bulk_create(to_create, batch_size=batch_size)
+
+        stats['created'] += len(to_create)
+        stats['updated'] += len(to_update)
+        stats['deleted'] += len(to_delete)
+    return stats
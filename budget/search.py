@@ -0,0 +1,171 @@
+"""
+Full-text search over transaction descriptions and category names.
+
+On SQLite the text lives in an FTS5 table, budget_transaction_fts, whose
+rowid is the transaction id. Triggers on budget_transaction and
+budget_category keep it in sync with every write, including bulk inserts
+and raw updates. A hidden `owner` column holds a per-user token so a
+search only walks the caller's postings. Other database backends fall back
+to icontains filters.
+
+The table and triggers are created by migrations, from the frozen copy of
+this SQL in migrations/_fts_v1.py. A change to INSTALL_SQL needs a migration
+that installs the new version. Migrations that rebuild budget_transaction or
+budget_category on SQLite drop the triggers first and install them again
+afterwards.
+
+Search terms that look like numbers never reach the text index. They are
+matched against the transaction id and the amount instead.
+"""
+import re
+from contextlib import contextmanager
+from decimal import Decimal, InvalidOperation
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Transaction
+
+FTS_TABLE = 'budget_transaction_fts'
+
+_NUMBER = re.compile(r'^\d{1,12}(\.\d{1,2})?$')
+_TOKEN = re.compile(r'\w+', re.UNICODE)
+
+_CATEGORY_NAME = "coalesce((SELECT name FROM budget_category WHERE id = new.category_id), '')"
+
+INSTALL_SQL = [
+    f"""CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5(
+        owner, description, category_name,
+        tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3'
+    )""",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_insert",
+    f"""CREATE TRIGGER budget_transaction_fts_insert AFTER INSERT ON budget_transaction BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, owner, description, category_name)
+        VALUES (new.id, 'u' || new.user_id, coalesce(new.description, ''), {_CATEGORY_NAME});
+    END""",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_delete",
+    f"""CREATE TRIGGER budget_transaction_fts_delete AFTER DELETE ON budget_transaction BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END""",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_update",
+    f"""CREATE TRIGGER budget_transaction_fts_update
+    AFTER UPDATE OF user_id, description, category_id ON budget_transaction BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE}(rowid, owner, description, category_name)
+        VALUES (new.id, 'u' || new.user_id, coalesce(new.description, ''), {_CATEGORY_NAME});
+    END""",
+    "DROP TRIGGER IF EXISTS budget_category_fts_update",
+    f"""CREATE TRIGGER budget_category_fts_update AFTER UPDATE OF name ON budget_category BEGIN
+        UPDATE {FTS_TABLE} SET category_name = coalesce(new.name, '')
+        WHERE rowid IN (SELECT id FROM budget_transaction WHERE category_id = new.id);
+    END""",
+    f"DELETE FROM {FTS_TABLE}",
+    f"""INSERT INTO {FTS_TABLE}(rowid, owner, description, category_name)
+        SELECT t.id, 'u' || t.user_id, coalesce(t.description, ''), coalesce(c.name, '')
+        FROM budget_transaction t LEFT JOIN budget_category c ON c.id = t.category_id""",
+]
+
+UNINSTALL_SQL = [
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_insert",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_delete",
+    "DROP TRIGGER IF EXISTS budget_transaction_fts_update",
+    "DROP TRIGGER IF EXISTS budget_category_fts_update",
+    f"DROP TABLE IF EXISTS {FTS_TABLE}",
+]
+
+
+@contextmanager
+def suspended(using=DEFAULT_DB_ALIAS):
+    """
+    Drop the index triggers for the duration of a bulk load, then reindex once.
+
+    Rebuilding the index in one pass is much faster than letting the insert
+    trigger run for every row of a large load.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or FTS_TABLE not in connection.introspection.table_names():
+        yield
+        return
+    with connection.cursor() as cursor:
+        for statement in UNINSTALL_SQL[:-1]:
+            cursor.execute(statement)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for statement in INSTALL_SQL[1:]:
+                cursor.execute(statement)
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    if not hasattr(connection, '_budget_fts_available'):
+        connection._budget_fts_available = FTS_TABLE in connection.introspection.table_names()
+    return connection._budget_fts_available
+
+
+def numeric_filter(term):
+    """An id/amount filter for terms that look like numbers, else None."""
+    if not _NUMBER.match(term):
+        return None
+    try:
+        amount = Decimal(term)
+    except InvalidOperation:
+        return None
+    if '.' in term:
+        return Q(amount=amount)
+    return Q(id=int(term)) | Q(amount__gte=amount, amount__lt=amount + 1)
+
+
+def match_expression(term, user_id):
+    """
+    FTS5 query for `term` scoped to one user's rows.
+
+    Every word must match either column; the last word is treated as a prefix
+    so results update while the user is still typing.
+    """
+    tokens = _TOKEN.findall(term)
+    if not tokens:
+        return None
+    phrases = [f'"{token}"' for token in tokens]
+    phrases[-1] += '*'
+    return f'owner : "u{int(user_id)}" AND {{description category_name}} : ({" AND ".join(phrases)})'
+
+
+def filter_transactions(queryset, term, user_id):
+    """Restrict `queryset` (already scoped to `user_id`) to rows matching `term`."""
+    term = term.strip()
+    numeric = numeric_filter(term)
+    if numeric is not None:
+        return queryset.filter(numeric)
+
+    if not fts_available():
+        return queryset.filter(Q(description__icontains=term) | Q(category__name__icontains=term))
+
+    try:
+        match = match_expression(term, user_id)
+    except (TypeError, ValueError):
+        match = None
+    if match is None:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(
+        f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s", [match]
+    ))
+
+
+def ranked_ids(term, user_id, limit):
+    """Ids of the user's best matches for `term`, best first, or None if unavailable."""
+    if not fts_available():
+        return None
+    match = match_expression(term, user_id)
+    if match is None:
+        return []
+    with connections[router.db_for_read(Transaction)].cursor() as cursor:
+        cursor.execute(
+            f"SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s "
+            f"ORDER BY bm25({FTS_TABLE}, 0.0, 1.0, 0.5) LIMIT %s",
+            [match, limit]
+        )
+        return [row[0] for row in cursor.fetchall()]
@@ -0,0 +1,218 @@
+"""
+Deterministic synthetic data for load tests and benchmarks.
+
+seed() creates users with their own categories, monthly budgets and
+transactions spread over the months up to `end_month`. Users, categories
+and budgets are written with batched bulk_create and share one password
+hash. Transactions are written in batches with executemany() on prepared
+parameter tuples, because building and preparing model instances costs
+more than the inserts themselves. The full-text index triggers are
+suspended during the load and the index is rebuilt once at the end. The
+same arguments and seed always produce the same data. Rollups and data
+versions of the new users are brought up to date at the end. With shards
+(see shards.py) each user's data is written to their own shard.
+
+Seeded users have emails like seed-000001@example.com, which is how
+clear() finds them again.
+"""
+import random
+from datetime import datetime, timedelta
+from decimal import Decimal
+from itertools import islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import connections, router, transaction
+from django.utils import timezone
+
+from . import rollups, search, shards, versioning
+from .models import Category, MonthlyBudget, Transaction
+
+EMAIL_PATTERN = 'seed-{:06d}@example.com'
+EMAIL_PREFIX = 'seed-'
+PASSWORD = 'seed-password'
+
+GLOBAL_CATEGORIES = [
+    ('Salary', Category.INCOME, '#2E7D32'),
+    ('Groceries', Category.EXPENSE, '#F9A825'),
+    ('Rent', Category.EXPENSE, '#6A1B9A'),
+    ('Transport', Category.EXPENSE, '#1565C0'),
+    ('Utilities', Category.EXPENSE, '#00838F'),
+]
+
+USER_CATEGORIES = [
+    ('Freelance', Category.INCOME), ('Dividends', Category.INCOME), ('Dining out', Category.EXPENSE),
+    ('Coffee', Category.EXPENSE), ('Subscriptions', Category.EXPENSE), ('Travel', Category.EXPENSE),
+    ('Health', Category.EXPENSE), ('Gifts', Category.EXPENSE), ('Pets', Category.EXPENSE),
+    ('Books', Category.EXPENSE), ('Hobbies', Category.EXPENSE), ('Insurance', Category.EXPENSE),
+]
+
+MERCHANTS = {
+    Category.INCOME: ['Payroll', 'Client invoice', 'Refund', 'Interest', 'Bonus', 'Side project'],
+    Category.EXPENSE: [
+        'Supermarket', 'Corner cafe', 'Metro card', 'Bookshop', 'Pharmacy', 'Pizza place', 'Cinema',
+        'Electric company', 'Water utility', 'Streaming service', 'Gym membership', 'Airline',
+        'Hardware store', 'Pet shop', 'Taxi ride', 'Bakery', 'Farmers market', 'Phone bill',
+    ],
+}
+
+
+def month_range(end_month, months):
+    """The `months` YYYY-MM strings ending with `end_month`, oldest first."""
+    year, month_num = map(int, end_month.split('-'))
+    result = []
+    for _ in range(months):
+        result.append(f'{year}-{month_num:02d}')
+        year, month_num = (year - 1, 12) if month_num == 1 else (year, month_num - 1)
+    return result[::-1]
+
+
+def _chunks(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def _global_categories():
+    existing = {
+        (category.name, category.type): category for category in Category.objects.filter(user__isnull=True)
+    }
+    missing = [
+        Category(name=name, type=type, color=color)
+        for name, type, color in GLOBAL_CATEGORIES if (name, type) not in existing
+    ]
+    for category in Category.objects.bulk_create(missing):
+        existing[category.name, category.type] = category
+    return list(existing.values())
+
+
+TRANSACTION_COLUMNS = ('user', 'type', 'amount', 'category', 'date', 'description', 'created_at', 'updated_at')
+
+
+def _transaction_rows(rng, user, categories, months, count):
+    """Yield INSERT parameter tuples in TRANSACTION_COLUMNS order, adapted for the database."""
+    connection = connections[router.db_for_write(Transaction)]
+    ops = connection.ops
+    now = ops.adapt_datetimefield_value(timezone.now())
+    by_type = {
+        kind: [category.pk for category in categories if category.type == kind]
+        for kind in (Category.INCOME, Category.EXPENSE)
+    }
+    starts = [timezone.make_aware(datetime(*map(int, month.split('-')), 1)) for month in months]
+    for _ in range(count):
+        kind = Transaction.INCOME if rng.random() < 0.15 else Transaction.EXPENSE
+        # Amounts in cents, as the MoneyField column stores them.
+        if kind == Transaction.INCOME:
+            amount = rng.randrange(50_000, 500_000)
+        else:
+            amount = int(rng.lognormvariate(7.5, 1.2)) + 50
+        start = rng.choice(starts)
+        yield (
+            user.pk,
+            kind,
+            amount,
+            rng.choice(by_type[kind]) if rng.random() < 0.9 else None,
+            ops.adapt_datetimefield_value(start + timedelta(days=rng.randrange(28), seconds=rng.randrange(86_400))),
+            f'{rng.choice(MERCHANTS[kind])} #{rng.randrange(10_000)}' if rng.random() < 0.8 else None,
+            now,
+            now,
+        )
+
+
+def _insert_transactions(rows):
+    meta = Transaction._meta
+    connection = connections[router.db_for_write(Transaction)]
+    columns = ', '.join(connection.ops.quote_name(meta.get_field(name).column) for name in TRANSACTION_COLUMNS)
+    placeholders = ', '.join(['%s'] * len(TRANSACTION_COLUMNS))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {meta.db_table} ({columns}) VALUES ({placeholders})', rows)
+
+
+def seed(users=10, transactions_per_user=1000, months=24, end_month=None, seed=0, batch_size=5000,
+         first_user=1, progress=None):
+    """
+    Create `users` users numbered from `first_user` with their data; returns counts per model.
+
+    `progress`, if given, is called with the running transaction count after each batch.
+    """
+    rng = random.Random(seed)
+    end_month = end_month or timezone.localdate().strftime('%Y-%m')
+    month_list = month_range(end_month, months)
+    password = make_password(PASSWORD)
+    User = get_user_model()
+
+    with shards.for_user(None):
+        shared = _global_categories()
+    if shards.enabled():
+        shards.copy_global_categories(shards.shard_for(None))
+
+    created_users = User.objects.bulk_create([
+        User(email=EMAIL_PATTERN.format(number), password=password,
+             first_name='Seed', last_name=f'User {number}')
+        for number in range(first_user, first_user + users)
+    ], batch_size=batch_size)
+    shards.mirror_users(created_users)
+
+    counts = {'users': len(created_users), 'categories': 0, 'budgets': 0, 'transactions': 0}
+    groups = shards.by_shard([user.pk for user in created_users])
+    for alias, user_ids in groups.items():
+        members = set(user_ids)
+        with shards.using_shard(alias):
+            _seed_users(rng, [user for user in created_users if user.pk in members], shared, month_list,
+                        transactions_per_user, batch_size, counts, progress)
+    return counts
+
+
+def _seed_users(rng, users, shared, month_list, transactions_per_user, batch_size, counts, progress):
+    """Write the categories, budgets and transactions of `users`, which share a database; adds to `counts`."""
+    alias = router.db_for_write(Transaction)
+    own_categories = Category.objects.bulk_create([
+        Category(user=user, name=name, type=type, color=f'#{rng.randrange(0x1000000):06X}')
+        for user in users
+        for name, type in rng.sample(USER_CATEGORIES, 6)
+    ], batch_size=batch_size)
+    categories_by_user = {}
+    for category in own_categories:
+        categories_by_user.setdefault(category.user_id, []).append(category)
+
+    MonthlyBudget.objects.bulk_create([
+        MonthlyBudget(user=user, month=month, total_budget_amount=Decimal(rng.randrange(1_500, 6_000)))
+        for user in users
+        for month in month_list
+        if rng.random() < 0.9
+    ], batch_size=batch_size)
+
+    with search.suspended(alias):
+        for user in users:
+            rows = _transaction_rows(rng, user, shared + categories_by_user.get(user.pk, []), month_list,
+                                     transactions_per_user)
+            for batch in _chunks(rows, batch_size):
+                with transaction.atomic(using=alias):
+                    _insert_transactions(batch)
+                counts['transactions'] += len(batch)
+                if progress:
+                    progress(counts['transactions'])
+
+    user_ids = [user.pk for user in users]
+    rollups.rebuild(user_ids=user_ids, batch_size=batch_size)
+    versioning.bump(*user_ids)
+    counts['categories'] += len(own_categories)
+    counts['budgets'] += MonthlyBudget.objects.filter(user_id__in=user_ids).count()
+
+
+def seeded_users():
+    return get_user_model().objects.filter(email__startswith=EMAIL_PREFIX, email__endswith='@example.com')
+
+
+def next_user_number():
+    """The number after the highest seeded user, so repeated runs add new users."""
+    last = seeded_users().order_by('-email').values_list('email', flat=True).first()
+    return int(last[len(EMAIL_PREFIX):].split('@')[0]) + 1 if last else 1
+
+
+def clear():
+    """Delete every seeded user together with their data."""
+    return seeded_users().delete()[0]
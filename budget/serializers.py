@@ -57,6 +57,38 @@ class TransactionSerializer(serializers.ModelSerializer):
         return super().create(validated_data)
 
 
+class PreloadedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """Resolves primary keys from a dict of preloaded instances instead of one query per value."""
+
+    def __init__(self, instances, **kwargs):
+        self.instances = instances
+        super().__init__(**kwargs)
+
+    def to_internal_value(self, data):
+        if isinstance(data, bool):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            return self.instances[int(data)]
+        except KeyError:
+            self.fail('does_not_exist', pk_value=data)
+        except (TypeError, ValueError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+
+
+class TransactionBatchSerializer(TransactionSerializer):
+    """TransactionSerializer for batch operations: the owner is implied and categories are preloaded."""
+
+    class Meta(TransactionSerializer.Meta):
+        read_only_fields = TransactionSerializer.Meta.read_only_fields + ['user']
+
+    def __init__(self, *args, categories=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if categories is not None:
+            self.fields['category'] = PreloadedPrimaryKeyRelatedField(
+                categories, queryset=Category.objects.all(), allow_null=True, required=False
+            )
+
+
 class TransactionDetailSerializer(serializers.ModelSerializer):
     category_detail = CategorySerializer(source='category', read_only=True)
     
@@ -0,0 +1,265 @@
+"""
+Optional sharding of the budget app's data across databases, by user.
+
+With settings.DATABASE_SHARDS set (SQLITE_SHARD_PATHS, see settings.py), a
+user's categories, monthly budgets, transactions, rollups and data version
+live in one shard, chosen by a stable hash of the user id. Writers of users
+on different shards then commit to different SQLite files and do not wait
+for each other. The number of shards must not change once data is written.
+
+ShardRouter sends every query on a budget model to the shard of the user
+being served. That user is set for a request when CachedTokenAuthentication
+sends user_authenticated, and ShardRoutingMiddleware scopes it to the request. Code working on other users'
+data outside a request uses for_user() or using_shard(). Queries on an
+object loaded from a shard stay on that shard. A request therefore only
+sees its own user's shard, so a user id passed in the query string must be
+the caller's own.
+
+Users, tokens and everything outside the budget app stay in the default
+database. Users are copied into their shard as they are saved, because the
+shard's foreign keys point at them. Global categories (user=None) are copied
+into every shard. They are created in the first shard and copied when saved
+or deleted. Shard n hands out primary keys from n * ID_BLOCK, so ids stay
+unique across shards and copies never collide with a shard's own rows.
+
+`manage.py migrate_shards` migrates the default database and every shard,
+then runs prepare(). Run it instead of migrate. rebuild_rollups and
+seed_data work shard by shard. Existing data in the default database is not
+moved into the shards.
+"""
+import contextvars
+import zlib
+from contextlib import contextmanager, nullcontext
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+
+from authentication.authentication import user_authenticated
+
+from . import rollups, sync, versioning
+from .models import Category
+
+SHARDED_APPS = {'budget'}
+ID_BLOCK = 10 ** 12
+
+current_shard = contextvars.ContextVar('current_shard', default=None)
+_copying = contextvars.ContextVar('copying_global_category', default=False)
+
+
+def enabled():
+    return bool(settings.DATABASE_SHARDS)
+
+
+def aliases():
+    """The databases holding budget data: the shards, or the default database alone."""
+    return list(settings.DATABASE_SHARDS) or [DEFAULT_DB_ALIAS]
+
+
+def shard_for(user_id):
+    """The shard of `user_id`; global data (None) starts out in the first shard."""
+    shards = settings.DATABASE_SHARDS
+    if user_id is None:
+        return shards[0]
+    return shards[zlib.crc32(str(user_id).encode()) % len(shards)]
+
+
+def by_shard(user_ids):
+    """{alias: [user ids]} for the given ids."""
+    groups = {}
+    for user_id in user_ids:
+        groups.setdefault(shard_for(user_id) if enabled() else DEFAULT_DB_ALIAS, []).append(user_id)
+    return groups
+
+
+def current():
+    """The database the budget data of the current user is in."""
+    return current_shard.get() or DEFAULT_DB_ALIAS
+
+
+@contextmanager
+def using_shard(alias):
+    token = current_shard.set(alias)
+    try:
+        yield alias
+    finally:
+        current_shard.reset(token)
+
+
+def for_user(user_id):
+    """Route budget queries to the shard of `user_id` while the block runs."""
+    return using_shard(shard_for(user_id)) if enabled() else nullcontext(DEFAULT_DB_ALIAS)
+
+
+def set_user(user_id):
+    """Route the rest of the current request to the shard of its authenticated user."""
+    if enabled():
+        current_shard.set(shard_for(user_id))
+
+
+def can_reassign(instance, owner_id):
+    """Whether a row with a user can change owner in place: not to another shard, nor to or from global."""
+    if not enabled() or owner_id == instance.user_id:
+        return True
+    return None not in (owner_id, instance.user_id) and shard_for(owner_id) == instance._state.db
+
+
+class ShardRouter:
+
+    def _db(self, model, **hints):
+        shards = settings.DATABASE_SHARDS
+        if not shards or model._meta.app_label not in SHARDED_APPS:
+            return None
+        instance = hints.get('instance')
+        if instance is not None:
+            if instance._state.db in shards:
+                return instance._state.db
+            if isinstance(instance, get_user_model()):
+                return shard_for(instance.pk)
+            user_id = getattr(instance, 'user_id', None)
+            if user_id is not None:
+                return shard_for(user_id)
+        return current_shard.get()
+
+    db_for_read = _db
+    db_for_write = _db
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Users are copied into the shards, so shard rows may point at them.
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_SHARDS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+
+class ShardRoutingMiddleware:
+    """Scopes the shard chosen by authentication to its request. Unused without shards."""
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_SHARDS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        # Undoes set_user() once the request is done; a shard chosen around
+        # the request (for_user(), tests) stays in effect until then.
+        token = current_shard.set(current_shard.get())
+        try:
+            return self.get_response(request)
+        finally:
+            current_shard.reset(token)
+
+
+def copy_rows(model, alias, objects, update=True):
+    """Insert copies of `objects` into `alias` with their primary keys, or update existing ones. Sends no signals."""
+    manager = model._base_manager.using(alias)
+    fields = [field.attname for field in model._meta.concrete_fields]
+    existing = set(manager.filter(pk__in=[obj.pk for obj in objects]).values_list('pk', flat=True))
+    missing = []
+    for obj in objects:
+        values = {field: getattr(obj, field) for field in fields}
+        if obj.pk not in existing:
+            missing.append(model(**values))
+        elif update:
+            manager.filter(pk=obj.pk).update(**values)
+    manager.bulk_create(missing)
+
+
+def mirror_users(users, update=True):
+    """Copy `users` into their shards."""
+    if not enabled():
+        return
+    User = get_user_model()
+    users = list(users)
+    for alias, user_ids in by_shard([user.pk for user in users]).items():
+        ids = set(user_ids)
+        copy_rows(User, alias, [user for user in users if user.pk in ids], update=update)
+
+
+def copy_global_categories(source):
+    """Copy the global categories of the `source` database into every shard."""
+    categories = list(Category.objects.using(source).filter(user__isnull=True))
+    for alias in settings.DATABASE_SHARDS:
+        if alias != source:
+            copy_rows(Category, alias, categories)
+
+
+def reserve_ids(alias, start):
+    """Make the budget tables of `alias` hand out primary keys above `start`."""
+    connection = connections[alias]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for model in connection.introspection.installed_models(connection.introspection.table_names()):
+            if model._meta.app_label not in SHARDED_APPS:
+                continue
+            table = model._meta.db_table
+            cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+            row = cursor.fetchone()
+            if row is None:
+                cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, start])
+            elif row[0] < start:
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [start, table])
+
+
+def prepare():
+    """Reserve each shard's id range and copy in the users and global categories. Safe to run again."""
+    for index, alias in enumerate(settings.DATABASE_SHARDS):
+        reserve_ids(alias, index * ID_BLOCK)
+    mirror_users(get_user_model()._base_manager.using(DEFAULT_DB_ALIAS).iterator(), update=False)
+    copy_global_categories(DEFAULT_DB_ALIAS)
+
+
+def _user_authenticated(sender, user, **kwargs):
+    set_user(user.pk)
+
+
+def _user_saved(sender, instance, using, raw=False, **kwargs):
+    if enabled() and using == DEFAULT_DB_ALIAS and not raw:
+        mirror_users([instance])
+
+
+def _user_deleted(sender, instance, using, **kwargs):
+    if enabled() and using == DEFAULT_DB_ALIAS:
+        # Deletes the user's budget data in the shard with them.
+        sender._base_manager.using(shard_for(instance.pk)).filter(pk=instance.pk).delete()
+
+
+def _other_shards(using):
+    return [alias for alias in settings.DATABASE_SHARDS if alias != using]
+
+
+def _global_category_saved(sender, instance, using, raw=False, **kwargs):
+    if instance.user_id is not None or using not in settings.DATABASE_SHARDS or raw or _copying.get():
+        return
+    for alias in _other_shards(using):
+        with using_shard(alias), transaction.atomic(using=alias):
+            copy_rows(Category, alias, [instance])
+            versioning.bump(None)
+
+
+def _global_category_deleted(sender, instance, using, **kwargs):
+    if instance.user_id is not None or using not in settings.DATABASE_SHARDS or _copying.get():
+        return
+    token = _copying.set(True)
+    try:
+        for alias in _other_shards(using):
+            with using_shard(alias), transaction.atomic(using=alias):
+                for copy in Category.objects.filter(pk=instance.pk):
+                    rollups.release_category(copy)
+                    sync.category_deleted(copy)
+                    versioning.bump(None)
+                    copy.delete()
+    finally:
+        _copying.reset(token)
+
+
+def connect():
+    User = get_user_model()
+    user_authenticated.connect(_user_authenticated, dispatch_uid='budget.shards.user_authenticated')
+    post_save.connect(_user_saved, sender=User, dispatch_uid='budget.shards.user_saved')
+    post_delete.connect(_user_deleted, sender=User, dispatch_uid='budget.shards.user_deleted')
+    post_save.connect(_global_category_saved, sender=Category, dispatch_uid='budget.shards.category_saved')
+    post_delete.connect(_global_category_deleted, sender=Category, dispatch_uid='budget.shards.category_deleted')
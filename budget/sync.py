@@ -0,0 +1,139 @@
+"""
+Delta sync: what changed in a user's transactions, monthly budgets and categories since a cursor.
+
+GET /api/sync/ returns every row the user can see and a cursor. Passing that
+cursor back as ?since= returns the rows created or updated after it, and the
+ids deleted after it, with a new cursor. Rows are found by their updated_at
+column; deletes by the Tombstone rows that every delete path writes through
+record_deleted() or category_deleted(). A row moved to another owner leaves
+a tombstone with its previous owner.
+
+updated_at is stamped when a write starts, and the write may wait for the
+database lock before it commits. A sync running meanwhile cannot see the row
+yet, although its timestamp lies before the sync. The cursor therefore
+reaches back settings.SYNC['OVERLAP_SECONDS'] and some rows come back twice;
+clients apply rows by id, so that is harmless.
+
+The cursor also carries the user's data versions (see versioning.py). When
+neither has moved nothing has changed, and the answer is empty without
+querying the tables. Tombstones older than SYNC['TOMBSTONE_DAYS'] are removed
+by prune(). A cursor older than that gets a full sync instead, flagged with
+"full": true, and the client replaces its copy.
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import fast_serializers, shards, versioning
+from .models import Category, MonthlyBudget, Tombstone, Transaction
+from .serializers import MonthlyBudgetSerializer
+
+# Response keys of the three kinds of rows.
+KEYS = {
+    Tombstone.TRANSACTION: 'transactions',
+    Tombstone.MONTHLY_BUDGET: 'monthly_budgets',
+    Tombstone.CATEGORY: 'categories',
+}
+
+
+class InvalidCursor(ValueError):
+    """A since= value that is not a cursor returned by this endpoint."""
+
+
+def encode_cursor(moment, versions):
+    return '{}-{}-{}'.format(int(moment.timestamp() * 1_000_000), *versions)
+
+
+def decode_cursor(value):
+    """(moment, (user version, global version)) from encode_cursor()'s output."""
+    try:
+        micros, user_version, global_version = (int(part) for part in value.split('-'))
+        moment = datetime.fromtimestamp(micros / 1_000_000, tz=dt_timezone.utc)
+    except (ValueError, OverflowError, OSError):
+        raise InvalidCursor(value)
+    return moment, (user_version, global_version)
+
+
+def record_deleted(kind, user_id, object_ids):
+    """Log deleted rows of `kind` owned by `user_id` (None for global categories)."""
+    Tombstone.objects.bulk_create(
+        Tombstone(user_id=user_id, kind=kind, object_id=object_id) for object_id in object_ids
+    )
+
+
+def category_deleted(category):
+    """
+    Log the deletion of `category`, before it is deleted.
+
+    Its transactions lose their category through SET_NULL, which does not
+    touch updated_at, so they are stamped here to be synced again.
+    """
+    Transaction.objects.filter(category=category).update(updated_at=timezone.now())
+    record_deleted(Tombstone.CATEGORY, category.user_id, [category.pk])
+
+
+def _rows(user_id, after):
+    transactions = Transaction.objects.filter(user_id=user_id)
+    budgets = MonthlyBudget.objects.filter(user_id=user_id)
+    categories = Category.objects.filter(Q(user_id=user_id) | Q(user__isnull=True))
+    if after is not None:
+        transactions = transactions.filter(updated_at__gt=after)
+        budgets = budgets.filter(updated_at__gt=after)
+        categories = categories.filter(updated_at__gt=after)
+    return {
+        'transactions': fast_serializers.transaction_data(
+            fast_serializers.transaction_values(transactions.order_by('updated_at', 'id'))
+        ),
+        'monthly_budgets': MonthlyBudgetSerializer(budgets.order_by('updated_at', 'id'), many=True).data,
+        'categories': fast_serializers.category_data(
+            fast_serializers.category_values(categories.order_by('updated_at', 'id'))
+        ),
+    }
+
+
+def _deleted(user_id, after, rows):
+    deleted = {key: set() for key in KEYS.values()}
+    tombstones = Tombstone.objects.filter(
+        Q(user_id=user_id) | Q(user__isnull=True, kind=Tombstone.CATEGORY), deleted_at__gt=after
+    ).values_list('kind', 'object_id')
+    for kind, object_id in tombstones:
+        deleted[KEYS[kind]].add(object_id)
+    # A row moved away and back again is both; it exists.
+    return {key: sorted(ids - {row['id'] for row in rows[key]}) for key, ids in deleted.items()}
+
+
+def changes(user_id, since=None):
+    """The sync response for `user_id` after the cursor `since`, or a full sync without one."""
+    now = timezone.now()
+    options = settings.SYNC
+    moment, versions = decode_cursor(since) if since else (None, None)
+    full = moment is None or moment < now - timedelta(days=options['TOMBSTONE_DAYS'])
+
+    # One transaction on the primary, or the user's shard, so that the
+    # versions and rows come from the same snapshot and no replica lags it.
+    with transaction.atomic(using=shards.current()):
+        current = versioning.current(user_id)
+        if full:
+            rows = _rows(user_id, None)
+            deleted = {key: [] for key in KEYS.values()}
+        elif current == versions:
+            rows = {key: [] for key in KEYS.values()}
+            deleted = {key: [] for key in KEYS.values()}
+        else:
+            after = moment - timedelta(seconds=options['OVERLAP_SECONDS'])
+            rows = _rows(user_id, after)
+            deleted = _deleted(user_id, after, rows)
+    return {'cursor': encode_cursor(now, current), 'full': full, **rows, 'deleted': deleted}
+
+
+def prune(before=None):
+    """Delete tombstones older than SYNC['TOMBSTONE_DAYS'], or `before`; returns how many."""
+    before = before or timezone.now() - timedelta(days=settings.SYNC['TOMBSTONE_DAYS'])
+    removed = 0
+    for alias in shards.aliases():
+        with shards.using_shard(alias):
+            removed += Tombstone.objects.filter(deleted_at__lt=before).delete()[0]
+    return removed
@@ -1,3 +1,1764 @@
-from django.test import TestCase
+import argparse
+import asyncio
+import gzip
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+from urllib.parse import parse_qs, urlparse
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, IntegrityError, OperationalError, connection, connections, transaction
+from django.db.models import Q, Sum
+from django.test import LiveServerTestCase, TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from BudgetTracker import compression, database, fast_json, metrics, replicas
+from tools import loadgen
+
+from . import async_views, benchmarks, checks, dashboard_cache, group_commit, rollups, search, seeding, shards, sync, versioning, views
+from .models import Category, MonthlyBudget, Tombstone, Transaction, TransactionRollup
+from .serializers import CategorySerializer, TransactionSerializer
+
+User = get_user_model()
+
+
+def aware(*args):
+    return timezone.make_aware(datetime(*args))
+
+
+class BudgetTestCase(TestCase):
+    """Common fixtures: one user with an authenticated API client."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='owner@example.com', password='s3cret-pass', first_name='Owner', last_name='User'
+        )
+        self.other_user = User.objects.create_user(
+            email='other@example.com', password='s3cret-pass', first_name='Other', last_name='User'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        dashboard_cache.get_cache().clear()
+        dashboard_cache.reset_stats()
+
+    def add_transaction(self, when, amount, type=Transaction.EXPENSE, user=None, **extra):
+        transaction = Transaction.objects.create(
+            user=user or self.user, type=type, amount=Decimal(amount), date=when, **extra
+        )
+        rollups.record_created([transaction])
+        return transaction
+
+    def rollup_totals(self, user=None):
+        return {
+            (row.month, row.type, row.category_id): (row.total, row.count)
+            for row in TransactionRollup.objects.filter(user=user or self.user)
+            if row.count
+        }
+
+
+class MonthlySummaryTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_transaction(aware(2024, 1, 5), '100.00', Transaction.INCOME)
+        self.add_transaction(aware(2024, 1, 31, 23, 59), '40.50')
+        self.add_transaction(aware(2024, 3, 1), '20.00')
+        self.add_transaction(aware(2023, 12, 31, 12), '999.00', Transaction.INCOME)
+        self.add_transaction(aware(2024, 1, 10), '500.00', user=self.other_user)
+
+    def test_groups_income_and_expenses_by_month(self):
+        response = self.client.get('/api/financial-data/', {'month': '2024-03'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['monthlyData'], [
+            {'month': 'Jan', 'income': 100.0, 'expenses': 40.5},
+            {'month': 'Feb', 'income': 0.0, 'expenses': 0.0},
+            {'month': 'Mar', 'income': 0.0, 'expenses': 20.0},
+        ])
+
+    def test_range_mode_spans_years(self):
+        response = self.client.get('/api/financial-data/', {'month': '2024-03', 'start': '2023-11', 'end': '2024-02'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['monthlyData'], [
+            {'year': 2023, 'month': 'Nov', 'income': 0.0, 'expenses': 0.0},
+            {'year': 2023, 'month': 'Dec', 'income': 999.0, 'expenses': 0.0},
+            {'year': 2024, 'month': 'Jan', 'income': 100.0, 'expenses': 40.5},
+            {'year': 2024, 'month': 'Feb', 'income': 0.0, 'expenses': 0.0},
+        ])
+
+    def test_range_end_defaults_to_month(self):
+        response = self.client.get('/api/financial-data/', {'month': '2024-01', 'start': '2023-12'})
+
+        self.assertEqual([entry['month'] for entry in response.data['monthlyData']], ['Dec', 'Jan'])
+
+    def test_invalid_ranges_are_rejected(self):
+        for params in [
+            {'end': '2024-01'},
+            {'start': '2024-13'},
+            {'start': '2024-05', 'end': '2024-01'},
+            {'start': '2000-01', 'end': '2024-01'},
+        ]:
+            response = self.client.get('/api/financial-data/', {'month': '2024-03', **params})
+            self.assertEqual(response.status_code, 400, params)
+
+    def test_query_count_does_not_depend_on_months_requested(self):
+        for params in [
+            {'month': '2024-01'},
+            {'month': '2024-12'},
+            {'month': '2024-12', 'start': '2015-01', 'end': '2024-12'},
+        ]:
+            with self.assertNumQueries(5):
+                response = self.client.get('/api/financial-data/', params)
+            self.assertEqual(response.status_code, 200)
+
+
+class TransactionRollupTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        self.rent = Category.objects.create(user=self.user, name='Rent', type=Category.EXPENSE)
+
+    def create(self, **data):
+        payload = {
+            'user': self.user.id, 'type': 'Expense', 'amount': '10.00',
+            'date': '2024-02-10T10:00:00Z', 'category': self.food.id
+        }
+        payload.update(data)
+        response = self.client.post('/api/transactions/', payload)
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_create_update_and_delete_keep_rollups_in_step(self):
+        first = self.create()
+        self.create(amount='5.25')
+        self.assertEqual(self.rollup_totals(), {('2024-02', 'Expense', self.food.id): (Decimal('15.25'), 2)})
+
+        response = self.client.put(f'/api/transactions/{first}/', {
+            'amount': '20.00', 'date': '2024-03-01T00:00:00Z', 'category': self.rent.id, 'type': 'Income'
+        })
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(self.rollup_totals(), {
+            ('2024-02', 'Expense', self.food.id): (Decimal('5.25'), 1),
+            ('2024-03', 'Income', self.rent.id): (Decimal('20.00'), 1),
+        })
+
+        self.client.delete(f'/api/transactions/{first}/')
+        self.assertEqual(self.rollup_totals(), {('2024-02', 'Expense', self.food.id): (Decimal('5.25'), 1)})
+
+    def test_deleting_a_category_moves_totals_to_uncategorised(self):
+        self.create()
+        self.create(category='')
+        self.client.delete(f'/api/categories/{self.food.id}/')
+
+        self.assertEqual(self.rollup_totals(), {('2024-02', 'Expense', None): (Decimal('20.00'), 2)})
+
+    def test_summary_reads_rollups(self):
+        self.create(amount='12.00', type='Income')
+        response = self.client.get('/api/financial-data/', {'month': '2024-02'})
+
+        self.assertEqual(response.data['monthlyData'][1], {'month': 'Feb', 'income': 12.0, 'expenses': 0.0})
+
+    def test_rebuild_is_a_no_op_on_fresh_rollups(self):
+        for _ in range(30):
+            self.create(amount='0.10')
+            self.create(amount='0.20', category='')
+
+        self.assertEqual(rollups.rebuild(), {'created': 0, 'updated': 0, 'deleted': 0})
+
+    def test_uncategorised_rollups_are_unique(self):
+        self.create(category='')
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TransactionRollup.objects.create(user=self.user, month='2024-02', type='Expense', total=1, count=1)
+        self.assertEqual(self.rollup_totals(), {('2024-02', 'Expense', None): (Decimal('10.00'), 1)})
+
+    def test_rebuild_command_repairs_drift(self):
+        self.create()
+        Transaction.objects.create(user=self.user, type='Income', amount=Decimal('3.00'), date=aware(2024, 4, 2))
+        TransactionRollup.objects.create(user=self.user, month='2019-01', type='Expense', total=1, count=1)
+        TransactionRollup.objects.filter(category=self.food).update(total=999)
+
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+
+        self.assertIn('1 created, 1 updated, 1 deleted', out.getvalue())
+        self.assertEqual(self.rollup_totals(), {
+            ('2024-02', 'Expense', self.food.id): (Decimal('10.00'), 1),
+            ('2024-04', 'Income', None): (Decimal('3.00'), 1),
+        })
+
+
+class MoneyFieldTests(BudgetTestCase):
+
+    def stored(self, transaction):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT amount FROM {Transaction._meta.db_table} WHERE id = %s', [transaction.pk])
+            return cursor.fetchone()[0]
+
+    def test_amounts_are_stored_as_cents_and_read_as_decimals(self):
+        transaction = self.add_transaction(aware(2024, 1, 5), '12.346')
+
+        self.assertEqual(self.stored(transaction), 1235)
+        self.assertEqual(Transaction.objects.get(pk=transaction.pk).amount, Decimal('12.35'))
+        self.assertTrue(Transaction.objects.filter(amount__gte=Decimal('12.35'), amount__lt=13).exists())
+        self.assertEqual(Transaction.objects.aggregate(total=Sum('amount'))['total'], Decimal('12.35'))
+
+    def test_sums_of_cents_are_exact(self):
+        for _ in range(10):
+            self.add_transaction(aware(2024, 1, 5), '0.10')
+
+        self.assertEqual(self.rollup_totals(), {('2024-01', 'Expense', None): (Decimal('1.00'), 10)})
+        response = self.client.get('/api/financial-data/', {'month': '2024-01'})
+        self.assertEqual(response.data['monthlyData'][0]['expenses'], 1.0)
+
+    def test_api_keeps_two_decimal_places(self):
+        transaction = self.add_transaction(aware(2024, 1, 5), '-7.05')
+
+        response = self.client.get('/api/transactions/', {'user': self.user.id})
+
+        self.assertEqual(response.data['results'][0]['amount'], '-7.05')
+        self.assertEqual(TransactionSerializer(transaction).data['amount'], '-7.05')
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(BudgetTestCase):
+    """The hot read paths must be served from indexes, never a full table scan."""
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor != 'sqlite':
+            self.skipTest('EXPLAIN QUERY PLAN output is SQLite specific')
+        self.food = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        MonthlyBudget.objects.create(user=self.user, month='2024-03', total_budget_amount=Decimal('100.00'))
+        for day in range(1, 25):
+            self.add_transaction(aware(2024, 1 + day % 4, day), '10.00', category=self.food)
+
+    def query_plans(self, url, params):
+        dashboard_cache.get_cache().clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url, params)
+        self.assertEqual(response.status_code, 200)
+
+        plans = []
+        with connection.cursor() as cursor:
+            for query in ctx.captured_queries:
+                if query['sql'].startswith('SELECT') and 'budget_' in query['sql']:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plans.append((query['sql'], [row[-1] for row in cursor.fetchall()]))
+        return plans
+
+    def assertIndexed(self, url, params, expected_index=None):
+        plans = self.query_plans(url, params)
+        self.assertTrue(plans)
+        for sql, plan in plans:
+            for step in plan:
+                self.assertFalse(step.startswith('SCAN'), f'{step} in plan for {sql}')
+                self.assertNotIn('TEMP B-TREE', step, f'sort without index for {sql}')
+        if expected_index:
+            self.assertTrue(
+                any(expected_index in step for _, plan in plans for step in plan),
+                f'{expected_index} unused for {url} {params}'
+            )
+
+    def test_transaction_list_filters_use_indexes(self):
+        user = self.user.id
+        self.assertIndexed('/api/transactions/', {'user': user}, 'transaction_user_date_idx')
+        self.assertIndexed('/api/transactions/', {'user': user, 'type': 'Expense'}, 'transaction_user_type_date_idx')
+        self.assertIndexed('/api/transactions/', {'user': user, 'category_id': self.food.id}, 'transaction_user_cat_date_idx')
+        self.assertIndexed(
+            '/api/transactions/', {'user': user, 'start_date': '2024-02-01T00:00', 'end_date': '2024-03-01T00:00'},
+            'transaction_user_date_idx'
+        )
+
+    def test_cursor_pages_use_indexes(self):
+        params = {'user': self.user.id, 'pagination': 'cursor', 'page_size': 5}
+        next_link = self.client.get('/api/transactions/', params).data['next']
+        cursor = parse_qs(urlparse(next_link).query)['cursor'][0]
+        self.assertIndexed('/api/transactions/', {**params, 'cursor': cursor}, 'transaction_user_date_idx')
+
+    def test_financial_data_uses_indexes(self):
+        self.assertIndexed('/api/financial-data/', {'month': '2024-03'}, 'budget_user_month_amount_idx')
+        self.assertIndexed('/api/financial-data/', {'month': '2024-03'}, 'transaction_user_date_idx')
+
+
+class KeysetPaginationTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.expected = []
+        for index in range(23):
+            # Pairs of rows share a date so the created_at/id tie-breakers matter.
+            self.expected.append(self.add_transaction(aware(2024, 1, 1 + index // 2, 9), '1.00').id)
+        self.expected.reverse()
+
+    def fetch(self, url=None, **params):
+        if url:
+            response = self.client.get(url)
+        else:
+            response = self.client.get('/api/transactions/', {'user': self.user.id, 'pagination': 'cursor', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_walks_forward_and_back_without_gaps(self):
+        pages = [self.fetch(page_size=10)]
+        while pages[-1]['next']:
+            pages.append(self.fetch(pages[-1]['next']))
+
+        self.assertEqual([len(page['results']) for page in pages], [10, 10, 3])
+        self.assertEqual([row['id'] for page in pages for row in page['results']], self.expected)
+        self.assertIsNone(pages[0]['previous'])
+
+        back = self.fetch(pages[2]['previous'])
+        self.assertEqual([row['id'] for row in back['results']], self.expected[10:20])
+        back = self.fetch(back['previous'])
+        self.assertEqual([row['id'] for row in back['results']], self.expected[:10])
+        self.assertIsNone(back['previous'])
+
+    def test_count_is_opt_in(self):
+        self.assertNotIn('count', self.fetch())
+        self.assertEqual(self.fetch(include_count='true')['count'], 23)
+
+    def test_filters_apply_within_cursor_pages(self):
+        self.add_transaction(aware(2024, 1, 3, 12), '5.00', Transaction.INCOME)
+        page = self.fetch(type='Income')
+        self.assertEqual(len(page['results']), 1)
+        self.assertIsNone(page['next'])
+
+    def test_deep_pages_cost_the_same_as_the_first(self):
+        first = self.fetch(page_size=5)
+        deep = self.fetch(page_size=5)
+        for _ in range(3):
+            deep = self.fetch(deep['next'])
+        with self.assertNumQueries(1):
+            self.fetch(first['next'])
+        with self.assertNumQueries(1):
+            self.fetch(deep['next'])
+
+    def test_invalid_cursor_is_rejected(self):
+        response = self.client.get('/api/transactions/', {'user': self.user.id, 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 404)
+
+
+class TransactionSearchTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.groceries = Category.objects.create(user=self.user, name='Groceries', type=Category.EXPENSE)
+        self.coffee = self.add_transaction(aware(2024, 1, 2), '4.50', description='Morning coffee at Café Nero')
+        self.market = self.add_transaction(aware(2024, 1, 3), '62.10', description='Weekly shop', category=self.groceries)
+        self.beans = self.add_transaction(aware(2024, 1, 4), '12.00', description='Coffee beans, coffee filters')
+        self.add_transaction(aware(2024, 1, 5), '3.00', description='coffee', user=self.other_user)
+
+    def listed(self, term):
+        response = self.client.get('/api/transactions/', {'user': self.user.id, 'search_term': term})
+        self.assertEqual(response.status_code, 200)
+        return {row['id'] for row in response.data['results']}
+
+    def test_matches_words_and_prefixes_in_description(self):
+        self.assertEqual(self.listed('coffee'), {self.coffee.id, self.beans.id})
+        self.assertEqual(self.listed('coff'), {self.coffee.id, self.beans.id})
+        self.assertEqual(self.listed('cafe nero'), {self.coffee.id})
+        self.assertEqual(self.listed('tea'), set())
+
+    def test_matches_category_name_and_follows_renames(self):
+        self.assertEqual(self.listed('groceries'), {self.market.id})
+
+        self.groceries.name = 'Supermarket'
+        self.groceries.save()
+        self.assertEqual(self.listed('groceries'), set())
+        self.assertEqual(self.listed('supermarket'), {self.market.id})
+
+    def test_index_follows_updates_and_deletes(self):
+        self.client.put(f'/api/transactions/{self.coffee.id}/', {'description': 'Train ticket'})
+        self.assertEqual(self.listed('coffee'), {self.beans.id})
+        self.assertEqual(self.listed('train'), {self.coffee.id})
+
+        self.client.delete(f'/api/transactions/{self.beans.id}/')
+        self.assertEqual(self.listed('coffee'), set())
+
+    def test_numeric_terms_match_amount_and_id(self):
+        self.assertEqual(self.listed('62.10'), {self.market.id})
+        self.assertEqual(self.listed('4'), {self.coffee.id})
+        self.assertEqual(self.listed(str(self.beans.id)), {self.beans.id})
+
+    def test_search_endpoint_ranks_results(self):
+        response = self.client.get('/api/transactions/search/', {'q': 'coffee'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.data['results']], [self.beans.id, self.coffee.id])
+
+    def test_falls_back_to_icontains_without_fts(self):
+        with mock.patch('budget.search.fts_available', return_value=False):
+            self.assertEqual(self.listed('coffee'), {self.coffee.id, self.beans.id})
+            self.assertEqual(self.listed('grocer'), {self.market.id})
+            response = self.client.get('/api/transactions/search/', {'q': 'coffee'})
+        self.assertEqual({row['id'] for row in response.data['results']}, {self.coffee.id, self.beans.id})
+
+    def test_search_endpoint_requires_a_term(self):
+        self.assertEqual(self.client.get('/api/transactions/search/').status_code, 400)
+
+
+class TransactionImportTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        Category.objects.create(user=None, name='Salary', type=Category.INCOME)
+        self.salary = Category.objects.create(user=self.user, name='salary', type=Category.INCOME)
+
+    def upload(self, name, content, encoding='utf-8', **extra):
+        upload = SimpleUploadedFile(name, content.encode(encoding))
+        return self.client.post('/api/transactions/import/', {'file': upload, **extra}, format='multipart')
+
+    def test_csv_rows_are_validated_and_imported(self):
+        response = self.upload('export.csv', (
+            'Date,Type,Amount,Category,Description\n'
+            '2024-01-05,Expense,12.50,food,Lunch\n'
+            '2024-01-06T08:30,Income,1000,Salary,January pay\n'
+            '2024-01-07,,-3.20,,Bus ticket\n'
+            '\n'
+            'yesterday,Expense,5,,Bad date\n'
+            '2024-01-08,Refund,5,,Bad type\n'
+            '2024-01-09,Expense,0,,Zero amount\n'
+            '2024-01-10,Expense,7,Travel,Unknown category\n'
+        ))
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'], 3)
+        self.assertEqual(response.data['failed'], 4)
+        self.assertEqual(
+            [(error['row'], sorted(error['errors'])) for error in response.data['errors']],
+            [(6, ['date']), (7, ['type']), (8, ['amount']), (9, ['category'])]
+        )
+
+        imported = Transaction.objects.filter(user=self.user).order_by('date')
+        self.assertEqual(
+            [(t.type, t.amount, t.category_id, t.description) for t in imported],
+            [
+                ('Expense', Decimal('12.50'), self.food.id, 'Lunch'),
+                ('Income', Decimal('1000.00'), self.salary.id, 'January pay'),
+                ('Expense', Decimal('3.20'), None, 'Bus ticket'),
+            ]
+        )
+        self.assertEqual(self.rollup_totals(), {
+            ('2024-01', 'Expense', self.food.id): (Decimal('12.50'), 1),
+            ('2024-01', 'Income', self.salary.id): (Decimal('1000.00'), 1),
+            ('2024-01', 'Expense', None): (Decimal('3.20'), 1),
+        })
+        listed = self.client.get('/api/transactions/', {'user': self.user.id, 'search_term': 'lunch'})
+        self.assertEqual(listed.data['count'], 1)
+
+    @override_settings(REQUEST_TIMING={'ENABLED': False})
+    def test_large_csv_is_written_in_batches_with_one_category_lookup(self):
+        rows = ''.join(f'2024-02-{1 + n % 28:02d},Expense,{n % 90 + 1}.25,Food,Row {n}\n' for n in range(2500))
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.upload('big.csv', 'date,type,amount,category,description\n' + rows)
+
+        self.assertEqual(response.data['created'], 2500)
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 2500)
+        category_lookups = [q for q in ctx.captured_queries if 'FROM "budget_category"' in q['sql']]
+        self.assertEqual(len(category_lookups), 1)
+        # Far fewer statements than rows: SQLite splits each batch to fit its bound-parameter limit.
+        self.assertLess(len(ctx.captured_queries), 60)
+
+    def test_ofx_statement_is_imported(self):
+        response = self.upload('statement.ofx', (
+            'OFXHEADER:100\nDATA:OFXSGML\n\n<OFX><BANKMSGSRSV1><STMTTRNRS><STMTRS><BANKTRANLIST>\n'
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>20240315120000[-5:EST]<TRNAMT>-42.10<FITID>1'
+            '<NAME>GROCERY STORE<MEMO>Card 1234</STMTTRN>\n'
+            '<STMTTRN>\n<TRNTYPE>CREDIT\n<DTPOSTED>20240316\n<TRNAMT>2500.00\n<FITID>2\n<NAME>PAYROLL\n</STMTTRN>\n'
+            '<STMTTRN><TRNTYPE>DEBIT<DTPOSTED>garbage<TRNAMT>-1.00<NAME>BROKEN</STMTTRN>\n'
+            '</BANKTRANLIST></STMTRS></STMTTRNRS></BANKMSGSRSV1></OFX>\n'
+        ))
+
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(response.data['errors'], [{'row': 3, 'errors': {'date': mock.ANY}}])
+        grocery = Transaction.objects.get(user=self.user, type='Expense')
+        self.assertEqual(grocery.amount, Decimal('42.10'))
+        self.assertEqual(grocery.description, 'GROCERY STORE - Card 1234')
+        self.assertEqual(grocery.date, aware(2024, 3, 15, 17))
+
+    def test_impossible_ofx_dates_are_row_errors(self):
+        response = self.upload('statement.ofx', (
+            '<OFX><BANKTRANLIST>\n'
+            '<STMTTRN><DTPOSTED>20240315<TRNAMT>-1.00<NAME>VALID</STMTTRN>\n'
+            '<STMTTRN><DTPOSTED>20241399<TRNAMT>-2.00<NAME>NO SUCH DAY</STMTTRN>\n'
+            '<STMTTRN><DTPOSTED>20240315120000[-99:EST]<TRNAMT>-3.00<NAME>NO SUCH ZONE</STMTTRN>\n'
+            '</BANKTRANLIST></OFX>\n'
+        ))
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual([error['row'] for error in response.data['errors']], [2, 3])
+
+    def test_windows_1252_csv_is_imported(self):
+        response = self.upload('export.csv', (
+            'date,amount,description\n'
+            '2024-01-05,-4.50,Caf\u00e9 cr\u00e8me \u2013 \u20ac\n'
+        ), encoding='cp1252')
+
+        self.assertEqual(response.status_code, 200, response.data)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(Transaction.objects.get(user=self.user).description, 'Caf\u00e9 cr\u00e8me \u2013 \u20ac')
+
+    def test_unreadable_uploads_are_rejected(self):
+        self.assertEqual(self.client.post('/api/transactions/import/', {}, format='multipart').status_code, 400)
+        self.assertEqual(self.upload('data.xlsx', 'x').status_code, 400)
+        self.assertEqual(self.upload('data.csv', 'when,how much\n2024-01-01,3\n').status_code, 400)
+        self.assertEqual(self.upload('data.txt', 'date,amount\n2024-01-01,3\n', file_format='csv').status_code, 200)
+        not_text = SimpleUploadedFile('data.csv', 'date,amount\n2024-01-02,3\n'.encode() + b'\x81\x8d\xff\n')
+        response = self.client.post('/api/transactions/import/', {'file': not_text}, format='multipart')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('UTF-8', response.data['error'])
+        self.assertEqual(Transaction.objects.filter(date__day=2).count(), 0)
+
+
+class TransactionExportTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        self.lunch = self.add_transaction(aware(2024, 1, 5, 12, 30), '12.50', category=self.food, description='Lunch, with "friends"')
+        self.pay = self.add_transaction(aware(2024, 1, 31), '1000.00', Transaction.INCOME, description='Pay')
+        self.add_transaction(aware(2024, 1, 6), '9.99', user=self.other_user)
+
+    def export(self, **params):
+        response = self.client.get('/api/transactions/export/', params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content).decode()
+
+    def test_csv_export_streams_the_users_rows(self):
+        response, body = self.export()
+
+        self.assertEqual(response['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('attachment; filename="transactions.csv"', response['Content-Disposition'])
+        lines = body.splitlines()
+        self.assertEqual(lines[0], 'id,date,type,amount,category,category_id,description,created_at,updated_at')
+        self.assertEqual(len(lines), 3)
+        self.assertTrue(lines[1].startswith(f'{self.pay.id},2024-01-31T00:00:00+00:00,Income,1000.00,,,Pay,'))
+        self.assertTrue(lines[2].startswith(
+            f'{self.lunch.id},2024-01-05T12:30:00+00:00,Expense,12.50,Food,{self.food.id},"Lunch, with ""friends""",'
+        ))
+
+    def test_ndjson_export_applies_list_filters(self):
+        response, body = self.export(output='ndjson', type='Expense', start_date='2024-01-01')
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        rows = [json.loads(line) for line in body.splitlines()]
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]['id'], self.lunch.id)
+        self.assertEqual(rows[0]['amount'], '12.50')
+        self.assertEqual(rows[0]['category'], 'Food')
+
+    def test_export_can_be_reimported(self):
+        _, body = self.export()
+        Transaction.objects.filter(user=self.user).delete()
+
+        upload = SimpleUploadedFile('transactions.csv', body.encode())
+        response = self.client.post('/api/transactions/import/', {'file': upload}, format='multipart')
+
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            set(Transaction.objects.filter(user=self.user).values_list('amount', 'category_id', 'date')),
+            {(Decimal('12.50'), self.food.id, aware(2024, 1, 5, 12, 30)), (Decimal('1000.00'), None, aware(2024, 1, 31))}
+        )
+
+    def test_rejects_unknown_output_and_bad_filters(self):
+        self.assertEqual(self.client.get('/api/transactions/export/', {'output': 'xml'}).status_code, 400)
+        self.assertEqual(self.client.get('/api/transactions/export/', {'end_date': 'soon'}).status_code, 400)
+
+
+class TransactionBatchTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        self.first = self.add_transaction(aware(2024, 5, 1), '10.00', category=self.food)
+        self.second = self.add_transaction(aware(2024, 5, 2), '20.00')
+        self.foreign = self.add_transaction(aware(2024, 5, 3), '30.00', user=self.other_user)
+
+    def send(self, operations):
+        response = self.client.post('/api/transactions/batch/', {'operations': operations}, format='json')
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data['results']
+
+    def test_applies_creates_updates_and_deletes_together(self):
+        results = self.send([
+            {'op': 'create', 'ref': 'tmp-1', 'data': {
+                'user': self.user.id, 'type': 'Income', 'amount': '99.00', 'date': '2024-05-10T09:00:00Z'
+            }},
+            {'op': 'update', 'id': self.first.id, 'data': {'amount': '15.00', 'description': 'Edited'}},
+            {'op': 'delete', 'id': self.second.id},
+        ])
+
+        self.assertEqual([(r['index'], r['status']) for r in results], [(0, 201), (1, 200), (2, 204)])
+        self.assertEqual(results[0]['ref'], 'tmp-1')
+        created = Transaction.objects.get(pk=results[0]['id'])
+        self.assertEqual((created.user, created.amount), (self.user, Decimal('99.00')))
+        self.assertEqual(results[1]['data']['amount'], '15.00')
+        self.assertEqual(results[1]['data']['category_name'], 'Food')
+
+        self.first.refresh_from_db()
+        self.assertEqual((self.first.amount, self.first.description), (Decimal('15.00'), 'Edited'))
+        self.assertGreater(self.first.updated_at, self.first.created_at)
+        self.assertFalse(Transaction.objects.filter(pk=self.second.pk).exists())
+        self.assertEqual(self.rollup_totals(), {
+            ('2024-05', 'Expense', self.food.id): (Decimal('15.00'), 1),
+            ('2024-05', 'Income', None): (Decimal('99.00'), 1),
+        })
+
+    def test_reports_invalid_operations_and_applies_the_rest(self):
+        results = self.send([
+            {'op': 'create', 'data': {'user': self.user.id, 'type': 'Income', 'amount': '-1', 'date': '2024-05-10T09:00:00Z'}},
+            {'op': 'update', 'id': self.foreign.id, 'data': {'amount': '1.00'}},
+            {'op': 'delete', 'id': 999999},
+            {'op': 'rename'},
+            {'op': 'delete', 'id': self.first.id},
+            {'op': 'update', 'id': self.first.id, 'data': {'amount': '1.00'}},
+        ])
+
+        self.assertEqual([r['status'] for r in results], [400, 404, 404, 400, 204, 404])
+        self.assertIn('amount', results[0]['errors'])
+        self.assertEqual(Transaction.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(Transaction.objects.get(pk=self.foreign.pk).amount, Decimal('30.00'))
+
+    def test_ids_must_be_integers(self):
+        results = self.send([
+            {'op': 'delete', 'id': [self.first.id]},
+            {'op': 'delete', 'id': 'abc'},
+            {'op': 'update', 'id': {'pk': 1}, 'data': {'amount': '1.00'}},
+            {'op': 'delete'},
+            {'op': 'delete', 'id': 10 ** 30},
+            {'op': 'delete', 'id': str(self.second.id)},
+        ])
+
+        self.assertEqual([r['status'] for r in results], [400, 400, 400, 400, 400, 204])
+        self.assertIn('id', results[0]['errors'])
+        self.assertEqual(results[5]['id'], self.second.id)
+        self.assertFalse(Transaction.objects.filter(pk=self.second.pk).exists())
+
+    def test_a_batch_costs_a_constant_number_of_queries(self):
+        def operations(count):
+            return [
+                {'op': 'create', 'data': {'user': self.user.id, 'type': 'Expense', 'amount': '1.00',
+                                          'date': '2024-05-10T09:00:00Z', 'category': self.food.id}}
+                for _ in range(count)
+            ] + [{'op': 'update', 'id': self.first.id, 'data': {'amount': '2.00'}}]
+
+        self.send(operations(1))  # creates the user's DataVersion row
+        with CaptureQueriesContext(connection) as small:
+            self.send(operations(2))
+        with CaptureQueriesContext(connection) as large:
+            self.send(operations(40))
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
+    def test_rejects_malformed_bodies(self):
+        response = self.client.post('/api/transactions/batch/', {'operations': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+
+class FinancialDataETagTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_transaction(aware(2024, 6, 1), '10.00')
+
+    def get(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/financial-data/', {'month': '2024-06', **params}, **headers)
+
+    def test_unchanged_data_is_revalidated_with_one_query(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertTrue(first['ETag'].startswith('W/"'))
+
+        with self.assertNumQueries(0):
+            response = self.get(first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], first['ETag'])
+
+        dashboard_cache.get_cache().clear()
+        with self.assertNumQueries(1):
+            response = self.get(first['ETag'])
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(self.get('W/"stale", ' + first['ETag']).status_code, 304)
+
+    def test_etag_depends_on_query_parameters(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(etag, month='2024-05').status_code, 200)
+        self.assertEqual(self.get(etag, start='2024-01').status_code, 200)
+
+    def test_writes_change_the_etag(self):
+        writes = [
+            lambda: self.client.post('/api/transactions/', {
+                'user': self.user.id, 'type': 'Income', 'amount': '5.00', 'date': '2024-06-02T00:00:00Z'
+            }),
+            lambda: self.client.post('/api/monthly-budgets/', {
+                'user': self.user.id, 'month': '2024-06', 'total_budget_amount': '300.00'
+            }),
+            lambda: self.client.post('/api/categories/', {'name': 'Mine', 'type': 'Expense', 'user': self.user.id}),
+            lambda: self.client.post('/api/categories/', {'name': 'Shared', 'type': 'Expense'}),
+            lambda: self.client.post('/api/transactions/batch/', [{'op': 'delete', 'id': self.add_transaction(
+                aware(2024, 6, 3), '1.00').id}], format='json'),
+        ]
+        for write in writes:
+            etag = self.get()['ETag']
+            self.assertLess(write().status_code, 300)
+            self.assertEqual(self.get(etag).status_code, 200)
+
+    def test_other_users_writes_do_not_change_the_etag(self):
+        etag = self.get()['ETag']
+        self.add_transaction(aware(2024, 6, 1), '10.00', user=self.other_user)
+        versioning.bump(self.other_user.id)
+
+        self.assertEqual(self.get(etag).status_code, 304)
+
+
+class FinancialDataBatchTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        food = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        Category.objects.create(name='Shared', type=Category.INCOME)
+        self.add_transaction(aware(2023, 11, 30, 23, 59), '12.50', category=food)
+        self.add_transaction(aware(2023, 12, 1), '99.00', Transaction.INCOME)
+        self.add_transaction(aware(2024, 1, 5), '40.25', description='Groceries')
+        self.add_transaction(aware(2024, 1, 20), '3.10', category=food)
+        self.add_transaction(aware(2024, 3, 2), '8.00')
+        self.add_transaction(aware(2024, 1, 7), '500.00', user=self.other_user)
+        for month, amount in [('2023-10', '100.00'), ('2023-12', '150.00'), ('2024-02', '175.50')]:
+            MonthlyBudget.objects.create(user=self.user, month=month, total_budget_amount=Decimal(amount))
+
+    def get(self, etag=None, **params):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/api/financial-data/batch/', params, **headers)
+
+    def test_payloads_match_single_month_dashboards(self):
+        months = ['2023-11', '2023-12', '2024-01', '2024-03']
+
+        with self.assertNumQueries(5):
+            response = self.get(months='2024-03,2023-11,2024-01,2023-12')
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.data), months)
+        for month in months:
+            self.assertEqual(response.data[month], views.build_financial_data(self.user.id, month, None), month)
+
+    def test_range_costs_the_same_queries_as_one_month(self):
+        with self.assertNumQueries(5):
+            response = self.get(start='2023-05', end='2024-04')
+
+        self.assertEqual(len(response.data), 12)
+        self.assertEqual(response.data['2024-01']['budgets'], {'2023-12': 150.0})
+        self.assertEqual([entry['id'] for entry in response.data['2024-01']['transactions']],
+                         list(Transaction.objects.filter(user=self.user, date__month=1).values_list('id', flat=True)))
+        self.assertEqual(response.data['2023-05']['transactions'], [])
+
+    def test_shares_the_dashboard_cache(self):
+        self.client.get('/api/financial-data/', {'month': '2024-01'})
+
+        with self.assertNumQueries(5):
+            self.get(months='2024-01,2024-02')
+        with self.assertNumQueries(1):
+            response = self.get(months='2024-01,2024-02')
+        self.assertEqual(response.data['2024-02'], self.client.get('/api/financial-data/', {'month': '2024-02'}).data)
+
+        self.client.post('/api/transactions/', {
+            'user': self.user.id, 'type': 'Expense', 'amount': '1.00', 'date': '2024-02-03T00:00:00Z'
+        })
+        self.assertEqual(len(self.get(months='2024-02').data['2024-02']['transactions']), 1)
+
+    def test_unchanged_data_is_revalidated(self):
+        etag = self.get(months='2024-01')['ETag']
+
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get(etag, months='2024-01').status_code, 304)
+        self.assertEqual(self.get(etag, months='2024-02').status_code, 200)
+
+    def test_invalid_queries_are_rejected(self):
+        for params in [
+            {},
+            {'months': '2024-13'},
+            {'months': '2024-01,'},
+            {'months': '2024-01', 'start': '2024-01'},
+            {'start': '2024-01'},
+            {'start': '2024-05', 'end': '2024-01'},
+            {'start': '2020-01', 'end': '2024-01'},
+            {'months': ','.join(f'{year}-{month:02d}' for year in (2022, 2023, 2024) for month in range(1, 10))},
+        ]:
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn('error', response.data)
+
+
+class DeltaSyncTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.category = Category.objects.create(user=self.user, name='Food', type='Expense')
+        self.shared = Category.objects.create(name='Shared', type='Expense')
+        self.budget = MonthlyBudget.objects.create(user=self.user, month='2024-06', total_budget_amount=500)
+        self.transaction = self.add_transaction(aware(2024, 6, 1), '10.00')
+        self.in_category = self.add_transaction(aware(2024, 6, 2), '20.00', category=self.category)
+        self.add_transaction(aware(2024, 6, 1), '30.00', user=self.other_user)
+        versioning.bump(self.user.id, None)
+
+    def sync(self, cursor=None):
+        response = self.client.get('/api/sync/', {'since': cursor} if cursor else {})
+        self.assertEqual(response.status_code, 200, response.data)
+        return response.data
+
+    def backdate(self):
+        """Move everything written so far out of the cursor's overlap window."""
+        past = timezone.now() - timedelta(hours=1)
+        for model in (Category, MonthlyBudget, Transaction):
+            model.objects.update(updated_at=past)
+
+    def test_full_sync_then_nothing_until_a_write(self):
+        data = self.sync()
+        self.assertTrue(data['full'])
+        self.assertEqual([row['id'] for row in data['transactions']], [self.transaction.id, self.in_category.id])
+        self.assertEqual([row['id'] for row in data['monthly_budgets']], [self.budget.id])
+        self.assertEqual({row['id'] for row in data['categories']}, {self.category.id, self.shared.id})
+        self.assertEqual(data['categories'], CategorySerializer(
+            Category.objects.filter(pk__in=[row['id'] for row in data['categories']]).order_by('updated_at', 'id'),
+            many=True
+        ).data)
+
+        unchanged = self.sync(data['cursor'])
+        self.assertFalse(unchanged['full'])
+        self.assertEqual(unchanged['transactions'] + unchanged['monthly_budgets'] + unchanged['categories'], [])
+
+        self.add_transaction(aware(2024, 6, 5), '1.00', user=self.other_user)
+        versioning.bump(self.other_user.id)
+        self.assertEqual(self.sync(unchanged['cursor'])['transactions'], [])
+
+    def test_changes_and_deletes_since_the_cursor(self):
+        self.backdate()
+        cursor = self.sync()['cursor']
+        gone = self.add_transaction(aware(2024, 6, 3), '5.00')
+        self.backdate()
+        cursor = self.sync(cursor)['cursor']
+
+        self.assertEqual(self.client.put(f'/api/transactions/{self.transaction.id}/', {'amount': '11.00'}).status_code, 200)
+        self.assertEqual(self.client.delete(f'/api/transactions/{gone.id}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/monthly-budgets/{self.budget.id}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/categories/{self.category.id}/').status_code, 204)
+        self.assertEqual(self.client.delete(f'/api/categories/{self.shared.id}/').status_code, 204)
+
+        data = self.sync(cursor)
+        self.assertFalse(data['full'])
+        self.assertEqual({row['id']: row['category'] for row in data['transactions']},
+                         {self.transaction.id: None, self.in_category.id: None})
+        self.assertEqual(data['transactions'][0]['amount'], '11.00')
+        self.assertEqual(data['monthly_budgets'] + data['categories'], [])
+        self.assertEqual(data['deleted'], {
+            'transactions': [gone.id],
+            'monthly_budgets': [self.budget.id],
+            'categories': sorted([self.category.id, self.shared.id]),
+        })
+
+    def test_moving_a_row_to_another_user_deletes_it_for_its_owner(self):
+        self.backdate()
+        cursor = self.sync()['cursor']
+        response = self.client.put(f'/api/transactions/{self.transaction.id}/', {'user': self.other_user.id})
+        self.assertEqual(response.status_code, 200, response.data)
+
+        self.assertEqual(self.sync(cursor)['deleted']['transactions'], [self.transaction.id])
+        self.assertTrue(Tombstone.objects.filter(user=self.user, object_id=self.transaction.id).exists())
+
+    def test_invalid_and_expired_cursors(self):
+        response = self.client.get('/api/sync/', {'since': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.data, {'error': 'Invalid cursor'})
+
+        expired = sync.encode_cursor(timezone.now() - timedelta(days=settings.SYNC['TOMBSTONE_DAYS'] + 1),
+                                     versioning.current(self.user.id))
+        self.assertTrue(self.sync(expired)['full'])
+
+    def test_prune_removes_expired_tombstones(self):
+        sync.record_deleted(Tombstone.TRANSACTION, self.user.id, [1, 2])
+        Tombstone.objects.filter(object_id=1).update(deleted_at=timezone.now() - timedelta(days=365))
+        out = StringIO()
+        call_command('prune_tombstones', stdout=out)
+        self.assertIn('Tombstones pruned: 1', out.getvalue())
+        self.assertEqual(list(Tombstone.objects.values_list('object_id', flat=True)), [2])
+
+
+
+class AsyncFinancialDataTests(TransactionTestCase):
+    """The async view reads through other threads' connections, so the rows have to be committed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='owner@example.com', password='s3cret-pass', first_name='Owner', last_name='User'
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        dashboard_cache.get_cache().clear()
+        category = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        MonthlyBudget.objects.create(user=self.user, month='2024-06', total_budget_amount=Decimal('500.00'))
+        for day, amount in ((3, '12.50'), (9, '30.00')):
+            self.add_transaction(aware(2024, 6, day), amount, category=category)
+
+    def add_transaction(self, when, amount, **extra):
+        created = Transaction.objects.create(
+            user=self.user, type=Transaction.EXPENSE, amount=Decimal(amount), date=when, **extra
+        )
+        rollups.record_created([created])
+        return created
+
+    def get(self, path, **params):
+        dashboard_cache.get_cache().clear()
+        return self.client.get(path, {'month': '2024-06', **params})
+
+    def test_matches_the_sync_view(self):
+        for params in ({}, {'start': '2024-01', 'end': '2024-06'}):
+            expected = self.get('/api/financial-data/', **params)
+            with mock.patch.object(async_views, 'run_concurrently', wraps=async_views.run_concurrently) as pooled:
+                response = self.get('/api/financial-data/async/', **params)
+            pooled.assert_called_once()
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.content, expected.content)
+            self.assertEqual(response['ETag'], expected['ETag'])
+            self.assertEqual(len(response.json()['transactions']), 2)
+
+        first = self.get('/api/financial-data/async/')
+        self.assertEqual(first['X-Cache'], 'MISS')
+        second = self.client.get('/api/financial-data/async/', {'month': '2024-06'})
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.content, first.content)
+        revalidated = self.client.get('/api/financial-data/async/', {'month': '2024-06'},
+                                      HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(revalidated.status_code, 304)
+
+    def test_errors_match_the_sync_view(self):
+        anonymous = APIClient()
+        for client, params in ((anonymous, {'month': '2024-06'}), (self.client, {'month': 'June'}),
+                               (self.client, {'month': '2024-06', 'start': '2024-09'})):
+            expected = client.get('/api/financial-data/', params)
+            response = client.get('/api/financial-data/async/', params)
+            self.assertEqual((response.status_code, response.json()), (expected.status_code, expected.json()))
+        self.assertEqual(self.client.post('/api/financial-data/async/').status_code, 405)
+
+    def test_reads_run_concurrently(self):
+        barrier = threading.Barrier(4, timeout=5)
+
+        def read(key):
+            barrier.wait()  # Breaks unless all four reads are running at once.
+            return key
+
+        parts = [(key, read, (key,)) for key in ('budgets', 'transactions', 'categories', 'monthlyData')]
+        with mock.patch.object(views, 'dashboard_parts', return_value=parts):
+            response = self.get('/api/financial-data/async/')
+        self.assertEqual(response.json(), {key: key for key, _, _ in parts})
+
+    def test_pool_queries_are_counted_with_the_request(self):
+        expected = self.get('/api/financial-data/')['Server-Timing']
+        timing = self.get('/api/financial-data/async/')['Server-Timing']
+        self.assertEqual(timing.split(';desc=')[1].split(',')[0], expected.split(';desc=')[1].split(',')[0])
+
+    def test_reads_inside_a_transaction_stay_on_the_request_thread(self):
+        with transaction.atomic():
+            uncommitted = self.add_transaction(aware(2024, 6, 20), '7.00')
+            with mock.patch.object(async_views, 'run_concurrently') as pooled:
+                response = self.get('/api/financial-data/async/')
+            pooled.assert_not_called()
+            self.assertIn(uncommitted.id, [row['id'] for row in response.json()['transactions']])
+            transaction.set_rollback(True)
+
+
+class DashboardCacheTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_transaction(aware(2024, 3, 10), '25.00')
+
+    def get(self, month, user=None):
+        params = {'month': month}
+        if user:
+            params['user_id'] = user.id
+        return self.client.get('/api/financial-data/', params)
+
+    def warm(self, *months):
+        for month in months:
+            self.assertEqual(self.get(month)['X-Cache'], 'MISS')
+
+    def cached(self, month):
+        return self.get(month)['X-Cache'] == 'HIT'
+
+    def test_repeated_dashboards_are_served_without_queries(self):
+        first = self.get('2024-03')
+        self.assertEqual(first['X-Cache'], 'MISS')
+
+        with self.assertNumQueries(0):
+            second = self.get('2024-03')
+        self.assertEqual(second['X-Cache'], 'HIT')
+        self.assertEqual(second.data, first.data)
+        self.assertEqual(second['ETag'], first['ETag'])
+
+        self.assertEqual(self.get('2024-03', user=self.user)['X-Cache'], 'HIT')
+        self.assertNotIn('X-Cache', self.client.get('/api/financial-data/', {'month': '2024-03', 'start': '2024-01'}))
+
+    def test_transaction_writes_invalidate_that_month_and_the_rest_of_its_year(self):
+        self.warm('2024-02', '2024-03', '2024-12', '2025-01')
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/transactions/', {
+                'user': self.user.id, 'type': 'Expense', 'amount': '5.00', 'date': '2024-03-12T00:00:00Z'
+            })
+        self.assertEqual(response.status_code, 201)
+
+        self.assertTrue(self.cached('2024-02'))
+        self.assertEqual(self.get('2024-03').data['monthlyData'][-1], {'month': 'Mar', 'income': 0.0, 'expenses': 30.0})
+        self.assertFalse(self.cached('2024-12'))
+        self.assertTrue(self.cached('2025-01'))
+
+        self.warm('2024-06')
+        self.client.put(f"/api/transactions/{response.data['id']}/", {'date': '2023-11-01T00:00:00Z'})
+        self.assertEqual(self.get('2024-06').data['monthlyData'][2]['expenses'], 25.0)
+
+    def test_budget_writes_invalidate_the_three_months_that_show_them(self):
+        self.warm('2024-02', '2024-03', '2024-05', '2024-06')
+        response = self.client.post('/api/monthly-budgets/', {
+            'user': self.user.id, 'month': '2024-03', 'total_budget_amount': '300.00'
+        })
+        self.assertEqual(response.status_code, 201)
+
+        self.assertTrue(self.cached('2024-02'))
+        self.assertEqual(self.get('2024-05').data['budgets'], {'2024-03': 300.0})
+        self.assertTrue(self.cached('2024-06'))
+
+    def test_category_writes_invalidate_every_month(self):
+        self.warm('2024-01', '2024-07')
+        self.client.post('/api/categories/', {'name': 'Shared', 'type': 'Expense'})
+
+        self.assertIn('Shared', [category['name'] for category in self.get('2024-01').data['categories']])
+        self.assertFalse(self.cached('2024-07'))
+
+    def test_other_users_writes_keep_entries(self):
+        self.warm('2024-03')
+        self.client.force_authenticate(self.other_user)
+        self.client.post('/api/transactions/', {
+            'user': self.other_user.id, 'type': 'Expense', 'amount': '5.00', 'date': '2024-03-12T00:00:00Z'
+        })
+        self.client.force_authenticate(self.user)
+
+        self.assertTrue(self.cached('2024-03'))
+
+    def test_entries_filled_during_a_write_are_discarded_on_commit(self):
+        entry, generations = dashboard_cache.lookup(self.user.id, '2024-03')
+        self.assertIsNone(entry)
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard_cache.transactions_changed([rollups.snapshot(self.add_transaction(aware(2024, 3, 1), '1.00'))])
+            stale_generations = dashboard_cache.lookup(self.user.id, '2024-03')[1]
+            dashboard_cache.store(self.user.id, '2024-03', stale_generations, data={}, versions=(0, 0))
+
+        self.assertNotEqual(stale_generations, generations)
+        self.assertIsNone(dashboard_cache.lookup(self.user.id, '2024-03')[0])
+
+    @override_settings(CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+        'dashboard': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'dashboard-lru-test',
+            'OPTIONS': {'MAX_ENTRIES': 8, 'CULL_FREQUENCY': 8},
+        },
+    })
+    def test_least_recently_used_entries_are_evicted(self):
+        # Each month adds one entry and one month token next to the shared account tokens.
+        self.warm('2024-01', '2024-02', '2024-03')
+        self.assertTrue(self.cached('2024-01'))
+        self.warm('2024-04')
+
+        self.assertTrue(self.cached('2024-01'))
+        self.assertFalse(self.cached('2024-02'))
+
+    def test_hit_and_miss_counters(self):
+        self.warm('2024-03')
+        self.get('2024-03')
+        self.get('2024-03')
+
+        self.client.force_authenticate(User.objects.create_superuser(email='admin@example.com', password='x'))
+        response = self.client.get('/api/financial-data/cache-stats/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.data['hits'], response.data['misses']), (2, 1))
+        self.assertAlmostEqual(response.data['hit_ratio'], 2 / 3, places=3)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get('/api/financial-data/cache-stats/').status_code, 403)
+
+    def test_production_mode_requires_a_shared_cache(self):
+        self.assertEqual(checks.dashboard_cache_is_shared(None), [])
+        with override_settings(PRODUCTION_DATABASE=True):
+            self.assertEqual([error.id for error in checks.dashboard_cache_is_shared(None)], ['budget.E001'])
+            shared = {'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': '/tmp/dashboard'}
+            with override_settings(CACHES={**settings.CACHES, settings.DASHBOARD_CACHE_ALIAS: shared}):
+                self.assertEqual(checks.dashboard_cache_is_shared(None), [])
+
+
+class ListSerializationTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.food = Category.objects.create(user=self.user, name='Food', type='Expense', color=None)
+        Category.objects.create(name='Salary', type='Income', icon=None, color='#00FF00')
+        for day in range(1, 16):
+            self.add_transaction(
+                aware(2024, 2, day, 13, 45, 30, 120), f'{day}.5', category=self.food if day % 2 else None,
+                description=f'Lunch {day}' if day % 3 else None,
+            )
+
+    def assertRendersLike(self, response, expected):
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, JSONRenderer().render(expected))
+
+    @override_settings(TIME_ZONE='Asia/Kolkata')
+    def test_transaction_list_is_byte_identical_to_the_serializer(self):
+        response = self.client.get('/api/transactions/', {'user': self.user.id, 'page_size': 100})
+
+        rows = Transaction.objects.filter(user=self.user).order_by('-date')
+        self.assertRendersLike(response, {
+            'count': 15, 'next': None, 'previous': None,
+            'results': TransactionSerializer(rows, many=True).data,
+        })
+        self.assertIn('+05:30', response.data['results'][0]['date'])
+
+    def test_category_list_is_byte_identical_to_the_serializer(self):
+        response = self.client.get('/api/categories/')
+
+        rows = Category.objects.filter(Q(user=self.user) | Q(user__isnull=True))
+        self.assertRendersLike(response, {
+            'count': 2, 'next': None, 'previous': None,
+            'results': CategorySerializer(rows, many=True).data,
+        })
+
+    def test_list_pages_cost_a_constant_number_of_queries(self):
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/transactions/', {'user': self.user.id, 'page_size': 100})
+        self.assertEqual(response.data['results'][0]['category_name'], 'Food')
+
+        with self.assertNumQueries(1):
+            self.client.get('/api/transactions/', {'user': self.user.id, 'pagination': 'cursor', 'page_size': 100})
+
+    def test_benchmark_command_checks_both_paths_agree(self):
+        out = StringIO()
+        with mock.patch('budget.management.commands.benchmark.connection') as db:
+            call_command('benchmark', 'list-serialization', '--repeat', '1', stdout=out)
+        db.creation.create_test_db.assert_called_once()
+        self.assertIn('values() rows', out.getvalue())
+
+
+class FastJSONTests(BudgetTestCase):
+
+    def test_renders_exactly_like_drf(self):
+        data = {
+            'amount': Decimal('12.30'), 'when': timezone.now(), 'day': datetime(2024, 6, 1).date(),
+            'local': timezone.localtime(timezone.now(), timezone.get_fixed_timezone(330)),
+            'text': 'Café \u2028 "quoted"', 'huge': 2 ** 70, 'pairs': ((1, 2.5), [None, True]), 'empty': {},
+        }
+        expected = JSONRenderer().render(data)
+        self.assertEqual(fast_json.JSONRenderer().render(data), expected)
+        with mock.patch.object(fast_json, 'orjson', None):
+            self.assertEqual(fast_json.JSONRenderer().render(data), expected)
+
+        self.add_transaction(aware(2024, 6, 1), '10.50', description='Lunch')
+        response = self.client.get('/api/financial-data/', {'month': '2024-06'})
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def test_parses_exactly_like_drf(self):
+        def parse(parser, body):
+            try:
+                return parser.parse(io.BytesIO(body), parser_context={'encoding': 'utf-8'})
+            except Exception as exc:
+                return repr(exc)
+
+        for body in (b'{"a": [1, 2.5, "x\\u00e9"]}', b'{"id": 123456789012345678901234567890}',
+                     b'{"n": NaN}', b'{bad', b''):
+            self.assertEqual(parse(fast_json.JSONParser(), body), parse(JSONParser(), body))
+
+        response = self.client.post('/api/transactions/batch/', [{'op': 'delete', 'id': 987654}], format='json')
+        self.assertEqual(response.data['results'][0]['status'], 404)
+
+
+@override_settings(RESPONSE_COMPRESSION={'ENABLED': True, 'MIN_SIZE': 1024, 'BROTLI_QUALITY': 5})
+class CompressionMiddlewareTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for day in range(1, 29):
+            self.add_transaction(aware(2024, 6, day), '10.00', description=f'Groceries {day}')
+
+    def test_large_responses_are_compressed_when_accepted(self):
+        url = f'/api/transactions/?user={self.user.id}&page_size=100'
+        plain = self.client.get(url)
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertIn('Accept-Encoding', plain['Vary'])
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(int(response['Content-Length']), len(response.content))
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+        self.assertNotIn('Content-Encoding', self.client.get(url, HTTP_ACCEPT_ENCODING='gzip;q=0, identity'))
+        self.assertEqual(self.client.get(url, HTTP_ACCEPT_ENCODING='*')['Content-Encoding'], 'gzip')
+
+    def test_small_responses_are_sent_as_they_are(self):
+        response = self.client.get(f'/api/transactions/?user={self.user.id}&page_size=1', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_exports_are_compressed_while_streaming(self):
+        plain = b''.join(self.client.get('/api/transactions/export/').streaming_content)
+        response = self.client.get('/api/transactions/export/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(b''.join(response.streaming_content)), plain)
+
+    def test_brotli_is_preferred_unless_the_client_says_otherwise(self):
+        with mock.patch.object(compression, 'brotli', object()):
+            self.assertEqual(compression.negotiate('gzip, deflate, br'), 'br')
+            self.assertEqual(compression.negotiate('br;q=0.5, gzip'), 'gzip')
+        self.assertEqual(compression.negotiate('gzip, br'), 'gzip')
+        self.assertIsNone(compression.negotiate('br'))
+        self.assertIsNone(compression.negotiate(''))
+
+
+class QueryTimingMiddlewareTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.add_transaction(aware(2024, 3, 10), '25.00')
+
+    def server_timing(self, response):
+        return dict(
+            (metric.split(';')[0], metric) for metric in response['Server-Timing'].split(', ')
+        )
+
+    def test_reports_query_count_and_durations(self):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/api/financial-data/', {'month': '2024-03'})
+
+        timing = self.server_timing(response)
+        self.assertEqual(set(timing), {'sql', 'view', 'total'})
+        self.assertIn(f'desc="{len(ctx.captured_queries)} queries"', timing['sql'])
+        self.assertRegex(timing['total'], r'^total;dur=\d+\.\d\d$')
+
+    @override_settings(REQUEST_TIMING={'ENABLED': True, 'SLOW_REQUEST_MS': 10_000, 'SLOW_REQUEST_QUERIES': 2})
+    def test_slow_requests_are_logged_with_query_plans(self):
+        with self.assertLogs('BudgetTracker.slow_requests', 'WARNING') as logs:
+            self.client.get('/api/financial-data/', {'month': '2024-03'})
+
+        entry = logs.output[0]
+        self.assertIn('GET /api/financial-data/?month=2024-03 -> 200', entry)
+        self.assertIn('budget_transaction', entry)
+        self.assertIn('SEARCH', entry)
+
+    def test_is_removed_when_disabled(self):
+        from django.core.exceptions import MiddlewareNotUsed
+        from BudgetTracker.middleware import QueryTimingMiddleware
+
+        with override_settings(REQUEST_TIMING={'ENABLED': False}):
+            with self.assertRaises(MiddlewareNotUsed):
+                QueryTimingMiddleware(lambda request: None)
+            self.assertNotIn('Server-Timing', self.client.get('/api/financial-data/', {'month': '2024-03'}))
+
+
+class MetricsEndpointTests(BudgetTestCase):
+
+    def setUp(self):
+        super().setUp()
+        metrics.registry.reset()
+
+    def scrape(self, **headers):
+        response = self.client.get('/metrics', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain; version=0.0.4'))
+        return response.content.decode().splitlines()
+
+    def test_reports_requests_latency_queries_and_cache_ratio_by_url_name(self):
+        self.client.get('/api/financial-data/', {'month': '2024-03'})
+        self.client.get('/api/financial-data/', {'month': '2024-03'})
+        self.client.get('/api/transactions/', {'user': self.user.id})
+
+        lines = self.scrape()
+        self.assertIn('budget_http_requests_total{method="GET",status="200",view="get_financial_data"} 2', lines)
+        self.assertIn('budget_http_requests_total{method="GET",status="200",view="transaction-list-create"} 1', lines)
+        self.assertIn('budget_http_request_duration_seconds_count{view="get_financial_data"} 2', lines)
+        self.assertIn('budget_http_request_duration_seconds_bucket{view="get_financial_data",le="+Inf"} 2', lines)
+        self.assertIn('budget_db_queries_per_request_bucket{view="get_financial_data",le="0.0"} 1', lines)
+        self.assertIn('budget_cache_hit_ratio{cache="dashboard"} 0.5', lines)
+        self.assertIn('# TYPE budget_http_request_duration_seconds histogram', lines)
+
+    def test_server_errors_are_counted(self):
+        with mock.patch('budget.views.dashboard_cache.lookup', side_effect=RuntimeError('boom')):
+            client = APIClient(raise_request_exception=False)
+            client.force_authenticate(self.user)
+            self.assertEqual(client.get('/api/financial-data/', {'month': '2024-03'}).status_code, 500)
+
+        self.assertIn('budget_http_request_errors_total{view="get_financial_data"} 1', self.scrape())
+
+    def test_files_of_all_worker_processes_are_added_up(self):
+        with tempfile.TemporaryDirectory() as directory, override_settings(METRICS_DIR=directory):
+            with open(os.path.join(directory, 'metrics-1-other.json'), 'w') as handle:
+                json.dump({
+                    'counters': [['budget_http_requests_total', [['method', 'POST'], ['status', '200'], ['view', 'login']], 3]],
+                    'histograms': [],
+                }, handle)
+            self.client.post('/api/auth/login/', {'email': 'owner@example.com', 'password': 's3cret-pass'})
+
+            lines = self.scrape()
+            self.assertIn('budget_http_requests_total{method="POST",status="200",view="login"} 4', lines)
+            self.assertEqual(len([name for name in os.listdir(directory) if name.endswith('.json')]), 2)
+
+    @override_settings(METRICS_TOKEN='scrape-secret')
+    def test_can_require_a_bearer_token(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 403)
+        self.scrape(HTTP_AUTHORIZATION='Bearer scrape-secret')
+
+
+class SeedDataTests(BudgetTestCase):
+
+    def seed(self, *extra):
+        out = StringIO()
+        call_command(
+            'seed_data', '--users', '2', '--transactions-per-user', '40', '--months', '3',
+            '--end-month', '2024-03', '--seed', '7', '--batch-size', '15', *extra, stdout=out
+        )
+        return out.getvalue()
+
+    def snapshot(self):
+        return list(Transaction.objects.filter(user__in=seeding.seeded_users()).order_by(
+            'user__email', 'date', 'amount'
+        ).values_list('user__email', 'type', 'amount', 'category__name', 'date', 'description'))
+
+    def test_generates_deterministic_consistent_data(self):
+        self.assertIn('Seeded 2 users, 12 categories', self.seed())
+        first = self.snapshot()
+        self.assertEqual(len(first), 80)
+        self.assertEqual({row[4].strftime('%Y-%m') for row in first}, {'2024-01', '2024-02', '2024-03'})
+
+        user = seeding.seeded_users().order_by('email').first()
+        self.assertTrue(user.check_password(seeding.PASSWORD))
+        self.assertEqual(rollups.rebuild(), {'created': 0, 'updated': 0, 'deleted': 0})
+        merchant = Transaction.objects.filter(user=user, description__isnull=False).first().description.split()[0]
+        self.assertTrue(search.ranked_ids(merchant, user.pk, 5))
+
+        self.seed('--clear')
+        self.assertEqual(self.snapshot(), first)
+
+    def test_repeated_runs_add_new_users(self):
+        self.seed()
+        self.seed()
+        self.assertEqual(
+            list(seeding.seeded_users().order_by('email').values_list('email', flat=True)),
+            [f'seed-00000{n}@example.com' for n in range(1, 5)]
+        )
+
+
+class EndpointBenchmarkTests(BudgetTestCase):
+
+    def test_every_url_has_a_case_and_succeeds(self):
+        out = StringIO()
+        with mock.patch('budget.management.commands.benchmark.connection'):
+            call_command('benchmark', 'endpoints', '--repeat', '1', '--sizes', '30', stdout=out)
+
+        for endpoint in benchmarks.ENDPOINTS:
+            self.assertIn(endpoint.label, out.getvalue())
+        self.assertLessEqual(benchmarks.url_names(), {endpoint.url_name for endpoint in benchmarks.ENDPOINTS})
+
+    def test_flags_slower_p95_and_extra_queries_against_the_baseline(self):
+        baseline = {'1000': {
+            'a': {'p50': 1, 'p95': 10.0, 'p99': 12, 'queries': 3},
+            'b': {'p50': 1, 'p95': 1.0, 'p99': 1, 'queries': 1},
+        }}
+        results = {'1000': {
+            'a': {'p50': 1, 'p95': 13.0, 'p99': 14, 'queries': 4},
+            'b': {'p50': 1, 'p95': 1.9, 'p99': 2, 'queries': 1},
+            'c': {'p50': 1, 'p95': 99.0, 'p99': 99, 'queries': 9},
+        }}
+
+        self.assertEqual(benchmarks.compare_to_baseline(results, baseline, 0.2), [
+            benchmarks.Regression('a @ 1000', 'p95 10.00 -> 13.00 ms'),
+            benchmarks.Regression('a @ 1000', 'queries 3 -> 4'),
+        ])
+
+
+class BenchmarkCommandTests(TransactionTestCase):
+    """money-storage creates a scratch table, which SQLite cannot do inside TestCase's transaction."""
+
+    def test_benchmarks_run_together(self):
+        out = StringIO()
+        with mock.patch('budget.management.commands.benchmark.connection'):
+            call_command('benchmark', 'money-storage', 'endpoints', '--repeat', '1', '--sizes', '30', stdout=out)
+
+        self.assertIn('totals by type, 30 transactions', out.getvalue())
+        self.assertIn('financial data batch GET 12 months cold', out.getvalue())
+        self.assertFalse(Transaction.objects.exists())
+
+
+class LoadGeneratorTests(LiveServerTestCase):
+    """
+    Runs on a SQLite file rather than the in-memory test database. The live
+    server shares an in-memory database between its threads as one
+    connection, where the transactions of concurrent clients would interleave;
+    with a file each request thread has its own connection, as in production.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        cls.directory = tempfile.TemporaryDirectory()
+        cls.test_database = (connections.settings[DEFAULT_DB_ALIAS], connections[DEFAULT_DB_ALIAS])
+        connections.settings[DEFAULT_DB_ALIAS] = {
+            **cls.test_database[0], 'NAME': os.path.join(cls.directory.name, 'loadgen.sqlite3')
+        }
+        connections[DEFAULT_DB_ALIAS] = connections.create_connection(DEFAULT_DB_ALIAS)
+        call_command('migrate', verbosity=0)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        try:
+            super().tearDownClass()
+        finally:
+            connections[DEFAULT_DB_ALIAS].close()
+            connections.settings[DEFAULT_DB_ALIAS], connections[DEFAULT_DB_ALIAS] = cls.test_database
+            cls.directory.cleanup()
+
+    def test_replays_the_mix_over_reused_connections(self):
+        seeding.seed(users=2, transactions_per_user=60, months=2, end_month='2024-02', batch_size=50)
+        config = loadgen.configure([
+            '--url', self.live_server_url, '--seeded-users', '3', '--concurrency', '2',
+            '--warmup', '0', '--duration', '30', '--requests', '40', '--months', '2', '--end-month', '2024-02',
+            '--page-size', '10', '--mix', 'dashboard=1,list=1,search=1,write=1',
+        ])
+        output = []
+        report, = asyncio.run(loadgen.run(config, output=output.append))
+
+        self.assertIn('login failed for seed-000003@example.com: HTTP 400', output)
+        # --requests counts operations; a list scroll may request several pages.
+        self.assertGreaterEqual(report['total']['requests'], 40)
+        self.assertEqual(report['total']['errors'], 0, report)
+        self.assertEqual(set(report['operations']), set(loadgen.OPERATIONS))
+        self.assertLessEqual(report['connects'], 2 * 2)
+        self.assertEqual(
+            Transaction.objects.filter(description__startswith='loadgen').count(),
+            report['operations']['write']['requests']
+        )
+
+    def test_parses_the_mix(self):
+        self.assertEqual(loadgen.parse_mix('dashboard=3,write=1'), {'dashboard': 3.0, 'write': 1.0})
+        for value in ('upload=1', 'write=x', 'write=-1', 'write=0'):
+            with self.assertRaises(argparse.ArgumentTypeError):
+                loadgen.parse_mix(value)
+
+
+class SQLiteProductionModeTests(TransactionTestCase):
+    """write_attempts() only retries outside an enclosing transaction, which TestCase would add."""
+
+    def database_file(self, **overrides):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(
+            SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS, REQUEST_TIMING={'ENABLED': False}, **overrides
+        )
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        return benchmarks.sqlite_file_database(os.path.join(directory.name, 'budget.sqlite3'))
+
+    def test_new_connections_get_the_pragmas(self):
+        with self.database_file() as alias:
+            with connections[alias].cursor() as cursor:
+                values = {}
+                for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    values[pragma] = cursor.fetchone()[0]
+        self.assertEqual(values, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2})
+
+    def test_concurrent_writers_have_no_lock_failures(self):
+        with self.database_file() as alias:
+            result = benchmarks.write_contention(alias, threads=8, writes=10)
+            self.assertEqual((result['failures'], result['rows']), (0, 80), result['errors'])
+            self.assertEqual(
+                TransactionRollup.objects.using(alias).aggregate(count=Sum('count'))['count'], 80
+            )
+
+    def run_attempts(self, error, **kwargs):
+        calls = []
+        for attempt in database.write_attempts(**kwargs):
+            with attempt:
+                calls.append(attempt)
+                if len(calls) < 3:
+                    raise error
+                Category.objects.create(name=f'Written on attempt {len(calls)}', type=Category.EXPENSE)
+        return len(calls)
+
+    def test_locked_writes_are_rolled_back_and_retried(self):
+        self.assertEqual(self.run_attempts(OperationalError('database is locked')), 3)
+        self.assertEqual(list(Category.objects.values_list('name', flat=True)), ['Written on attempt 3'])
+
+    def test_other_errors_nested_blocks_and_the_last_attempt_raise(self):
+        with self.assertRaisesMessage(OperationalError, 'no such table'):
+            self.run_attempts(OperationalError('no such table: budget_category'))
+        with self.assertRaisesMessage(OperationalError, 'locked'):
+            self.run_attempts(OperationalError('database is locked'), attempts=2)
+        with transaction.atomic(), self.assertRaisesMessage(OperationalError, 'locked'):
+            self.run_attempts(OperationalError('database is locked'))
+        self.assertFalse(Category.objects.exists())
+
+
+@override_settings(GROUP_COMMIT=dict(settings.GROUP_COMMIT, ENABLED=True))
+class GroupCommitTests(TransactionTestCase):
+    """The writer thread commits through its own connection, so the rows have to be committed."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            email='owner@example.com', password='s3cret-pass', first_name='Owner', last_name='User'
+        )
+        self.category = Category.objects.create(user=self.user, name='Food', type=Category.EXPENSE)
+        self.addCleanup(group_commit.stop)
+        metrics.registry.reset()
+
+    def new_transaction(self, amount, **extra):
+        return Transaction(
+            user=self.user, type=Transaction.EXPENSE, amount=Decimal(amount), date=aware(2024, 6, 3), **extra
+        )
+
+    def test_creates_go_through_the_writer(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/transactions/', {
+            'user': self.user.id, 'type': 'Expense', 'amount': '12.50', 'date': '2024-06-03T10:00:00Z',
+            'category': self.category.id,
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertEqual(response.data['id'], Transaction.objects.get().id)
+        self.assertEqual(Transaction.objects.get().amount, Decimal('12.50'))
+        self.assertEqual(TransactionRollup.objects.get().total, Decimal('12.50'))
+        self.assertIn('default', group_commit._writers)
+
+    def test_concurrent_creates_share_commits(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with override_settings(SQLITE_PRAGMAS=settings.SQLITE_PRODUCTION_PRAGMAS, REQUEST_TIMING={'ENABLED': False}):
+            with benchmarks.sqlite_file_database(os.path.join(directory.name, 'budget.sqlite3')) as alias:
+                result = benchmarks.write_contention(alias, threads=8, writes=10)
+                self.assertEqual((result['failures'], result['rows']), (0, 80), result['errors'])
+                self.assertEqual(
+                    TransactionRollup.objects.using(alias).aggregate(count=Sum('count'))['count'], 80
+                )
+        batches, = [data for name, _, data in metrics.registry.snapshot()['histograms']
+                    if name == 'budget_group_commit_batch_size']
+        self.assertEqual(batches['sum'], 80)
+        self.assertLessEqual(batches['count'], 80)
+
+    def test_a_failing_row_only_fails_its_own_request(self):
+        writer = group_commit.get_writer('default')
+        good = writer.submit(self.new_transaction('10.00', category=self.category))
+        bad = writer.submit(self.new_transaction('20.00', category_id=self.category.id + 1000))
+        self.assertEqual(good.result().amount, Decimal('10.00'))
+        with self.assertRaises(IntegrityError):
+            bad.result()
+        self.assertEqual(list(Transaction.objects.values_list('amount', flat=True)), [Decimal('10.00')])
+
+    def test_creates_inside_a_transaction_are_written_inline(self):
+        with transaction.atomic():
+            created = group_commit.create(self.new_transaction('10.00'))
+            self.assertTrue(Transaction.objects.filter(pk=created.pk).exists())
+        self.assertEqual(group_commit._writers, {})
+
+
+class ReplicaRoutingTests(TransactionTestCase):
+    """A SQLite file stands in for the replica; refresh() copies the primary into it."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        connections.settings['replica'] = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            'replica': {'ENGINE': 'django.db.backends.sqlite3', 'NAME': os.path.join(directory.name, 'replica.sqlite3')},
+        })['replica']
+        self.addCleanup(connections.settings.__delitem__, 'replica')
+        self.addCleanup(connections.__delitem__, 'replica')
+        self.addCleanup(lambda: connections['replica'].close())
+        settings_override = override_settings(DATABASE_REPLICAS=['replica'])
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        replicas.get_cache().clear()
+        dashboard_cache.get_cache().clear()
+
+        self.user = User.objects.create_user(
+            email='owner@example.com', password='s3cret-pass', first_name='Owner', last_name='User'
+        )
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.create(user=self.user).key}')
+        self.add_transaction('10.00')
+        replicas.refresh('replica')
+
+    def add_transaction(self, amount):
+        created = Transaction.objects.create(
+            user=self.user, type=Transaction.EXPENSE, amount=Decimal(amount), date=aware(2024, 6, 3)
+        )
+        rollups.record_created([created])
+        return created
+
+    def listed_amounts(self):
+        return sorted(row['amount'] for row in self.client.get('/api/transactions/', {'user': self.user.id}).data['results'])
+
+    def test_reads_use_the_replica_until_the_user_writes(self):
+        self.add_transaction('20.00')  # Not on the replica yet.
+        self.assertEqual(self.listed_amounts(), ['10.00'])
+
+        response = self.client.post('/api/transactions/', {
+            'user': self.user.id, 'type': 'Expense', 'amount': '30.00', 'date': '2024-06-03T10:00:00Z'
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        self.assertTrue(replicas.is_pinned(self.user.id))
+        self.assertEqual(self.listed_amounts(), ['10.00', '20.00', '30.00'])
+
+        replicas.get_cache().clear()  # The pin expires.
+        self.assertEqual(self.listed_amounts(), ['10.00'])
+        call_command('refresh_replicas', stdout=StringIO())
+        self.assertEqual(self.listed_amounts(), ['10.00', '20.00', '30.00'])
+
+    def test_only_budget_reads_during_requests_are_routed(self):
+        router = replicas.ReplicaRouter()
+        self.assertIsNone(router.db_for_read(Transaction))
+        token = replicas.request_routing.set(replicas.RoutingState())
+        try:
+            self.assertEqual(router.db_for_read(Transaction), 'replica')
+            self.assertIsNone(router.db_for_read(User))
+            with transaction.atomic():
+                self.assertEqual(router.db_for_read(Transaction), DEFAULT_DB_ALIAS)
+            with override_settings(DATABASE_REPLICAS=[]):
+                self.assertIsNone(router.db_for_read(Transaction))
+        finally:
+            replicas.request_routing.reset(token)
+        replica_copy = Transaction.objects.using('replica').get()
+        self.assertEqual(router.db_for_write(Transaction, instance=replica_copy), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate('replica', 'budget'))
+
+    def test_refresh_replicas_needs_replicas(self):
+        with override_settings(DATABASE_REPLICAS=[]), self.assertRaisesMessage(CommandError, 'No replicas'):
+            call_command('refresh_replicas')
+        with self.assertRaisesMessage(CommandError, 'Not a replica: default'):
+            call_command('refresh_replicas', 'default')
+
+
+class ShardingTests(TransactionTestCase):
+    """Two SQLite files stand in for the shards; the users and tokens stay in the test database."""
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        for alias in ('shard0', 'shard1'):
+            self.enterContext(benchmarks.sqlite_file_database(os.path.join(directory.name, f'{alias}.sqlite3'), alias))
+        self.enterContext(override_settings(DATABASE_SHARDS=['shard0', 'shard1']))
+        dashboard_cache.get_cache().clear()
+        shards.prepare()
+
+        users = [
+            User.objects.create_user(email=f'user-{n}@example.com', first_name='Shard', last_name=f'User {n}')
+            for n in range(8)
+        ]
+        self.first = users[0]
+        self.second = next(user for user in users if shards.shard_for(user.pk) != shards.shard_for(self.first.pk))
+
+    def client_for(self, user):
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f'Token {Token.objects.get_or_create(user=user)[0].key}')
+        return client
+
+    def create_transaction(self, user, amount):
+        response = self.client_for(user).post('/api/transactions/', {
+            'user': user.id, 'type': 'Expense', 'amount': amount, 'date': '2024-06-03T10:00:00Z'
+        })
+        self.assertEqual(response.status_code, 201, response.data)
+        return response.data['id']
+
+    def test_each_users_data_lives_in_their_shard(self):
+        for user in (self.first, self.second):
+            self.assertTrue(User.objects.using(shards.shard_for(user.pk)).filter(pk=user.pk).exists())
+        first_id = self.create_transaction(self.first, '10.00')
+        second_id = self.create_transaction(self.second, '20.00')
+
+        ids = {}
+        for user, pk in ((self.first, first_id), (self.second, second_id)):
+            alias = shards.shard_for(user.pk)
+            ids[alias] = pk
+            self.assertEqual(list(Transaction.objects.using(alias).values_list('pk', flat=True)), [pk])
+            self.assertEqual(TransactionRollup.objects.using(alias).get().user_id, user.pk)
+        self.assertFalse(Transaction.objects.exists())
+        self.assertLess(ids['shard0'], shards.ID_BLOCK)
+        self.assertGreater(ids['shard1'], shards.ID_BLOCK)
+
+        response = self.client_for(self.second).get('/api/transactions/', {'user': self.second.id})
+        self.assertEqual([row['id'] for row in response.data['results']], [second_id])
+
+        alias = shards.shard_for(self.first.pk)
+        self.first.delete()
+        self.assertFalse(Transaction.objects.using(alias).exists())
+
+    def test_owners_cannot_move_rows_to_another_shard(self):
+        client = self.client_for(self.first)
+        pk = self.create_transaction(self.first, '10.00')
+        budget = client.post('/api/monthly-budgets/', {
+            'user': self.first.id, 'month': '2024-06', 'total_budget_amount': '300.00'
+        }).data['id']
+
+        for path in (f'/api/transactions/{pk}/', f'/api/monthly-budgets/{budget}/'):
+            response = client.put(path, {'user': self.second.id})
+            self.assertEqual(response.status_code, 400, path)
+            self.assertIn('error', response.data)
+        alias = shards.shard_for(self.first.pk)
+        self.assertEqual(Transaction.objects.using(alias).get(pk=pk).user_id, self.first.pk)
+        self.assertEqual(MonthlyBudget.objects.using(alias).get(pk=budget).user_id, self.first.pk)
+        self.assertEqual(client.put(f'/api/transactions/{pk}/', {'amount': '12.00'}).status_code, 200)
+
+    def test_exports_stream_from_the_users_shard(self):
+        for user in (self.first, self.second):
+            pk = self.create_transaction(user, '10.00')
+            response = self.client_for(user).get('/api/transactions/export/', {'output': 'ndjson'})
+            rows = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+            self.assertEqual([row['id'] for row in rows], [pk])
+
+    def test_global_categories_are_copied_to_every_shard(self):
+        client = self.client_for(self.second)
+        response = client.post('/api/categories/', {'name': 'Charity', 'type': 'Expense'})
+        self.assertEqual(response.status_code, 201, response.data)
+        pk = response.data['id']
+        self.assertEqual([Category.objects.using(alias).filter(pk=pk, user=None).count()
+                          for alias in ('shard0', 'shard1')], [1, 1])
+        self.assertEqual(client.put(f'/api/categories/{pk}/', {
+            'name': 'Charity', 'type': 'Expense', 'user': self.second.id
+        }).status_code, 400)
+
+        self.assertEqual(client.delete(f'/api/categories/{pk}/').status_code, 204)
+        self.assertFalse(any(Category.objects.using(alias).filter(pk=pk).exists() for alias in ('shard0', 'shard1')))
+        self.assertEqual([Tombstone.objects.using(alias).filter(object_id=pk, user=None).count()
+                          for alias in ('shard0', 'shard1')], [1, 1])
+
+    def test_commands_work_shard_by_shard(self):
+        self.create_transaction(self.first, '10.00')
+        self.create_transaction(self.second, '20.00')
+        for alias in ('shard0', 'shard1'):
+            TransactionRollup.objects.using(alias).all().delete()
+        out = StringIO()
+        call_command('rebuild_rollups', stdout=out)
+        self.assertIn('2 created', out.getvalue())
+        with override_settings(DATABASE_SHARDS=[]), self.assertRaisesMessage(CommandError, 'No shards'):
+            call_command('migrate_shards')
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('categories/', views.category_list_create, name='category-list-create'),
@@ -8,6 +8,14 @@ urlpatterns = [
     path('monthly-budgets/', views.monthly_budget_list_create, name='monthly-budget-list-create'),
     path('monthly-budgets/<int:pk>/', views.monthly_budget_detail, name='monthly-budget-detail'),
     path('transactions/', views.transaction_list_create, name='transaction-list-create'),
+    path('transactions/batch/', views.transaction_batch, name='transaction-batch'),
+    path('transactions/export/', views.transaction_export, name='transaction-export'),
+    path('transactions/import/', views.transaction_import, name='transaction-import'),
+    path('transactions/search/', views.transaction_search, name='transaction-search'),
     path('transactions/<int:pk>/', views.transaction_detail, name='transaction-detail'),
     path('financial-data/', views.get_financial_data, name='get_financial_data'),
+    path('financial-data/batch/', views.get_financial_data_batch, name='get_financial_data_batch'),
+    path('financial-data/async/', async_views.get_financial_data_async, name='get_financial_data_async'),
+    path('sync/', views.sync_changes, name='sync'),
+    path('financial-data/cache-stats/', views.financial_data_cache_stats, name='financial-data-cache-stats'),
 ]
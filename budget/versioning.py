@@ -0,0 +1,64 @@
+"""
+Per-user data versions for conditional GETs.
+
+Every write to a user's transactions, monthly budgets or categories bumps
+that user's DataVersion in the same database transaction. Writes to global
+categories (user=None) bump the global row. A dashboard response depends
+only on those two counters and its query parameters, so they are enough to
+build an ETag without running any of the dashboard's queries.
+"""
+import hashlib
+
+from django.db import IntegrityError, router, transaction
+from django.db.models import F, Q
+from django.utils.http import parse_etags
+
+from .models import DataVersion
+
+
+def bump(*user_ids):
+    """Increment the data version of each given user id (None for global data)."""
+    for user_id in set(user_ids):
+        rows = DataVersion.objects.filter(user_id=user_id)
+        if rows.update(version=F('version') + 1):
+            continue
+        try:
+            with transaction.atomic(using=router.db_for_write(DataVersion)):
+                DataVersion.objects.create(user_id=user_id, version=1)
+        except IntegrityError:
+            rows.update(version=F('version') + 1)
+
+
+def current(user_id):
+    """(user version, global version) in a single query."""
+    user_version = global_version = 0
+    rows = DataVersion.objects.filter(Q(user_id=user_id) | Q(user__isnull=True)).values_list('user_id', 'version')
+    for owner, version in rows:
+        if owner is None:
+            global_version = max(global_version, version)
+        else:
+            user_version = version
+    return user_version, global_version
+
+
+def etag_for(user_id, params, versions=None):
+    """
+    Weak ETag for a response that depends on `user_id`'s data and the query `params`.
+
+    `versions` is a (user, global) pair from current(); it is looked up when omitted.
+    """
+    user_version, global_version = versions or current(user_id)
+    query = '&'.join(f'{key}={value}' for key, value in sorted(params.items()))
+    digest = hashlib.sha1(f'{user_id}:{user_version}:{global_version}:{query}'.encode()).hexdigest()[:20]
+    return f'W/"{digest}"'
+
+
+def matches(request, etag):
+    """True if the request's If-None-Match header already names `etag`."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    candidates = parse_etags(header)
+    if candidates == ['*']:
+        return True
+    return etag.removeprefix('W/') in [candidate.removeprefix('W/') for candidate in candidates]
@@ -1,11 +1,19 @@
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.permissions import IsAdminUser
+from rest_framework.parsers import MultiPartParser
 from rest_framework.response import Response
 from rest_framework import status
-from .models import Category,MonthlyBudget,Transaction
+from .models import Category,MonthlyBudget,Tombstone,Transaction,TransactionRollup
+from .fields import cents
+from . import batch, dashboard_cache, exporters, fast_serializers, group_commit, importers, rollups, search, shards, sync, versioning
 from .serializers import CategorySerializer,MonthlyBudgetSerializer,TransactionSerializer,TransactionDetailSerializer
-from django.db.models import Q, Sum, Case, When, Value, DecimalField
+from django.db.models import Q, Sum
+from django.utils import timezone
 from rest_framework.pagination import PageNumberPagination
+from .pagination import KeysetPagination
 from django.shortcuts import get_object_or_404
+from BudgetTracker import database
+import bisect
 from datetime import datetime
 
 
@@ -15,43 +23,96 @@ class StandardResultsSetPagination(PageNumberPagination):
     max_page_size = 100
 
 
-def get_monthly_summary(user_id, year,month_num):
-    current_year = year
-    current_month = month_num
-    
-    end_month = current_month if year == current_year else 12
-    
-    month_names = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    monthly_data = []
-    
-    for month_num in range(1, end_month + 1):
-        income_sum = Transaction.objects.filter(
-            user_id=user_id,
-            type='Income',
-            date__year=year,
-            date__month=month_num
-        ).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        
-        expense_sum = Transaction.objects.filter(
-            user_id=user_id,
-            type='Expense',
-            date__year=year,
-            date__month=month_num
-        ).aggregate(
-            total=Sum('amount')
-        )['total'] or 0
-        
-        monthly_entry = {
-            'month': month_names[month_num - 1],
-            'income': float(income_sum),
-            'expenses': float(expense_sum)
-        }
-        
-        monthly_data.append(monthly_entry)
-    
-    return monthly_data
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+
+# Upper bound on the number of months a start/end summary range may cover.
+MAX_SUMMARY_MONTHS = 120
+
+# Upper bound on the number of dashboards one batch request may build.
+MAX_BATCH_MONTHS = 24
+
+
+def save_new(serializer, **kwargs):
+    """
+    serializer.save() for a create inside write_attempts(). After a rolled back
+    attempt the serializer holds an instance that was never committed, and
+    saving again must insert a new row rather than reuse its primary key.
+    """
+    serializer.instance = None
+    return serializer.save(**kwargs)
+
+
+def parse_month(value):
+    """Parse a YYYY-MM string into a (year, month) tuple, raising ValueError."""
+    parsed = datetime.strptime(value, '%Y-%m')
+    return parsed.year, parsed.month
+
+
+def shift_month(year, month_num, delta):
+    """Return the (year, month) that lies `delta` months away from the given one."""
+    year, month_index = divmod(year * 12 + month_num - 1 + delta, 12)
+    return year, month_index + 1
+
+
+def month_start(year, month_num):
+    """Aware datetime for midnight on the first day of the month."""
+    return timezone.make_aware(datetime(year, month_num, 1))
+
+
+def months_between(start, end):
+    """Number of months from `start` to `end` inclusive, both (year, month) tuples."""
+    return (end[0] - start[0]) * 12 + end[1] - start[1] + 1
+
+
+def month_runs(months):
+    """Sorted (year, month) tuples merged into (first, last) runs of consecutive months."""
+    runs = []
+    for month in months:
+        if runs and shift_month(*runs[-1][1], 1) == month:
+            runs[-1][1] = month
+        else:
+            runs.append([month, month])
+    return [tuple(run) for run in runs]
+
+
+def summarize_months(user_id, start, end):
+    """
+    Income and expense totals per month between `start` and `end` (inclusive).
+
+    Reads the TransactionRollup table in a single grouped query, so the cost
+    depends neither on how many months are requested nor on how many
+    transactions the user has. Months without transactions are filled with zeros.
+    """
+    rows = TransactionRollup.objects.filter(
+        user_id=user_id,
+        month__gte=f"{start[0]}-{start[1]:02d}",
+        month__lte=f"{end[0]}-{end[1]:02d}"
+    ).values('month').annotate(
+        income=Sum(cents('total'), filter=Q(type=Transaction.INCOME)),
+        expenses=Sum(cents('total'), filter=Q(type=Transaction.EXPENSE))
+    ).order_by()
+
+    totals = {parse_month(row['month']): row for row in rows}
+
+    summary = []
+    for offset in range(months_between(start, end)):
+        year, month_num = shift_month(*start, offset)
+        row = totals.get((year, month_num), {})
+        summary.append({
+            'year': year,
+            'month': MONTH_NAMES[month_num - 1],
+            'income': (row.get('income') or 0) / 100,
+            'expenses': (row.get('expenses') or 0) / 100
+        })
+    return summary
+
+
+def get_monthly_summary(user_id, year, month_num):
+    """Monthly income/expense totals from January up to `month_num` of `year`."""
+    summary = summarize_months(user_id, (year, 1), (year, month_num))
+    for entry in summary:
+        del entry['year']
+    return summary
 
 
 @api_view(['GET'])
@@ -81,17 +142,22 @@ def category_list_create(request):
             )
         
         paginator = StandardResultsSetPagination()
-        paginated_categories = paginator.paginate_queryset(categories, request)
-        serializer = CategorySerializer(paginated_categories, many=True)
+        paginated_categories = paginator.paginate_queryset(fast_serializers.category_values(categories), request)
         
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(fast_serializers.category_data(paginated_categories))
 
 
 
     elif request.method == 'POST':
         serializer = CategorySerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            owner = serializer.validated_data.get('user')
+            with shards.for_user(owner.pk if owner else None):
+                for attempt in database.write_attempts(shards.current()):
+                    with attempt:
+                        category = save_new(serializer)
+                        versioning.bump(category.user_id)
+                        dashboard_cache.categories_changed(category.user_id)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -105,12 +171,29 @@ def category_detail(request, pk):
     if request.method == 'PUT':
         serializer = CategorySerializer(category, data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            owner = serializer.validated_data.get('user')
+            if not shards.can_reassign(category, owner.pk if owner else None):
+                return Response({'error': "Cannot move this category to another owner's shard"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            previous_owner = category.user_id
+            for attempt in database.write_attempts(shards.current()):
+                with attempt:
+                    serializer.save()
+                    if category.user_id != previous_owner:
+                        sync.record_deleted(Tombstone.CATEGORY, previous_owner, [category.pk])
+                    versioning.bump(previous_owner, category.user_id)
+                    dashboard_cache.categories_changed(previous_owner, category.user_id)
             return Response(serializer.data)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
     elif request.method == 'DELETE':
-        category.delete()
+        for attempt in database.write_attempts(shards.current()):
+            with attempt:
+                rollups.release_category(category)
+                sync.category_deleted(category)
+                versioning.bump(category.user_id)
+                dashboard_cache.categories_changed(category.user_id)
+                category.delete()
         return Response({'message': 'Category deleted successfully'}, status=status.HTTP_204_NO_CONTENT)
 
 
@@ -142,7 +225,11 @@ def monthly_budget_list_create(request):
         )
         
         if serializer.is_valid():
-            serializer.save(user=request.user)
+            for attempt in database.write_attempts(shards.current()):
+                with attempt:
+                    budget = save_new(serializer, user=request.user)
+                    versioning.bump(request.user.id)
+                    dashboard_cache.budgets_changed(request.user.id, budget.month)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
@@ -166,72 +253,105 @@ def monthly_budget_detail(request, pk):
         )
         
         if serializer.is_valid():
-            serializer.save()
+            owner = serializer.validated_data.get('user', budget.user)
+            if not shards.can_reassign(budget, owner.pk):
+                return Response({'error': "Cannot move this budget to another owner's shard"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            previous_owner, previous_month = budget.user_id, budget.month
+            for attempt in database.write_attempts(shards.current()):
+                with attempt:
+                    serializer.save()
+                    if budget.user_id != previous_owner:
+                        sync.record_deleted(Tombstone.MONTHLY_BUDGET, previous_owner, [budget.pk])
+                    versioning.bump(previous_owner, budget.user_id)
+                    dashboard_cache.budgets_changed(previous_owner, previous_month)
+                    dashboard_cache.budgets_changed(budget.user_id, budget.month)
             return Response(serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
-        budget.delete()
+        for attempt in database.write_attempts(shards.current()):
+            with attempt:
+                sync.record_deleted(Tombstone.MONTHLY_BUDGET, budget.user_id, [budget.pk])
+                versioning.bump(budget.user_id)
+                dashboard_cache.budgets_changed(budget.user_id, budget.month)
+                budget.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
+def parse_date_filter(value):
+    """Parse a start_date/end_date filter value (YYYY-MM-DDThh:mm or YYYY-MM-DD)."""
+    try:
+        parsed = datetime.strptime(value, '%Y-%m-%dT%H:%M')
+    except ValueError:
+        parsed = datetime.strptime(value, '%Y-%m-%d')
+    return timezone.make_aware(parsed)
+
+
+def filter_transactions(request, user):
+    """
+    Apply the transaction list filters from the query string to `user`'s transactions.
+
+    Returns a (queryset, error_response) pair; error_response is None when
+    every filter is valid.
+    """
+    search_term = request.query_params.get('search_term')
+    transaction_type = request.query_params.get('type')
+    category_id = request.query_params.get('category_id')
+    start_date = request.query_params.get('start_date')
+    end_date = request.query_params.get('end_date')
+    
+    transactions = Transaction.objects.filter(user=user).select_related('category').order_by('-date')
+    
+    if search_term:
+        transactions = search.filter_transactions(transactions, search_term, user)
+        
+    if transaction_type:
+        transactions = transactions.filter(type=transaction_type)
+        
+    if category_id:
+        transactions = transactions.filter(category_id=category_id)
+        
+    if start_date:
+        try:
+            transactions = transactions.filter(date__gte=parse_date_filter(start_date))
+        except ValueError:
+            return None, Response(
+                {"error": "Invalid start_date format. Use YYYY-MM-DDThh:mm or YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+            
+    if end_date:
+        try:
+            transactions = transactions.filter(date__lte=parse_date_filter(end_date))
+        except ValueError:
+            return None, Response(
+                {"error": "Invalid end_date format. Use YYYY-MM-DDThh:mm or YYYY-MM-DD."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+    
+    return transactions, None
+
+
 @api_view(['GET', 'POST'])
 def transaction_list_create(request):
     if request.method == 'GET':
-        search_term = request.query_params.get('search_term')
-        transaction_type = request.query_params.get('type')
-        category_id = request.query_params.get('category_id')
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
         user = request.query_params.get('user') 
         
-        transactions = Transaction.objects.filter(user=user).order_by('-date')
-        
-        if search_term:
-            transactions = transactions.filter(
-                    Q(description__icontains=search_term) | Q(amount__icontains=search_term)| Q(id__icontains=search_term)
-                )
-            
-        if transaction_type:
-            transactions = transactions.filter(type=transaction_type)
-            
-        if category_id:
-            transactions = transactions.filter(category_id=category_id)
-            
-        if start_date:
-            try:
-                start_datetime = datetime.strptime(start_date, '%Y-%m-%dT%H:%M')
-                transactions = transactions.filter(date__gte=start_datetime)
-            except ValueError:
-                try:
-                    start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-                    transactions = transactions.filter(date__gte=start_date)
-                except ValueError:
-                    return Response(
-                        {"error": "Invalid start_date format. Use YYYY-MM-DDThh:mm or YYYY-MM-DD."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
-                
-        if end_date:
-            try:
-                end_datetime = datetime.strptime(end_date, '%Y-%m-%dT%H:%M')
-                transactions = transactions.filter(date__lte=end_datetime)
-            except ValueError:
-                try:
-                    end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-                    transactions = transactions.filter(date__lte=end_date)
-                except ValueError:
-                    return Response(
-                        {"error": "Invalid end_date format. Use YYYY-MM-DDThh:mm or YYYY-MM-DD."},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
+        transactions, error = filter_transactions(request, user)
+        if error:
+            return error
         
-        paginator = StandardResultsSetPagination()
-        paginated_transactions = paginator.paginate_queryset(transactions, request)
+        if request.query_params.get('pagination') == 'cursor' or 'cursor' in request.query_params:
+            paginator = KeysetPagination()
+        else:
+            paginator = StandardResultsSetPagination()
+        paginated_transactions = paginator.paginate_queryset(
+            fast_serializers.transaction_values(transactions), request
+        )
         
-        serializer = TransactionSerializer(paginated_transactions, many=True)
-        return paginator.get_paginated_response(serializer.data)
+        return paginator.get_paginated_response(fast_serializers.transaction_data(paginated_transactions))
     
     elif request.method == 'POST':
         serializer = TransactionSerializer(
@@ -240,7 +360,15 @@ def transaction_list_create(request):
         )
         
         if serializer.is_valid():
-            transaction = serializer.save(user=request.user)
+            if group_commit.enabled():
+                transaction = group_commit.create(Transaction(**{**serializer.validated_data, 'user': request.user}))
+            else:
+                for attempt in database.write_attempts(shards.current()):
+                    with attempt:
+                        transaction = save_new(serializer, user=request.user)
+                        rollups.record_created([transaction])
+                        versioning.bump(transaction.user_id)
+                        dashboard_cache.transactions_changed([rollups.snapshot(transaction)])
             detail_serializer = TransactionDetailSerializer(transaction)
             return Response(detail_serializer.data, status=status.HTTP_201_CREATED)
         
@@ -264,91 +392,259 @@ def transaction_detail(request, pk):
         )
         
         if serializer.is_valid():
-            updated_transaction = serializer.save()
+            owner = serializer.validated_data.get('user', transaction.user)
+            if not shards.can_reassign(transaction, owner.pk):
+                return Response({'error': "Cannot move this transaction to another owner's shard"},
+                                status=status.HTTP_400_BAD_REQUEST)
+            before = rollups.snapshot(transaction)
+            previous_owner = transaction.user_id
+            for attempt in database.write_attempts(shards.current()):
+                with attempt:
+                    updated_transaction = serializer.save()
+                    rollups.record_updated(before, updated_transaction)
+                    if updated_transaction.user_id != previous_owner:
+                        sync.record_deleted(Tombstone.TRANSACTION, previous_owner, [transaction.pk])
+                    versioning.bump(previous_owner, updated_transaction.user_id)
+                    dashboard_cache.transactions_changed([before, rollups.snapshot(updated_transaction)])
             detail_serializer = TransactionDetailSerializer(updated_transaction)
             return Response(detail_serializer.data)
         
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
     
     elif request.method == 'DELETE':
-        transaction.delete()
+        for attempt in database.write_attempts(shards.current()):
+            with attempt:
+                rollups.record_deleted([transaction])
+                sync.record_deleted(Tombstone.TRANSACTION, transaction.user_id, [transaction.pk])
+                versioning.bump(transaction.user_id)
+                dashboard_cache.transactions_changed([rollups.snapshot(transaction)])
+                transaction.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
     
 
 
+@api_view(['POST'])
+def transaction_batch(request):
+    try:
+        operations = batch.parse_operations(request.data)
+    except batch.BatchError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    results = batch.apply_batch(operations, request)
+    return Response({'results': results}, status=status.HTTP_200_OK)
+
+
 @api_view(['GET'])
-def get_financial_data(request):
-    user_id = request.query_params.get('user_id')
-    month = request.query_params.get('month')
+def transaction_export(request):
+    output = request.query_params.get('output', 'csv').lower()
+    if output not in exporters.CONTENT_TYPES:
+        return Response({"error": "output must be csv or ndjson"}, status=status.HTTP_400_BAD_REQUEST)
     
-    if not month or not month.strip():
-        return Response({"error": "Month parameter is required in YYYY-MM format"}, 
+    transactions, error = filter_transactions(request, request.user.id)
+    if error:
+        return error
+    
+    return exporters.stream(transactions, output)
+
+
+@api_view(['POST'])
+@parser_classes([MultiPartParser])
+def transaction_import(request):
+    upload = request.FILES.get('file')
+    if not upload:
+        return Response({"error": "Upload a CSV or OFX file in the 'file' field"}, 
                        status=status.HTTP_400_BAD_REQUEST)
     
     try:
-        datetime.strptime(month, '%Y-%m')
+        report = importers.import_file(upload, request.user, request.data.get('file_format'))
+    except importers.ImportFormatError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    return Response(report, status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+def transaction_search(request):
+    term = (request.query_params.get('q') or '').strip()
+    if not term:
+        return Response({"error": "q parameter is required"}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        limit = min(max(int(request.query_params.get('limit', 20)), 1), 100)
     except ValueError:
-        return Response({"error": "Month must be in YYYY-MM format"}, 
-                       status=status.HTTP_400_BAD_REQUEST)
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
     
+    transactions = Transaction.objects.filter(user=request.user).select_related('category')
     
-    if user_id:
-        target_user_id = user_id
+    ranked = None if search.numeric_filter(term) else search.ranked_ids(term, request.user.id, limit)
+    if ranked is None:
+        results = search.filter_transactions(transactions, term, request.user.id).order_by('-date', '-created_at')[:limit]
     else:
-        target_user_id = request.user.id
+        by_id = transactions.in_bulk(ranked)
+        results = [by_id[pk] for pk in ranked if pk in by_id]
     
-    budget_data = {}
+    serializer = TransactionSerializer(results, many=True)
+    return Response({'results': serializer.data})
+
+
+def parse_financial_data_query(query_params, default_user_id):
+    """
+    Validate a dashboard query.
     
-    year, month_num = month.split('-')
-    month_int = int(month_num)
-    year_int = int(year)
+    Returns ((user_id, month, summary_range), None), or (None, error message).
+    """
+    user_id = query_params.get('user_id')
+    month = query_params.get('month')
     
-    months_to_fetch = [month]
+    if not month or not month.strip():
+        return None, "Month parameter is required in YYYY-MM format"
     
-    prev_month_int = month_int - 1
-    prev_year_int = year_int
-    if prev_month_int < 1:
-        prev_month_int = 12
-        prev_year_int -= 1
-    prev_month = f"{prev_year_int}-{prev_month_int:02d}"
-    months_to_fetch.append(prev_month)
+    try:
+        datetime.strptime(month, '%Y-%m')
+    except ValueError:
+        return None, "Month must be in YYYY-MM format"
     
-    prev2_month_int = prev_month_int - 1
-    prev2_year_int = prev_year_int
-    if prev2_month_int < 1:
-        prev2_month_int = 12
-        prev2_year_int -= 1
-    prev2_month = f"{prev2_year_int}-{prev2_month_int:02d}"
-    months_to_fetch.append(prev2_month)
+    summary_start = query_params.get('start')
+    summary_end = query_params.get('end')
+    summary_range = None
     
-    budgets = MonthlyBudget.objects.filter(
-        user_id=target_user_id, 
-        month__in=months_to_fetch
-    )
+    if summary_start or summary_end:
+        if not summary_start:
+            return None, "start is required when end is given"
+        try:
+            summary_range = (parse_month(summary_start), parse_month(summary_end or month))
+        except ValueError:
+            return None, "start and end must be in YYYY-MM format"
+        
+        range_length = months_between(*summary_range)
+        if range_length < 1:
+            return None, "start must not be after end"
+        if range_length > MAX_SUMMARY_MONTHS:
+            return None, f"start and end may span at most {MAX_SUMMARY_MONTHS} months"
+    
+    return (user_id or default_user_id, month, summary_range), None
+
+
+def parse_financial_data_batch_query(query_params, default_user_id):
+    """
+    Validate a batch dashboard query: months=YYYY-MM,... or start= and end=.
+    
+    Returns ((user_id, months), None) with the months sorted, or (None, error message).
+    """
+    user_id = query_params.get('user_id')
+    listed = query_params.get('months')
+    start = query_params.get('start')
+    end = query_params.get('end')
+    
+    if listed and (start or end):
+        return None, "Give either months or start and end, not both"
+    if listed:
+        try:
+            months = sorted({parse_month(month.strip()) for month in listed.split(',')})
+        except ValueError:
+            return None, "months must be a comma-separated list of YYYY-MM months"
+    elif start and end:
+        try:
+            first, last = parse_month(start), parse_month(end)
+        except ValueError:
+            return None, "start and end must be in YYYY-MM format"
+        count = months_between(first, last)
+        if count < 1:
+            return None, "start must not be after end"
+        if count > MAX_BATCH_MONTHS:
+            return None, f"At most {MAX_BATCH_MONTHS} months may be requested at once"
+        months = [shift_month(*first, offset) for offset in range(count)]
+    else:
+        return None, "months, or start and end, are required in YYYY-MM format"
     
-    budget_data = {budget.month: float(budget.total_budget_amount) for budget in budgets}
+    if len(months) > MAX_BATCH_MONTHS:
+        return None, f"At most {MAX_BATCH_MONTHS} months may be requested at once"
+    return (user_id or default_user_id, [f"{year}-{month_num:02d}" for year, month_num in months]), None
+
+
+def financial_data_preflight(request, user_id, month, summary_range):
+    """
+    Answer a dashboard request from the cache, or with a 304, when possible.
     
+    Returns (answer, state). `answer` is a (status, data, headers) tuple or None;
+    `state` is what store_financial_data() needs once the data is built.
+    """
+    # Single-month dashboards are cached per (user, month); a hit needs no queries at all.
+    cacheable = summary_range is None and str(user_id).isdigit()
+    generations = None
+    if cacheable:
+        user_id = int(user_id)
+        cached, generations = dashboard_cache.lookup(user_id, month)
+        if cached is not None:
+            etag = versioning.etag_for(user_id, request.query_params, cached['versions'])
+            cache_headers = {'ETag': etag, 'Cache-Control': 'private, no-cache', 'X-Cache': 'HIT'}
+            if versioning.matches(request, etag):
+                return (status.HTTP_304_NOT_MODIFIED, None, cache_headers), None
+            return (status.HTTP_200_OK, cached['data'], cache_headers), None
+    
+    # The data version lookup is the only query needed to answer a revalidation.
+    versions = versioning.current(user_id)
+    etag = versioning.etag_for(user_id, request.query_params, versions)
+    cache_headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if versioning.matches(request, etag):
+        return (status.HTTP_304_NOT_MODIFIED, None, cache_headers), None
+    return None, {'cacheable': cacheable, 'generations': generations, 'versions': versions, 'headers': cache_headers}
+
+
+def store_financial_data(user_id, month, state, data):
+    """Cache freshly built dashboard `data` if it is cacheable; returns the response headers."""
+    headers = dict(state['headers'])
+    if state['cacheable']:
+        dashboard_cache.store(int(user_id), month, state['generations'], data=data, versions=state['versions'])
+        headers['X-Cache'] = 'MISS'
+    return headers
+
+
+def budget_months(month):
+    """`month` and the two months before it, the budgets a dashboard shows."""
+    year, month_num = parse_month(month)
+    return [f"{y}-{m:02d}" for y, m in (shift_month(year, month_num, -n) for n in range(3))]
+
+
+def dashboard_budgets(user_id, month):
+    """Budget amounts of `month` and the two months before it."""
+    budgets = MonthlyBudget.objects.filter(
+        user_id=user_id, 
+        month__in=budget_months(month)
+    ).values_list('month', cents('total_budget_amount'))
+    return {budget_month: amount / 100 for budget_month, amount in budgets}
+
+
+DASHBOARD_TRANSACTION_FIELDS = ('id', 'type', cents('amount'), 'category_id', 'date', 'description')
+
+
+def format_dashboard_transaction(pk, type, amount, category_id, date, description):
+    return {
+        'id': pk,
+        'type': type,
+        'amount': amount / 100,
+        'category_id': category_id,
+        'date': date.strftime('%Y-%m-%d'),
+        'time': date.strftime('%I:%M %p'),
+        'description': description or ''
+    }
+
+
+def dashboard_transactions(user_id, month):
+    year, month_num = parse_month(month)
+    next_year, next_month_num = shift_month(year, month_num, 1)
     transactions = Transaction.objects.filter(
-        user_id=target_user_id,
-        date__year=int(year),
-        date__month=int(month_num)
-    ).select_related('category')
-    
-    formatted_transactions = []
-    for transaction in transactions:
-        formatted_transaction = {
-            'id': transaction.id,
-            'type': transaction.type,
-            'amount': float(transaction.amount),
-            'category_id': transaction.category_id,
-            'date': transaction.date.strftime('%Y-%m-%d'),
-            'time': transaction.date.strftime('%I:%M %p'),
-            'description': transaction.description or ''
-        }
-        formatted_transactions.append(formatted_transaction)
+        user_id=user_id,
+        date__gte=month_start(year, month_num),
+        date__lt=month_start(next_year, next_month_num)
+    ).values_list(*DASHBOARD_TRANSACTION_FIELDS)
     
+    return [format_dashboard_transaction(*row) for row in transactions]
+
+
+def dashboard_categories(user_id):
     categories = Category.objects.filter(
-        Q(user_id=target_user_id) | Q(user__isnull=True)
+        Q(user_id=user_id) | Q(user__isnull=True)
     )
     
     formatted_categories = []
@@ -361,14 +657,135 @@ def get_financial_data(request):
             'color': category.color or '#CCCCCC'
         }
         formatted_categories.append(formatted_category)
+    return formatted_categories
+
 
-    monthly_summary = get_monthly_summary(target_user_id, int(year),int(month_num))
+def dashboard_monthly_data(user_id, month, summary_range):
+    if summary_range:
+        return summarize_months(user_id, *summary_range)
+    return get_monthly_summary(user_id, *parse_month(month))
+
+
+def dashboard_parts(user_id, month, summary_range):
+    """
+    The independent reads behind a dashboard, as (key, function, args) triples.
     
-    response_data = {
-        'budgets': budget_data,
-        'transactions': formatted_transactions,
-        'categories': formatted_categories,
-        'monthlyData': monthly_summary
+    None of them depends on another, so they may run in any order or at once.
+    """
+    return [
+        ('budgets', dashboard_budgets, (user_id, month)),
+        ('transactions', dashboard_transactions, (user_id, month)),
+        ('categories', dashboard_categories, (user_id,)),
+        ('monthlyData', dashboard_monthly_data, (user_id, month, summary_range)),
+    ]
+
+
+def build_financial_data(user_id, month, summary_range):
+    return {key: func(*args) for key, func, args in dashboard_parts(user_id, month, summary_range)}
+
+
+def build_financial_data_batch(user_id, months):
+    """
+    {month: build_financial_data(user_id, month, None)} for several months.
+    
+    Each kind of row is read once for all the months, in four queries whatever
+    their number, and split up by month here.
+    """
+    parsed = {month: parse_month(month) for month in months}
+    categories = dashboard_categories(user_id)
+    
+    budgets = dict(MonthlyBudget.objects.filter(
+        user_id=user_id,
+        month__in={budget_month for month in months for budget_month in budget_months(month)}
+    ).values_list('month', cents('total_budget_amount')))
+    
+    periods = Q()
+    for first, last in month_runs(sorted(parsed.values())):
+        periods |= Q(date__gte=month_start(*first), date__lt=month_start(*shift_month(*last, 1)))
+    ordered = sorted(months, key=parsed.get)
+    starts = [month_start(*parsed[month]) for month in ordered]
+    transactions = {month: [] for month in months}
+    # Rows come in the model's date order, so each month's list is in the order its own query returns.
+    for row in Transaction.objects.filter(periods, user_id=user_id).values_list(*DASHBOARD_TRANSACTION_FIELDS):
+        month = ordered[bisect.bisect_right(starts, row[4]) - 1]
+        transactions[month].append(format_dashboard_transaction(*row))
+    
+    # Every month's summary runs from January of its year, so one range covers them all.
+    years = {}
+    for entry in summarize_months(user_id, (min(parsed.values())[0], 1), max(parsed.values())):
+        years.setdefault(entry.pop('year'), []).append(entry)
+    
+    return {
+        month: {
+            'budgets': {
+                budget_month: budgets[budget_month] / 100
+                for budget_month in budget_months(month) if budget_month in budgets
+            },
+            'transactions': transactions[month],
+            'categories': categories,
+            'monthlyData': [dict(entry) for entry in years[year][:month_num]],
+        }
+        for month, (year, month_num) in parsed.items()
     }
+
+
+@api_view(['GET'])
+def sync_changes(request):
+    try:
+        data = sync.changes(request.user.id, request.query_params.get('since'))
+    except sync.InvalidCursor:
+        return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(data)
+
+
+@api_view(['GET'])
+def get_financial_data(request):
+    query, error = parse_financial_data_query(request.query_params, request.user.id)
+    if error:
+        return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+    
+    answer, state = financial_data_preflight(request, *query)
+    if answer:
+        answer_status, data, headers = answer
+        return Response(data, status=answer_status, headers=headers)
     
-    return Response(response_data)
+    response_data = build_financial_data(*query)
+    user_id, month, _ = query
+    return Response(response_data, headers=store_financial_data(user_id, month, state, response_data))
+
+
+@api_view(['GET'])
+def get_financial_data_batch(request):
+    query, error = parse_financial_data_batch_query(request.query_params, request.user.id)
+    if error:
+        return Response({"error": error}, status=status.HTTP_400_BAD_REQUEST)
+    user_id, months = query
+    
+    versions = versioning.current(user_id)
+    etag = versioning.etag_for(user_id, request.query_params, versions)
+    headers = {'ETag': etag, 'Cache-Control': 'private, no-cache'}
+    if versioning.matches(request, etag):
+        return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    
+    # Months already in the dashboard cache are served from it; the rest are built together and cached.
+    cacheable = str(user_id).isdigit()
+    found, generations = {}, {}
+    if cacheable:
+        for month in months:
+            cached, generations[month] = dashboard_cache.lookup(int(user_id), month)
+            if cached is not None:
+                found[month] = cached['data']
+    missing = [month for month in months if month not in found]
+    if missing:
+        built = build_financial_data_batch(user_id, missing)
+        if cacheable:
+            for month, data in built.items():
+                dashboard_cache.store(int(user_id), month, generations[month], data=data, versions=versions)
+        found.update(built)
+    return Response({month: found[month] for month in months}, headers=headers)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def financial_data_cache_stats(request):
+    return Response(dashboard_cache.stats())
@@ -0,0 +1,480 @@
+#!/usr/bin/env python
+"""
+Load generator for the BudgetTracker API.
+
+Logs a set of users in, then runs `concurrency` virtual clients that replay
+a weighted mix of dashboard loads, cursor-paginated list scrolls, searches
+and transaction writes against a running server, and reports throughput,
+latency percentiles and error rates per operation:
+
+    python tools/loadgen.py --url http://127.0.0.1:8000 --seeded-users 20 \\
+        --concurrency 1,4,16,32 --duration 30 --mix dashboard=50,list=25,search=15,write=10
+
+Every client owns one HTTP/1.1 keep-alive connection and reuses it until the
+server closes it. Gunicorn's sync workers close the connection after every
+response, so the report counts reconnects; use the gthread worker to measure
+with connection reuse. A comma-separated --concurrency runs one stage per
+level, which is how the write-contention ceiling of a SQLite deployment
+shows up: throughput stops growing while p99 and the error rate climb.
+
+Only the standard library is used, so the script can run from any machine
+that can reach the server. Seeded users come from `manage.py seed_data`.
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date
+from urllib.parse import urlencode, urlsplit
+
+SEED_EMAIL_PATTERN = 'seed-{:06d}@example.com'
+SEED_PASSWORD = 'seed-password'
+
+DEFAULT_MIX = 'dashboard=50,list=25,search=15,write=10'
+SEARCH_TERMS = ['supermarket', 'cafe', 'metro', 'pharmacy', 'pizza', 'cinema', 'bakery', 'payroll', 'refund', 'taxi']
+
+
+class ProtocolError(Exception):
+    pass
+
+
+class Response:
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class Connection:
+    """A single keep-alive HTTP/1.1 connection that reconnects when the server closes it."""
+
+    def __init__(self, host, port, timeout):
+        self.host = host
+        self.port = port
+        self.timeout = timeout
+        self.reader = self.writer = None
+        self.connects = 0
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        self.connects += 1
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.reader = self.writer = None
+
+    async def request(self, method, path, headers=None, body=None):
+        # A reused connection may have been closed by the server while idle;
+        # retry once on a fresh one if nothing of the response had arrived.
+        reused = self.writer is not None
+        try:
+            return await asyncio.wait_for(self._exchange(method, path, headers, body), self.timeout)
+        except (ConnectionError, asyncio.IncompleteReadError) as exc:
+            self.close()
+            if not reused or (isinstance(exc, asyncio.IncompleteReadError) and exc.partial):
+                raise
+            return await asyncio.wait_for(self._exchange(method, path, headers, body), self.timeout)
+        except BaseException:
+            self.close()
+            raise
+
+    async def _exchange(self, method, path, headers, body):
+        if self.writer is None:
+            await self._connect()
+        lines = [f'{method} {path} HTTP/1.1', f'Host: {self.host}:{self.port}', 'Connection: keep-alive']
+        lines += [f'{name}: {value}' for name, value in (headers or {}).items()]
+        if body is not None:
+            lines.append(f'Content-Length: {len(body)}')
+        self.writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (body or b''))
+        await self.writer.drain()
+
+        status, response_headers = await self._read_head()
+        body = await self._read_body(method, status, response_headers)
+        if response_headers.get('connection', '').lower() == 'close':
+            self.close()
+        return Response(status, response_headers, body)
+
+    async def _read_head(self):
+        head = await self.reader.readuntil(b'\r\n\r\n')
+        status_line, *header_lines = head.decode('latin-1').split('\r\n')
+        parts = status_line.split(' ', 2)
+        if len(parts) < 2 or not parts[0].startswith('HTTP/'):
+            raise ProtocolError(f'bad status line {status_line!r}')
+        headers = {}
+        for line in header_lines:
+            if line:
+                name, _, value = line.partition(':')
+                headers[name.strip().lower()] = value.strip()
+        if parts[0] == 'HTTP/1.0' and headers.get('connection', '').lower() != 'keep-alive':
+            headers['connection'] = 'close'
+        return int(parts[1]), headers
+
+    async def _read_body(self, method, status, headers):
+        if method == 'HEAD' or status in (204, 304) or 100 <= status < 200:
+            return b''
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await self.reader.readuntil(b'\r\n')).split(b';')[0], 16)
+                if size == 0:
+                    while (await self.reader.readuntil(b'\r\n')) != b'\r\n':
+                        pass  # Trailers.
+                    return b''.join(chunks)
+                chunks.append(await self.reader.readexactly(size))
+                await self.reader.readexactly(2)
+        if 'content-length' in headers:
+            return await self.reader.readexactly(int(headers['content-length']))
+        headers['connection'] = 'close'
+        return await self.reader.read()
+
+
+class Stats:
+    """Latencies and outcomes per operation, recorded only while the measuring window is open."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = Counter()
+        self.statuses = Counter()
+        self.exceptions = Counter()
+        self.recording = False
+
+    def record(self, operation, latency, status=None, exception=None):
+        if not self.recording:
+            return
+        self.latencies[operation].append(latency)
+        if exception is not None:
+            self.errors[operation] += 1
+            self.exceptions[f'{operation}: {exception}'] += 1
+        else:
+            self.statuses[f'{operation} {status}'] += 1
+            if status >= 400:
+                self.errors[operation] += 1
+
+
+class Client:
+    """One virtual user: a logged-in account, a connection and its own random stream."""
+
+    def __init__(self, connection, account, stats, rng, config):
+        self.connection = connection
+        self.account = account
+        self.stats = stats
+        self.rng = rng
+        self.config = config
+
+    async def call(self, operation, method, path, payload=None):
+        headers = {'Authorization': f'Token {self.account["token"]}', 'Accept': 'application/json'}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers['Content-Type'] = 'application/json'
+        started = time.perf_counter()
+        try:
+            response = await self.connection.request(method, path, headers, body)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ProtocolError) as exc:
+            self.stats.record(operation, time.perf_counter() - started, exception=type(exc).__name__)
+            return None
+        self.stats.record(operation, time.perf_counter() - started, status=response.status)
+        return response
+
+    def month(self):
+        return self.rng.choice(self.config.months)
+
+    async def dashboard(self):
+        await self.call('dashboard', 'GET', '/api/financial-data/?' + urlencode({'month': self.month()}))
+
+    async def list(self):
+        path = '/api/transactions/?' + urlencode({
+            'user': self.account['id'], 'pagination': 'cursor', 'page_size': self.config.page_size,
+        })
+        for _ in range(self.rng.randint(1, self.config.scroll_pages)):
+            response = await self.call('list', 'GET', path)
+            if response is None or response.status != 200:
+                return
+            next_url = (response.json() or {}).get('next')
+            if not next_url:
+                return
+            parts = urlsplit(next_url)
+            path = f'{parts.path}?{parts.query}'
+
+    async def search(self):
+        await self.call('search', 'GET', '/api/transactions/search/?' + urlencode({'q': self.rng.choice(SEARCH_TERMS)}))
+
+    async def write(self):
+        year, month = map(int, self.month().split('-'))
+        await self.call('write', 'POST', '/api/transactions/', {
+            'user': self.account['id'],
+            'type': 'Expense' if self.rng.random() < 0.85 else 'Income',
+            'amount': f'{self.rng.randrange(100, 20_000) / 100:.2f}',
+            'date': f'{year:04d}-{month:02d}-{self.rng.randint(1, 28):02d}T{self.rng.randrange(24):02d}:00:00Z',
+            'description': f'loadgen {self.rng.choice(SEARCH_TERMS)}',
+        })
+
+
+OPERATIONS = ('dashboard', 'list', 'search', 'write')
+
+
+def parse_mix(value):
+    """Parse 'dashboard=50,write=10' into {operation: weight}."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.strip().partition('=')
+        if name not in OPERATIONS:
+            raise argparse.ArgumentTypeError(f'unknown operation {name!r}; choose from {", ".join(OPERATIONS)}')
+        try:
+            mix[name] = float(weight)
+        except ValueError:
+            raise argparse.ArgumentTypeError(f'weight of {name!r} must be a number')
+        if mix[name] < 0:
+            raise argparse.ArgumentTypeError(f'weight of {name!r} must not be negative')
+    if not any(mix.values()):
+        raise argparse.ArgumentTypeError('at least one operation needs a positive weight')
+    return mix
+
+
+def parse_levels(value):
+    try:
+        levels = [int(level) for level in value.split(',')]
+    except ValueError:
+        raise argparse.ArgumentTypeError('must be a comma-separated list of integers')
+    if any(level < 1 for level in levels):
+        raise argparse.ArgumentTypeError('concurrency levels must be at least 1')
+    return levels
+
+
+def parse_account(value):
+    email, sep, password = value.partition(':')
+    if not sep:
+        raise argparse.ArgumentTypeError('expected EMAIL:PASSWORD')
+    return email, password
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of an already sorted list."""
+    if not values:
+        return 0.0
+    return values[min(len(values) - 1, max(0, int(round(fraction * len(values) + 0.5)) - 1))]
+
+
+def recent_months(end_month, count):
+    year, month = map(int, end_month.split('-'))
+    months = []
+    for _ in range(count):
+        months.append(f'{year:04d}-{month:02d}')
+        year, month = (year - 1, 12) if month == 1 else (year, month - 1)
+    return months
+
+
+async def login(connection, credentials):
+    accounts, failures = [], []
+    for email, password in credentials:
+        body = json.dumps({'email': email, 'password': password}).encode()
+        try:
+            response = await connection.request('POST', '/api/auth/login/', {'Content-Type': 'application/json'}, body)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ProtocolError) as exc:
+            failures.append(f'{email}: {type(exc).__name__}')
+            continue
+        if response.status != 200:
+            failures.append(f'{email}: HTTP {response.status}')
+            continue
+        data = response.json()
+        accounts.append({'email': email, 'id': data['user']['id'], 'token': data['token']})
+    return accounts, failures
+
+
+async def run_stage(config, accounts, concurrency):
+    """Run `concurrency` clients for one stage and return its report."""
+    stats = Stats()
+    operations = [name for name, weight in config.mix.items() if weight > 0]
+    weights = [config.mix[name] for name in operations]
+    connections = [Connection(config.host, config.port, config.timeout) for _ in range(concurrency)]
+    remaining = config.requests
+
+    async def worker(index):
+        nonlocal remaining
+        rng = random.Random(config.seed * 1_000_003 + concurrency * 1_009 + index)
+        client = Client(connections[index], accounts[index % len(accounts)], stats, rng, config)
+        while time.monotonic() < deadline:
+            if remaining is not None and stats.recording:
+                if remaining <= 0:
+                    return
+                remaining -= 1
+            await getattr(client, rng.choices(operations, weights)[0])()
+            if config.think_time:
+                await asyncio.sleep(rng.expovariate(1 / config.think_time))
+
+    started = time.monotonic()
+    deadline = started + config.warmup + config.duration
+    tasks = [asyncio.ensure_future(worker(index)) for index in range(concurrency)]
+    if config.warmup:
+        await asyncio.sleep(config.warmup)
+    stats.recording = True
+    measured_from = time.monotonic()
+    try:
+        await asyncio.gather(*tasks)
+    finally:
+        stats.recording = False
+        for connection in connections:
+            connection.close()
+    elapsed = time.monotonic() - measured_from
+    return summarize(stats, concurrency, elapsed, sum(connection.connects for connection in connections))
+
+
+def summarize(stats, concurrency, elapsed, connects):
+    operations = {}
+    all_latencies = []
+    for name in OPERATIONS:
+        latencies = sorted(stats.latencies.get(name, []))
+        if not latencies:
+            continue
+        all_latencies += latencies
+        operations[name] = _latency_summary(latencies, stats.errors[name], elapsed)
+    total = _latency_summary(sorted(all_latencies), sum(stats.errors.values()), elapsed)
+    return {
+        'concurrency': concurrency,
+        'seconds': round(elapsed, 3),
+        'connects': connects,
+        'total': total,
+        'operations': operations,
+        'statuses': dict(sorted(stats.statuses.items())),
+        'exceptions': dict(stats.exceptions.most_common()),
+    }
+
+
+def _latency_summary(latencies, errors, elapsed):
+    count = len(latencies)
+    return {
+        'requests': count,
+        'errors': errors,
+        'error_rate': round(errors / count, 4) if count else 0.0,
+        'rps': round(count / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2) if latencies else 0.0,
+    }
+
+
+def format_stage(report):
+    header = f'{"operation":<10} {"requests":>9} {"errors":>7} {"err%":>6} {"req/s":>8} ' \
+             f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"max ms":>8}'
+    lines = [
+        f'concurrency {report["concurrency"]}: {report["seconds"]:.1f}s measured, {report["connects"]} connection(s) opened',
+        header,
+    ]
+    rows = list(report['operations'].items()) + [('total', report['total'])]
+    for name, row in rows:
+        lines.append(
+            f'{name:<10} {row["requests"]:>9} {row["errors"]:>7} {row["error_rate"] * 100:>5.1f}% {row["rps"]:>8.1f} '
+            f'{row["p50_ms"]:>8.1f} {row["p95_ms"]:>8.1f} {row["p99_ms"]:>8.1f} {row["max_ms"]:>8.1f}'
+        )
+    lines += [f'  {count:>7} x {outcome}' for outcome, count in report['statuses'].items() if not outcome.endswith(('200', '201'))]
+    lines += [f'  {count:>7} x {outcome}' for outcome, count in report['exceptions'].items()]
+    return '\n'.join(lines)
+
+
+def format_sweep(reports):
+    lines = [f'{"concurrency":>11} {"req/s":>8} {"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"err%":>6} {"write req/s":>11}']
+    for report in reports:
+        total = report['total']
+        write = report['operations'].get('write', {}).get('rps', 0.0)
+        lines.append(
+            f'{report["concurrency"]:>11} {total["rps"]:>8.1f} {total["p50_ms"]:>8.1f} {total["p95_ms"]:>8.1f} '
+            f'{total["p99_ms"]:>8.1f} {total["error_rate"] * 100:>5.1f}% {write:>11.1f}'
+        )
+    return '\n'.join(lines)
+
+
+async def run(config, output=print):
+    """Log in, run every concurrency stage in turn and return the list of stage reports."""
+    credentials = list(config.accounts)
+    credentials += [(SEED_EMAIL_PATTERN.format(number), SEED_PASSWORD)
+                    for number in range(config.first_seeded_user, config.first_seeded_user + config.seeded_users)]
+    if not credentials:
+        raise SystemExit('No users to log in as; pass --user EMAIL:PASSWORD or --seeded-users N')
+
+    connection = Connection(config.host, config.port, config.timeout)
+    try:
+        accounts, failures = await login(connection, credentials)
+    finally:
+        connection.close()
+    for failure in failures:
+        output(f'login failed for {failure}')
+    if not accounts:
+        raise SystemExit('No user could log in')
+    output(f'logged in {len(accounts)} user(s); mix {", ".join(f"{k}={v:g}" for k, v in config.mix.items())}')
+
+    reports = []
+    for concurrency in config.concurrency:
+        report = await run_stage(config, accounts, concurrency)
+        reports.append(report)
+        output(format_stage(report))
+        output('')
+    if len(reports) > 1:
+        output(format_sweep(reports))
+    return reports
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0].strip())
+    parser.add_argument('--url', default='http://127.0.0.1:8000', help='Base URL of the server (http only)')
+    parser.add_argument('--user', dest='accounts', action='append', type=parse_account, default=[],
+                        metavar='EMAIL:PASSWORD', help='Account to log in as; repeatable')
+    parser.add_argument('--seeded-users', type=int, default=0, help='Also log in as this many seed_data users')
+    parser.add_argument('--first-seeded-user', type=int, default=1, help='Number of the first seeded user')
+    parser.add_argument('--concurrency', type=parse_levels, default=[8],
+                        help='Concurrent clients; a comma-separated list runs one stage per level')
+    parser.add_argument('--duration', type=float, default=30.0, help='Measured seconds per stage')
+    parser.add_argument('--warmup', type=float, default=5.0, help='Unmeasured seconds before each stage')
+    parser.add_argument('--requests', type=int, help='Stop a stage after this many measured operations')
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Operation weights (default: {DEFAULT_MIX})')
+    parser.add_argument('--months', type=int, default=12, help='Months the dashboards and writes pick from')
+    parser.add_argument('--end-month', default=date.today().strftime('%Y-%m'), help='Latest month, YYYY-MM')
+    parser.add_argument('--page-size', type=int, default=50, help='Page size of list scrolls')
+    parser.add_argument('--scroll-pages', type=int, default=5, help='Most pages one list scroll follows')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean pause between operations, in seconds')
+    parser.add_argument('--timeout', type=float, default=30.0, help='Per-request timeout in seconds')
+    parser.add_argument('--seed', type=int, default=0, help='Random seed of the operation sequence')
+    parser.add_argument('--json', help='Also write the stage reports to this file')
+    parser.add_argument('--max-error-rate', type=float,
+                        help='Exit with status 1 if any stage has a higher error rate (a fraction)')
+    return parser
+
+
+def configure(argv=None):
+    parser = build_parser()
+    config = parser.parse_args(argv)
+    parts = urlsplit(config.url)
+    if parts.scheme != 'http' or not parts.hostname:
+        parser.error('--url must be an http:// URL')
+    config.host, config.port = parts.hostname, parts.port or 80
+    try:
+        config.months = recent_months(config.end_month, config.months)
+    except ValueError:
+        parser.error('--end-month must be in YYYY-MM format')
+    return config
+
+
+def main(argv=None):
+    config = configure(argv)
+    reports = asyncio.run(run(config))
+    if config.json:
+        with open(config.json, 'w') as handle:
+            json.dump(reports, handle, indent=2)
+    if config.max_error_rate is not None and any(r['total']['error_rate'] > config.max_error_rate for r in reports):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())